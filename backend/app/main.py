@@ -1,17 +1,51 @@
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import redis
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
 from app.config import settings
-from app.schemas import DeadLetterItemRead, DeadLetterTask
+from app.schemas import DeadLetterItemRead, DeadLetterTask, TaskStatsRead
+from apps.api.routes.audit import router as audit_router
 from apps.api.routes.intents import router as intents_router
-from orchestrator.deadletter_store import get_default_deadletter_store
+from audit_log import shutdown_default_audit_log_store
+from database import close_default_async_pool, close_default_pool
+from orchestrator.deadletter_store import get_default_async_deadletter_store
+from orchestrator.task_store import get_default_task_store
+from redis_pool import close_default_redis_pool, get_default_redis_client
+from workers import providers
+
+logger = logging.getLogger(__name__)
+
 
-app = FastAPI(title=settings.app_name)
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    yield
+    shutdown_default_audit_log_store()
+    await close_default_async_pool()
+    close_default_pool()
+    close_default_redis_pool()
+
+
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
 
 
 class MetricsResponse(BaseModel):
     status: str
     service: str
+    circuit_breakers: dict[str, dict[str, Any]] = {}
+
+
+def _circuit_breaker_states() -> dict[str, dict[str, Any]]:
+    try:
+        return providers.breaker_states(get_default_redis_client())
+    except redis.RedisError:
+        logger.warning("Could not read circuit breaker state", exc_info=True)
+        return {}
 
 
 @app.get("/health", tags=["health"])
@@ -21,16 +55,21 @@ async def health_check() -> dict[str, str]:
 
 @app.get("/metrics", response_model=MetricsResponse, tags=["health"])
 async def metrics() -> MetricsResponse:
-    return MetricsResponse(status="ok", service=settings.app_name)
+    return MetricsResponse(
+        status="ok",
+        service=settings.app_name,
+        circuit_breakers=await run_in_threadpool(_circuit_breaker_states),
+    )
 
 
 app.include_router(intents_router)
+app.include_router(audit_router)
 
 
 @app.get("/deadletter", response_model=list[DeadLetterItemRead], tags=["deadletter"])
 async def list_deadletter(limit: int = 50) -> list[DeadLetterItemRead]:
-    store = get_default_deadletter_store()
-    items = store.list(limit=limit)
+    store = get_default_async_deadletter_store()
+    items = await store.list(limit=limit)
     return [
         DeadLetterItemRead(
             id=item.id,
@@ -49,3 +88,16 @@ async def list_deadletter(limit: int = 50) -> list[DeadLetterItemRead]:
         )
         for item in items
     ]
+
+
+def _task_stats(intent_id: str | None) -> TaskStatsRead:
+    store = get_default_task_store()
+    return TaskStatsRead(
+        queue_depth=store.queue_depth(),
+        status_counts=store.status_counts(intent_id=intent_id),
+    )
+
+
+@app.get("/tasks/stats", response_model=TaskStatsRead, tags=["tasks"])
+async def task_stats(intent_id: str | None = None) -> TaskStatsRead:
+    return await run_in_threadpool(_task_stats, intent_id)
@@ -138,6 +138,8 @@ class AuditLog(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     trigger_source: Mapped[str] = mapped_column(String(255), nullable=False)
+    intent_id: Mapped[str | None] = mapped_column(String(255), index=True)
+    task_type: Mapped[str | None] = mapped_column(String(100), index=True)
     input_json: Mapped[str] = mapped_column(Text, nullable=False)
     output_result: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
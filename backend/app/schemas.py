@@ -103,6 +103,8 @@ class ArtifactRead(ArtifactCreate):
 
 class AuditLogCreate(BaseModel):
     trigger_source: str = Field(..., min_length=1)
+    intent_id: str | None = None
+    task_type: str | None = None
     input_json: str = Field(..., min_length=1)
     output_result: str = Field(..., min_length=1)
 
@@ -130,3 +132,8 @@ class DeadLetterItemRead(BaseModel):
     reason: str
     deadlettered_at: datetime
     task: DeadLetterTask
+
+
+class TaskStatsRead(BaseModel):
+    queue_depth: dict[str, int]
+    status_counts: dict[str, dict[str, int]]
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from datetime import datetime
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.schemas import AuditLogRead
+from audit_log import AuditLogEntry, get_default_audit_log_store
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+
+class AuditLogPage(BaseModel):
+    items: list[AuditLogRead]
+    next_cursor: int | None
+
+
+def _to_read(entry: AuditLogEntry) -> AuditLogRead:
+    return AuditLogRead.model_validate(entry)
+
+
+@router.get("", response_model=AuditLogPage)
+def list_audit_log(
+    trigger_source: str | None = None,
+    intent_id: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after_id: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+) -> AuditLogPage:
+    store = get_default_audit_log_store()
+    entries = store.list(
+        trigger_source=trigger_source,
+        intent_id=intent_id,
+        since=since,
+        until=until,
+        after_id=after_id,
+        limit=limit,
+    )
+    next_cursor = entries[-1].id if len(entries) == limit else None
+    return AuditLogPage(items=[_to_read(entry) for entry in entries], next_cursor=next_cursor)
+
+
+@router.get("/stream")
+def stream_audit_log(
+    trigger_source: str | None = None,
+    intent_id: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after_id: int | None = Query(default=None, ge=0),
+) -> StreamingResponse:
+    store = get_default_audit_log_store()
+
+    def _lines() -> Iterator[str]:
+        for entry in store.iter_entries(
+            trigger_source=trigger_source,
+            intent_id=intent_id,
+            since=since,
+            until=until,
+            after_id=after_id,
+        ):
+            yield _to_read(entry).model_dump_json() + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
@@ -4,11 +4,12 @@ from typing import Any
 from uuid import uuid4
 
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
+from apps.api.services import llm_intent_parser
 from apps.api.services.intent_validator import IntentValidationError, SalesOpsIntent, validate_intent_schema
-from apps.api.services.llm_intent_parser import parse_intent
-from apps.api.services.orchestrator import map_tasks_to_celery, plan_tasks_for_intent
+from apps.api.services.orchestrator import map_tasks_to_celery, plan_tasks_for_intent_async
 
 router = APIRouter(prefix="/intents", tags=["intents"])
 
@@ -28,7 +29,13 @@ class IntentResponse(BaseModel):
 @router.post("", response_model=IntentResponse)
 async def create_intent(payload: IntentRequest) -> IntentResponse:
     intent_id = payload.intent_id or str(uuid4())
-    intent_payload = parse_intent(payload.raw_text, payload.language, intent_id)
+    # The LLM call and its audit write are blocking; keep them off the event loop.
+    intent_payload = await run_in_threadpool(
+        llm_intent_parser.parse_intent,
+        payload.raw_text,
+        payload.language,
+        intent_id,
+    )
     try:
         intent = validate_intent_schema(intent_payload)
     except IntentValidationError as exc:
@@ -37,7 +44,7 @@ async def create_intent(payload: IntentRequest) -> IntentResponse:
             detail={"message": str(exc), "errors": exc.errors},
         ) from exc
 
-    tasks = plan_tasks_for_intent(intent)
+    tasks = await plan_tasks_for_intent_async(intent)
     return IntentResponse(
         intent=intent,
         tasks=[task.to_dict() for task in tasks],
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Any
 
-from audit_log import get_default_audit_log_store
+from audit_log import get_default_async_audit_log_store, get_default_audit_log_store
 
 
 def append_audit_log(
@@ -12,3 +12,12 @@ def append_audit_log(
 ) -> None:
     store = get_default_audit_log_store()
     store.append(trigger_source, input_payload, output_result)
+
+
+async def append_audit_log_async(
+    trigger_source: str,
+    input_payload: dict[str, Any],
+    output_result: dict[str, Any],
+) -> None:
+    store = get_default_async_audit_log_store()
+    await store.append(trigger_source, input_payload, output_result)
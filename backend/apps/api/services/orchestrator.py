@@ -3,10 +3,21 @@ from __future__ import annotations
 from collections.abc import Iterable
 from typing import Any
 
-from apps.api.services.audit_log import append_audit_log
+from app.config import settings
+from apps.api.services.audit_log import append_audit_log, append_audit_log_async
 from apps.api.services.intent_validator import IntentAction, SalesOpsIntent
+from orchestrator.engine import (
+    CeleryDispatcher,
+    Dispatcher,
+    IntentExecution,
+    IntentExecutionEngine,
+)
 from orchestrator.models import Task
+from orchestrator.outbox import get_default_task_outbox
 from orchestrator.planner import TaskPlanner
+from orchestrator.state_machine import TaskStateMachine
+from orchestrator.task_store import TaskStore, get_default_task_store
+from workers.celery_app import celery_app
 
 ACTION_TO_CELERY_TASK = {
     IntentAction.search_companies: "workers.tasks.company_search",
@@ -18,6 +29,15 @@ ACTION_TO_CELERY_TASK = {
 }
 
 
+# Actions that can consume entities streamed by search_companies, with the
+# worker task type each runs as (see ``workers.tasks.STREAM_INPUTS``).
+STREAMING_ACTIONS = {
+    IntentAction.find_contacts: "contact_finder",
+    IntentAction.collect_news: "news_collector",
+    IntentAction.generate_emails: "email_generator",
+}
+
+
 def _build_payloads(intent: SalesOpsIntent) -> dict[str, dict[str, Any]]:
     filters_payload = intent.filters.model_dump(exclude_none=True)
     base_payload = {
@@ -31,12 +51,26 @@ def _build_payloads(intent: SalesOpsIntent) -> dict[str, dict[str, Any]]:
     return payloads
 
 
+def _default_task_store() -> TaskStore | None:
+    if settings.orchestrator_task_store_enabled:
+        return get_default_task_store()
+    return None
+
+
+def _default_planner() -> TaskPlanner:
+    # Only the execution engine advances stored tasks, so tasks planned here
+    # are not stored: they would stay queued and inflate the queue depth.
+    if settings.orchestrator_outbox_enabled:
+        return TaskPlanner(outbox=get_default_task_outbox())
+    return TaskPlanner()
+
+
 def plan_tasks_for_intent(
     intent: SalesOpsIntent,
     *,
     planner: TaskPlanner | None = None,
 ) -> list[Task]:
-    task_planner = planner or TaskPlanner()
+    task_planner = planner or _default_planner()
     task_types: Iterable[str] = [action.value for action in intent.actions]
     tasks = task_planner.plan_tasks(
         intent.intent_id,
@@ -51,6 +85,26 @@ def plan_tasks_for_intent(
     return tasks
 
 
+async def plan_tasks_for_intent_async(
+    intent: SalesOpsIntent,
+    *,
+    planner: TaskPlanner | None = None,
+) -> list[Task]:
+    task_planner = planner or _default_planner()
+    task_types: Iterable[str] = [action.value for action in intent.actions]
+    tasks = await task_planner.plan_tasks_async(
+        intent.intent_id,
+        task_types,
+        payloads=_build_payloads(intent),
+    )
+    await append_audit_log_async(
+        "orchestrator.plan_intent",
+        {"intent_id": intent.intent_id, "actions": [action.value for action in intent.actions]},
+        {"tasks": [task.to_dict() for task in tasks]},
+    )
+    return tasks
+
+
 def map_tasks_to_celery(tasks: Iterable[Task]) -> list[dict[str, str]]:
     celery_tasks: list[dict[str, str]] = []
     for task in tasks:
@@ -63,3 +117,90 @@ def map_tasks_to_celery(tasks: Iterable[Task]) -> list[dict[str, str]]:
             }
         )
     return celery_tasks
+
+
+def build_execution_engine(
+    *,
+    dispatcher: Dispatcher | None = None,
+    planner: TaskPlanner | None = None,
+    state_machine: TaskStateMachine | None = None,
+) -> IntentExecutionEngine:
+    if dispatcher is None:
+        dispatcher = CeleryDispatcher(celery_app, poll_interval=settings.orchestrator_poll_interval)
+    if planner is None or state_machine is None:
+        # The engine dispatches its own tasks, so its planner bypasses the outbox.
+        task_store = _default_task_store()
+        planner = planner or TaskPlanner(task_store=task_store)
+        state_machine = state_machine or TaskStateMachine(task_store=task_store)
+    return IntentExecutionEngine(
+        dispatcher,
+        {action.value: task_name for action, task_name in ACTION_TO_CELERY_TASK.items()},
+        planner=planner,
+        state_machine=state_machine,
+        max_retries=settings.orchestrator_max_retries,
+        poll_interval=settings.orchestrator_poll_interval,
+    )
+
+
+def execute_intent(
+    intent: SalesOpsIntent,
+    *,
+    engine: IntentExecutionEngine | None = None,
+    timeout: float | None = None,
+) -> IntentExecution:
+    """Dispatch every action of ``intent`` and block until its tasks settle."""
+    execution_engine = engine or build_execution_engine()
+    execution = execution_engine.execute(
+        intent.intent_id,
+        [action.value for action in intent.actions],
+        _build_payloads(intent),
+        timeout=timeout,
+    )
+    append_audit_log(
+        "orchestrator.execute_intent",
+        {"intent_id": intent.intent_id, "actions": [action.value for action in intent.actions]},
+        {"status_counts": execution.status_counts(), "elapsed_ms": execution.elapsed_ms},
+    )
+    return execution
+
+
+def stream_intent(intent: SalesOpsIntent, *, consumers_per_stage: int = 2) -> list[str]:
+    """Start ``search_companies`` as a stream and its consumers alongside it.
+
+    Downstream stages pick up each company as soon as it is found instead of
+    waiting for the search to finish. Returns the Celery task ids.
+    """
+    if IntentAction.search_companies not in intent.actions:
+        raise ValueError("Streaming requires the search_companies action.")
+    payloads = _build_payloads(intent)
+    results = [
+        celery_app.send_task(
+            "workers.tasks.company_search_stream",
+            kwargs={"intent_id": intent.intent_id, "payload": payloads["search_companies"]},
+        )
+    ]
+    stages = {
+        task_type: action for action, task_type in STREAMING_ACTIONS.items() if action in intent.actions
+    }
+    # Email generation reads the contact stream, so it needs contact discovery.
+    if "contact_finder" not in stages:
+        stages.pop("email_generator", None)
+    for task_type, action in stages.items():
+        for index in range(consumers_per_stage):
+            results.append(
+                celery_app.send_task(
+                    "workers.tasks.stream_stage",
+                    kwargs={
+                        "task_type": task_type,
+                        "intent_id": intent.intent_id,
+                        "consumer": f"{task_type}-{index}",
+                        "payload": payloads[action.value],
+                    },
+                )
+            )
+    append_audit_log(
+        "orchestrator.stream_intent",
+        {"intent_id": intent.intent_id, "actions": [action.value for action in intent.actions]},
+        {"stages": list(stages), "consumers_per_stage": consumers_per_stage},
+    )
+    return [result.id for result in results]
@@ -1,72 +1,325 @@
 from __future__ import annotations
 
-import json
-import sqlite3
-from datetime import datetime, timezone
+import asyncio
+import logging
+import re
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
 from typing import Any, Callable
-from urllib.parse import urlparse
+from uuid import uuid4
 
-import psycopg
+from psycopg import errors as pg_errors, sql
 
+import serialization
 from app.config import settings
+from audit_payloads import (
+    POSTGRES_INSERT_PAYLOADS,
+    PayloadMap,
+    audit_payloads_schema,
+    decode_payload,
+    encode_payload,
+    payload_ref,
+    payload_rows,
+    store_payloads,
+)
+from batch_writer import BackgroundBatchWriter
+from database import (
+    AsyncPooledConnectionFactory,
+    ConnectionFactory,
+    borrow_connection,
+    default_connection_factory,
+    ensure_schema,
+    get_default_async_pool,
+    is_sqlite_connection as _is_sqlite_connection,
+)
 
 Clock = Callable[[], datetime]
-ConnectionFactory = Callable[[], Any]
+# (trigger_source, intent_id, task_type, input_json, output_result,
+#  input_ref, output_ref, created_at)
+AuditLogRow = tuple[str, str | None, str | None, str, str, str | None, str | None, str]
+
+_PARTITION_NAME = re.compile(r"audit_log_y(\d{4})m(\d{2})")
+
+logger = logging.getLogger(__name__)
 
 
 def default_clock() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def _sqlite_connection_factory(database_url: str) -> ConnectionFactory:
-    parsed = urlparse(database_url)
-    path = parsed.path or ":memory:"
-    if path == "/:memory:":
-        path = ":memory:"
-    return lambda: sqlite3.connect(path)
+_SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trigger_source TEXT NOT NULL,
+        intent_id TEXT,
+        task_type TEXT,
+        input_json TEXT NOT NULL,
+        output_result TEXT NOT NULL,
+        input_ref TEXT,
+        output_ref TEXT,
+        created_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_audit_log_intent_id ON audit_log (intent_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_log_task_type ON audit_log (task_type, id)",
+]
 
+# Monthly range partitions keep time-bounded scans small and let old months
+# be detached in O(1) instead of DELETEd row by row.
+_POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id BIGSERIAL,
+        trigger_source TEXT NOT NULL,
+        intent_id TEXT,
+        task_type TEXT,
+        input_json TEXT NOT NULL,
+        output_result TEXT NOT NULL,
+        input_ref TEXT,
+        output_ref TEXT,
+        created_at TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    "ALTER TABLE audit_log ADD COLUMN IF NOT EXISTS intent_id TEXT",
+    "ALTER TABLE audit_log ADD COLUMN IF NOT EXISTS task_type TEXT",
+    "ALTER TABLE audit_log ADD COLUMN IF NOT EXISTS input_ref TEXT",
+    "ALTER TABLE audit_log ADD COLUMN IF NOT EXISTS output_ref TEXT",
+    "CREATE INDEX IF NOT EXISTS ix_audit_log_created_at ON audit_log USING BRIN (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_log_intent_id ON audit_log (intent_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_audit_log_task_type ON audit_log (task_type, id)",
+]
 
-def _postgres_connection_factory(database_url: str) -> ConnectionFactory:
-    postgres_url = database_url.replace("postgresql+psycopg://", "postgresql://", 1)
-    return lambda: psycopg.connect(postgres_url)
+_SQLITE_INSERT = """
+    INSERT INTO audit_log (
+        trigger_source, intent_id, task_type, input_json, output_result,
+        input_ref, output_ref, created_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
 
+_POSTGRES_INSERT = """
+    INSERT INTO audit_log (
+        trigger_source, intent_id, task_type, input_json, output_result,
+        input_ref, output_ref, created_at
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
 
-def default_connection_factory() -> ConnectionFactory:
-    database_url = settings.database_url
-    if database_url.startswith("sqlite://"):
-        return _sqlite_connection_factory(database_url)
-    return _postgres_connection_factory(database_url)
 
-
-def _is_sqlite_connection(connection: Any) -> bool:
-    return isinstance(connection, sqlite3.Connection)
+def audit_log_schema(*, sqlite: bool) -> list[str]:
+    statements = list(_SQLITE_SCHEMA if sqlite else _POSTGRES_SCHEMA)
+    return statements + audit_payloads_schema(sqlite=sqlite)
 
 
 def initialize_audit_log_table(connection: Any) -> None:
+    for statement in audit_log_schema(sqlite=_is_sqlite_connection(connection)):
+        connection.execute(statement)
+
+
+def _month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month: date) -> date:
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def audit_log_partition_name(month: date) -> str:
+    return f"audit_log_y{month.year:04d}m{month.month:02d}"
+
+
+def audit_log_partition_bound(month: date) -> str:
+    # Rows are bucketed by UTC month; a bare date would be read in the
+    # session TimeZone and shift the bounds on servers not set to UTC.
+    return f"{month.isoformat()} 00:00:00+00:00"
+
+
+def audit_log_partition_statement(month: date) -> sql.Composed:
+    return sql.SQL(
+        "CREATE TABLE IF NOT EXISTS {} PARTITION OF audit_log FOR VALUES FROM ({}) TO ({})"
+    ).format(
+        sql.Identifier(audit_log_partition_name(month)),
+        sql.Literal(audit_log_partition_bound(month)),
+        sql.Literal(audit_log_partition_bound(_next_month(month))),
+    )
+
+
+# Deployments that predate partitioning keep a plain audit_log table, which
+# CREATE TABLE IF NOT EXISTS leaves as it is; partitions cannot be attached
+# to it, so partition management is skipped for such tables.
+AUDIT_LOG_RELKIND_QUERY = "SELECT relkind FROM pg_class WHERE oid = to_regclass('audit_log')"
+
+
+def audit_log_is_partitioned(connection: Any) -> bool:
+    row = connection.execute(AUDIT_LOG_RELKIND_QUERY).fetchone()
+    return row is not None and row[0] == "p"
+
+
+def ensure_audit_log_partition(connection: Any, month: date) -> str:
+    """Create the Postgres partition holding ``month`` if it does not exist."""
+    connection.execute(audit_log_partition_statement(month))
+    return audit_log_partition_name(month)
+
+
+def detach_audit_log_partitions(
+    connection: Any,
+    *,
+    older_than: datetime,
+    concurrently: bool = False,
+) -> list[str]:
+    """Detach every monthly partition that ends on or before ``older_than``.
+
+    Detached tables keep their rows and can be archived or dropped separately.
+    ``concurrently`` requires Postgres 14+ and autocommit, since DETACH
+    PARTITION CONCURRENTLY cannot run inside a transaction block. SQLite has
+    no partitions, so nothing is detached there. Stores that still cache a
+    detached month recreate its partition when a row for it fails to insert.
+    """
     if _is_sqlite_connection(connection):
-        connection.execute(
-            """
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                trigger_source TEXT NOT NULL,
-                input_json TEXT NOT NULL,
-                output_result TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-            """
-        )
-    else:
-        connection.execute(
-            """
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id BIGSERIAL PRIMARY KEY,
-                trigger_source TEXT NOT NULL,
-                input_json TEXT NOT NULL,
-                output_result TEXT NOT NULL,
-                created_at TIMESTAMPTZ NOT NULL
-            )
-            """
-        )
+        return []
+    rows = connection.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        WHERE parent.relname = 'audit_log'
+        """
+    ).fetchall()
+    cutoff = older_than.date()
+    detached: list[str] = []
+    for (name,) in sorted(rows):
+        match = _PARTITION_NAME.fullmatch(name)
+        if match is None:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if _next_month(month) > cutoff:
+            continue
+        statement = "ALTER TABLE audit_log DETACH PARTITION {}"
+        if concurrently:
+            statement += " CONCURRENTLY"
+        connection.execute(sql.SQL(statement).format(sql.Identifier(name)))
+        detached.append(name)
+    if not concurrently:
+        connection.commit()
+    return detached
+
+
+def _extract_identity(
+    trigger_source: str,
+    input_payload: dict[str, Any],
+) -> tuple[str | None, str | None]:
+    task = input_payload.get("task")
+    task_payload = task if isinstance(task, dict) else {}
+    intent_id = input_payload.get("intent_id") or task_payload.get("intent_id")
+    task_type = input_payload.get("task_type") or task_payload.get("task_type")
+    if task_type is None and trigger_source.startswith("worker."):
+        task_type = trigger_source.removeprefix("worker.")
+    return (
+        str(intent_id) if intent_id is not None else None,
+        str(task_type) if task_type is not None else None,
+    )
+
+
+@dataclass(frozen=True)
+class AuditLogEntry:
+    id: int
+    trigger_source: str
+    intent_id: str | None
+    task_type: str | None
+    input_json: str
+    output_result: str
+    created_at: datetime
+
+
+def _row_to_entry(row: Sequence[Any]) -> AuditLogEntry:
+    (
+        entry_id,
+        trigger_source,
+        intent_id,
+        task_type,
+        input_json,
+        output_result,
+        created_at,
+        input_encoding,
+        input_body,
+        output_encoding,
+        output_body,
+    ) = row
+    if input_body is not None:
+        input_json = decode_payload(input_encoding, input_body)
+    if output_body is not None:
+        output_result = decode_payload(output_encoding, output_body)
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return AuditLogEntry(
+        id=int(entry_id),
+        trigger_source=trigger_source,
+        intent_id=intent_id,
+        task_type=task_type,
+        input_json=input_json,
+        output_result=output_result,
+        created_at=created_at,
+    )
+
+
+def _build_select(
+    *,
+    sqlite: bool,
+    trigger_source: str | None,
+    intent_id: str | None,
+    since: datetime | None,
+    until: datetime | None,
+    after_id: int | None,
+    limit: int | None,
+) -> tuple[str, list[Any]]:
+    placeholder = "?" if sqlite else "%s"
+    clauses: list[str] = []
+    params: list[Any] = []
+
+    def _timestamp(value: datetime) -> Any:
+        if not sqlite:
+            return value
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat()
+
+    for column, operator, value in (
+        ("trigger_source", "=", trigger_source),
+        ("intent_id", "=", intent_id),
+        ("created_at", ">=", _timestamp(since) if since else None),
+        ("created_at", "<", _timestamp(until) if until else None),
+        ("id", ">", after_id),
+    ):
+        if value is not None:
+            clauses.append(f"audit_log.{column} {operator} {placeholder}")
+            params.append(value)
+    query = """
+        SELECT audit_log.id, audit_log.trigger_source, audit_log.intent_id, audit_log.task_type,
+               audit_log.input_json, audit_log.output_result, audit_log.created_at,
+               input_payload.encoding, input_payload.body,
+               output_payload.encoding, output_payload.body
+        FROM audit_log
+        LEFT JOIN audit_payloads AS input_payload ON input_payload.ref = audit_log.input_ref
+        LEFT JOIN audit_payloads AS output_payload ON output_payload.ref = audit_log.output_ref
+    """
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY audit_log.id"
+    if limit is not None:
+        query += f" LIMIT {placeholder}"
+        params.append(limit)
+    return query, params
+
+
+def _row_months(rows: Sequence[AuditLogRow]) -> set[date]:
+    return {_month_start(datetime.fromisoformat(row[-1])) for row in rows}
 
 
 class AuditLogStore:
@@ -76,10 +329,37 @@ class AuditLogStore:
         *,
         clock: Clock | None = None,
         close_connection: bool = True,
+        dedup_payloads: bool = False,
+        dedup_min_bytes: int = 256,
+        compress_payloads: bool = True,
     ) -> None:
         self._connection_factory = connection_factory
         self._clock = clock or default_clock
         self._close_connection = close_connection
+        self._dedup_payloads = dedup_payloads
+        self._dedup_min_bytes = dedup_min_bytes
+        self._compress_payloads = compress_payloads
+        self._partitions: set[date] = set()
+        # None until checked on the first Postgres write.
+        self._partitioned: bool | None = None
+
+    def encode(
+        self,
+        trigger_source: str,
+        input_payload: dict[str, Any],
+        output_result: dict[str, Any],
+    ) -> AuditLogRow:
+        intent_id, task_type = _extract_identity(trigger_source, input_payload)
+        return (
+            trigger_source,
+            intent_id,
+            task_type,
+            serialization.dumps(input_payload),
+            serialization.dumps(output_result),
+            None,
+            None,
+            self._clock().isoformat(),
+        )
 
     def append(
         self,
@@ -87,39 +367,390 @@ class AuditLogStore:
         input_payload: dict[str, Any],
         output_result: dict[str, Any],
     ) -> None:
-        created_at = self._clock().isoformat()
-        input_json = json.dumps(input_payload, sort_keys=True)
-        output_json = json.dumps(output_result, sort_keys=True)
-        connection = self._connection_factory()
+        self.write_rows([self.encode(trigger_source, input_payload, output_result)])
+
+    def append_many(
+        self,
+        entries: Sequence[tuple[str, dict[str, Any], dict[str, Any]]],
+    ) -> None:
+        """Append ``(trigger_source, input_payload, output_result)`` entries in one write."""
+        self.write_rows([self.encode(*entry) for entry in entries])
+
+    def write_rows(self, rows: Sequence[AuditLogRow]) -> None:
+        if not rows:
+            return
+        for attempt in range(2):
+            with borrow_connection(
+                self._connection_factory,
+                close_connection=self._close_connection,
+            ) as connection:
+                try:
+                    months = self.insert_rows(connection, rows)
+                    connection.commit()
+                except pg_errors.CheckViolation:
+                    # insert_rows forgot the detached partitions; retry once.
+                    connection.rollback()
+                    if attempt:
+                        raise
+                    continue
+            self.mark_partitions(months)
+            return
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """Yield a connection for ``insert_rows`` and other writes that commit together."""
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            try:
+                yield connection
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    def insert_rows(self, connection: Any, rows: Sequence[AuditLogRow]) -> list[date]:
+        """Insert ``rows`` on ``connection`` without committing.
+
+        Lets callers write audit rows in the same transaction as their own
+        changes. Returns the partitions created, to pass to
+        ``mark_partitions`` once the transaction has committed. If a row
+        lands in no partition (one was detached after this store created
+        it), its month is forgotten so the caller's retry recreates it.
+        """
+        ensure_schema(
+            self._connection_factory,
+            connection,
+            "audit_log",
+            initialize_audit_log_table,
+        )
+        rows, payloads = self.prepare_rows(rows)
+        store_payloads(connection, payloads)
+        if _is_sqlite_connection(connection):
+            connection.executemany(_SQLITE_INSERT, rows)
+            return []
+        if self._partitioned is None:
+            self.set_partitioned(audit_log_is_partitioned(connection))
+        months = self.missing_partitions(rows)
+        for month in months:
+            ensure_audit_log_partition(connection, month)
         try:
-            initialize_audit_log_table(connection)
-            if _is_sqlite_connection(connection):
-                connection.execute(
-                    """
-                    INSERT INTO audit_log (trigger_source, input_json, output_result, created_at)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (trigger_source, input_json, output_json, created_at),
+            with connection.cursor() as cursor:
+                cursor.executemany(_POSTGRES_INSERT, rows)
+        except pg_errors.CheckViolation:
+            self.forget_partitions(rows)
+            raise
+        return months
+
+    def list(
+        self,
+        *,
+        trigger_source: str | None = None,
+        intent_id: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        after_id: int | None = None,
+        limit: int = 50,
+    ) -> list[AuditLogEntry]:
+        """Return one keyset page: entries with ``id > after_id``, oldest first."""
+        return list(
+            self.iter_entries(
+                trigger_source=trigger_source,
+                intent_id=intent_id,
+                since=since,
+                until=until,
+                after_id=after_id,
+                limit=limit,
+            )
+        )
+
+    def iter_entries(
+        self,
+        *,
+        trigger_source: str | None = None,
+        intent_id: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+        batch_size: int = 1000,
+    ) -> Iterator[AuditLogEntry]:
+        """Yield matching entries in id order without materializing the result.
+
+        On Postgres rows come from a named (server-side) cursor fetched
+        ``batch_size`` at a time, so memory stays flat regardless of how many
+        rows match. The connection is held until the iterator is exhausted
+        or closed.
+        """
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "audit_log",
+                initialize_audit_log_table,
+            )
+            sqlite = _is_sqlite_connection(connection)
+            query, params = _build_select(
+                sqlite=sqlite,
+                trigger_source=trigger_source,
+                intent_id=intent_id,
+                since=since,
+                until=until,
+                after_id=after_id,
+                limit=limit,
+            )
+            if sqlite:
+                cursor = connection.execute(query, params)
+                try:
+                    while rows := cursor.fetchmany(batch_size):
+                        for row in rows:
+                            yield _row_to_entry(row)
+                finally:
+                    cursor.close()
+                return
+            with connection.cursor(name=f"audit_log_scan_{uuid4().hex}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield _row_to_entry(row)
+
+    def prepare_rows(self, rows: Sequence[AuditLogRow]) -> tuple[list[AuditLogRow], PayloadMap]:
+        """Move large JSON blobs out of ``rows`` when deduplication is on.
+
+        Returns the rows to insert plus the audit_payloads entries they
+        reference. The audit row keeps an empty inline column and the content
+        hash; identical payloads (cache hits, repeated task lists) are stored
+        once.
+        """
+        payloads: dict[str, tuple[str, int, bytes]] = {}
+        if not self._dedup_payloads:
+            return list(rows), payloads
+
+        def _externalize(text: str) -> tuple[str, str | None]:
+            if len(text) < self._dedup_min_bytes:
+                return text, None
+            ref = payload_ref(text)
+            if ref not in payloads:
+                encoding, body = encode_payload(text, compress=self._compress_payloads)
+                payloads[ref] = (encoding, len(text), body)
+            return "", ref
+
+        externalized: list[AuditLogRow] = []
+        for trigger_source, intent_id, task_type, input_json, output_json, _, _, created_at in rows:
+            input_inline, input_ref = _externalize(input_json)
+            output_inline, output_ref = _externalize(output_json)
+            externalized.append(
+                (
+                    trigger_source,
+                    intent_id,
+                    task_type,
+                    input_inline,
+                    output_inline,
+                    input_ref,
+                    output_ref,
+                    created_at,
                 )
-            else:
-                connection.execute(
-                    """
-                    INSERT INTO audit_log (trigger_source, input_json, output_result, created_at)
-                    VALUES (%s, %s, %s, %s)
-                    """,
-                    (trigger_source, input_json, output_json, created_at),
+            )
+        return externalized, payloads
+
+    @property
+    def partitioned(self) -> bool | None:
+        return self._partitioned
+
+    def set_partitioned(self, partitioned: bool) -> None:
+        if not partitioned:
+            logger.warning(
+                "audit_log is not a partitioned table; monthly partitions are not managed"
+            )
+        self._partitioned = partitioned
+
+    def missing_partitions(self, rows: Sequence[AuditLogRow]) -> list[date]:
+        """Months in ``rows`` whose Postgres partition this store has not ensured yet."""
+        if self._partitioned is False:
+            return []
+        return sorted(_row_months(rows) - self._partitions)
+
+    def mark_partitions(self, months: Sequence[date]) -> None:
+        self._partitions.update(months)
+
+    def forget_partitions(self, rows: Sequence[AuditLogRow]) -> None:
+        self._partitions.difference_update(_row_months(rows))
+
+    def flush(self, timeout: float | None = None) -> None:
+        """Synchronous stores have nothing buffered."""
+
+    def close(self, timeout: float | None = None) -> None:
+        """Synchronous stores hold no resources between calls."""
+
+
+class BufferedAuditLogStore(AuditLogStore):
+    """Audit store that queues rows and writes them from a background thread.
+
+    ``append`` only serializes the row and puts it on a bounded queue; a
+    ``BackgroundBatchWriter`` group-commits up to ``batch_size`` rows at a
+    time, or whatever has accumulated after ``flush_interval`` seconds. When
+    the queue is full ``append`` blocks, applying backpressure instead of
+    dropping audit records.
+    """
+
+    def __init__(
+        self,
+        connection_factory: ConnectionFactory,
+        *,
+        clock: Clock | None = None,
+        close_connection: bool = True,
+        max_buffer: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        **options: Any,
+    ) -> None:
+        super().__init__(
+            connection_factory,
+            clock=clock,
+            close_connection=close_connection,
+            **options,
+        )
+        self._writer: BackgroundBatchWriter[AuditLogRow] = BackgroundBatchWriter(
+            lambda rows: self.write_rows(rows),
+            name="audit-log-writer",
+            max_buffer=max_buffer,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+        )
+
+    def append(
+        self,
+        trigger_source: str,
+        input_payload: dict[str, Any],
+        output_result: dict[str, Any],
+    ) -> None:
+        self._writer.put(self.encode(trigger_source, input_payload, output_result))
+
+    def append_many(
+        self,
+        entries: Sequence[tuple[str, dict[str, Any], dict[str, Any]]],
+    ) -> None:
+        self._writer.put_many(self.encode(*entry) for entry in entries)
+
+    def flush(self, timeout: float | None = None) -> None:
+        self._writer.flush(timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        self._writer.close(timeout)
+
+
+class AsyncAuditLogStore:
+    """Awaitable front end for an ``AuditLogStore``, for use on the event loop.
+
+    With an async pool, rows are encoded by the wrapped store and inserted on
+    an ``AsyncConnection``. Without one (SQLite, pooling disabled) the sync
+    store runs in a worker thread. Buffered stores are called directly since
+    their ``append`` only enqueues.
+    """
+
+    def __init__(
+        self,
+        store: AuditLogStore,
+        pool: AsyncPooledConnectionFactory | None = None,
+    ) -> None:
+        self._store = store
+        self._pool = pool
+
+    async def append(
+        self,
+        trigger_source: str,
+        input_payload: dict[str, Any],
+        output_result: dict[str, Any],
+    ) -> None:
+        if isinstance(self._store, BufferedAuditLogStore):
+            self._store.append(trigger_source, input_payload, output_result)
+            return
+        if self._pool is None:
+            await asyncio.to_thread(self._store.append, trigger_source, input_payload, output_result)
+            return
+        await self.write_rows([self._store.encode(trigger_source, input_payload, output_result)])
+
+    async def write_rows(self, rows: Sequence[AuditLogRow]) -> None:
+        if not rows:
+            return
+        if self._pool is None:
+            await asyncio.to_thread(self._store.write_rows, rows)
+            return
+        rows, payloads = self._store.prepare_rows(rows)
+        for attempt in range(2):
+            async with self._pool.connection() as connection:
+                await self._pool.ensure_schema(
+                    "audit_log",
+                    audit_log_schema(sqlite=False),
                 )
-            connection.commit()
-        finally:
-            if self._close_connection:
-                connection.close()
+                if self._store.partitioned is None:
+                    cursor = await connection.execute(AUDIT_LOG_RELKIND_QUERY)
+                    row = await cursor.fetchone()
+                    self._store.set_partitioned(row is not None and row[0] == "p")
+                months = self._store.missing_partitions(rows)
+                try:
+                    async with connection.cursor() as cursor:
+                        if payloads:
+                            await cursor.executemany(
+                                POSTGRES_INSERT_PAYLOADS,
+                                payload_rows(payloads),
+                            )
+                        for month in months:
+                            await cursor.execute(audit_log_partition_statement(month))
+                        await cursor.executemany(_POSTGRES_INSERT, rows)
+                    await connection.commit()
+                except pg_errors.CheckViolation:
+                    # A partition was detached since it was ensured; recreate it.
+                    await connection.rollback()
+                    self._store.forget_partitions(rows)
+                    if attempt:
+                        raise
+                    continue
+            self._store.mark_partitions(months)
+            return
 
 
 _DEFAULT_STORE: AuditLogStore | None = None
+_DEFAULT_ASYNC_STORE: AsyncAuditLogStore | None = None
 
 
 def get_default_audit_log_store() -> AuditLogStore:
     global _DEFAULT_STORE
     if _DEFAULT_STORE is None:
-        _DEFAULT_STORE = AuditLogStore(default_connection_factory())
+        options: dict[str, Any] = {
+            "dedup_payloads": settings.audit_log_dedup_payloads,
+            "dedup_min_bytes": settings.audit_log_dedup_min_bytes,
+            "compress_payloads": settings.audit_log_compress_payloads,
+        }
+        if settings.audit_log_buffered:
+            _DEFAULT_STORE = BufferedAuditLogStore(
+                default_connection_factory(),
+                max_buffer=settings.audit_log_buffer_size,
+                batch_size=settings.audit_log_batch_size,
+                flush_interval=settings.audit_log_flush_interval,
+                **options,
+            )
+        else:
+            _DEFAULT_STORE = AuditLogStore(default_connection_factory(), **options)
     return _DEFAULT_STORE
+
+
+def get_default_async_audit_log_store() -> AsyncAuditLogStore:
+    global _DEFAULT_ASYNC_STORE
+    if _DEFAULT_ASYNC_STORE is None:
+        _DEFAULT_ASYNC_STORE = AsyncAuditLogStore(
+            get_default_audit_log_store(),
+            get_default_async_pool(),
+        )
+    return _DEFAULT_ASYNC_STORE
+
+
+def shutdown_default_audit_log_store(timeout: float | None = 10.0) -> None:
+    """Flush and stop the default store's writer, if one was started."""
+    if _DEFAULT_STORE is not None:
+        _DEFAULT_STORE.flush(timeout)
+        _DEFAULT_STORE.close(timeout)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import Mapping
+from typing import Any
+
+from database import is_sqlite_connection as _is_sqlite_connection
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+ENCODING_RAW = "raw"
+ENCODING_ZSTD = "zstd"
+
+EncodedPayload = tuple[str, bytes]
+
+
+_SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS audit_payloads (
+        ref TEXT PRIMARY KEY,
+        encoding TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        body BLOB NOT NULL
+    )
+    """,
+]
+
+_POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS audit_payloads (
+        ref TEXT PRIMARY KEY,
+        encoding TEXT NOT NULL,
+        size_bytes INTEGER NOT NULL,
+        body BYTEA NOT NULL
+    )
+    """,
+]
+
+_SQLITE_INSERT = """
+    INSERT OR IGNORE INTO audit_payloads (ref, encoding, size_bytes, body)
+    VALUES (?, ?, ?, ?)
+"""
+
+POSTGRES_INSERT_PAYLOADS = """
+    INSERT INTO audit_payloads (ref, encoding, size_bytes, body)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (ref) DO NOTHING
+"""
+
+PayloadMap = Mapping[str, tuple[str, int, bytes]]
+
+
+def audit_payloads_schema(*, sqlite: bool) -> list[str]:
+    return list(_SQLITE_SCHEMA if sqlite else _POSTGRES_SCHEMA)
+
+
+def initialize_audit_payloads_table(connection: Any) -> None:
+    for statement in audit_payloads_schema(sqlite=_is_sqlite_connection(connection)):
+        connection.execute(statement)
+
+
+def payload_ref(text: str) -> str:
+    return "sha256:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compression_available() -> bool:
+    return zstandard is not None
+
+
+def encode_payload(text: str, *, compress: bool = True) -> EncodedPayload:
+    raw = text.encode("utf-8")
+    if compress and zstandard is not None:
+        compressed = zstandard.ZstdCompressor(level=3).compress(raw)
+        if len(compressed) < len(raw):
+            return ENCODING_ZSTD, compressed
+    return ENCODING_RAW, raw
+
+
+def decode_payload(encoding: str, body: bytes | memoryview) -> str:
+    data = bytes(body)
+    if encoding == ENCODING_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed audit payloads.")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding != ENCODING_RAW:
+        raise ValueError(f"Unknown audit payload encoding: {encoding}")
+    return data.decode("utf-8")
+
+
+def payload_rows(payloads: PayloadMap) -> list[tuple[str, str, int, bytes]]:
+    return [(ref, encoding, size, body) for ref, (encoding, size, body) in payloads.items()]
+
+
+def store_payloads(connection: Any, payloads: PayloadMap) -> None:
+    """Insert ``{ref: (encoding, size_bytes, body)}``; refs already stored are skipped."""
+    if not payloads:
+        return
+    rows = payload_rows(payloads)
+    if _is_sqlite_connection(connection):
+        connection.executemany(_SQLITE_INSERT, rows)
+    else:
+        with connection.cursor() as cursor:
+            cursor.executemany(POSTGRES_INSERT_PAYLOADS, rows)
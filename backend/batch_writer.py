@@ -0,0 +1,129 @@
+"""Background thread that group-commits queued rows.
+
+Used by the buffered audit log and the write-behind task result store:
+callers ``put`` rows on a bounded queue and a daemon thread hands them to
+``write`` up to ``batch_size`` at a time, or whatever has accumulated after
+``flush_interval`` seconds. When the queue is full ``put`` blocks, applying
+backpressure instead of dropping rows.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+Row = TypeVar("Row")
+
+
+class BackgroundBatchWriter(Generic[Row]):
+    def __init__(
+        self,
+        write: Callable[[Sequence[Row]], Any],
+        *,
+        name: str,
+        max_buffer: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+    ) -> None:
+        self._write = write
+        self._name = name
+        self._max_buffer = max_buffer
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: queue.Queue[Row | None] = queue.Queue(maxsize=max_buffer)
+        self._thread: threading.Thread | None = None
+        self._owner_pid: int | None = None
+        self._start_lock = threading.Lock()
+
+    def put(self, row: Row) -> None:
+        self._ensure_thread()
+        self._queue.put(row)
+
+    def put_many(self, rows: Iterable[Row]) -> None:
+        self._ensure_thread()
+        for row in rows:
+            self._queue.put(row)
+
+    def flush(self, timeout: float | None = None) -> None:
+        """Wait until every queued row has been written (or ``timeout`` passes)."""
+        if self._thread is None or self._owner_pid != os.getpid():
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return
+                self._queue.all_tasks_done.wait(remaining)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Write what is queued and stop the thread."""
+        thread = self._thread
+        if thread is None or self._owner_pid != os.getpid():
+            return
+        if not thread.is_alive():
+            self._thread = None
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        if not thread.is_alive():
+            # A thread still draining after ``timeout`` stays registered, so
+            # a later put does not start a second one on the same queue.
+            self._thread = None
+
+    def _running(self, pid: int) -> bool:
+        return self._thread is not None and self._owner_pid == pid and self._thread.is_alive()
+
+    def _ensure_thread(self) -> None:
+        pid = os.getpid()
+        if self._running(pid):
+            return
+        with self._start_lock:
+            if self._running(pid):
+                return
+            if self._owner_pid != pid:
+                # Forked child: the parent's queue and writer thread did not survive.
+                self._queue = queue.Queue(maxsize=self._max_buffer)
+            self._owner_pid = pid
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: list[Row] = []
+            taken = 0
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                continue
+            taken += 1
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+            deadline = time.monotonic() + self._flush_interval
+            while not stopping and len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception:  # noqa: BLE001
+                logger.exception("%s failed to write %d rows", self._name, len(batch))
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
@@ -0,0 +1,97 @@
+"""API p99 latency under concurrent load as database latency grows.
+
+Fires concurrent requests at ``/health`` and a deadletter listing through
+the ASGI app while every SQL statement is delayed by an injected latency.
+The "blocking" route calls the sync ``DeadLetterStore`` from ``async def``
+(how ``/deadletter`` used to work), so each round trip stalls the event loop
+and ``/health`` p99 grows with database latency. The real ``/deadletter``
+route awaits ``AsyncDeadLetterStore`` and ``/health`` stays flat::
+
+    python -m benchmarks.api_latency --requests 200 --latencies 0,10,50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sqlite3
+import time
+from typing import Any
+
+import httpx
+
+from app.main import app
+from orchestrator import deadletter_store
+from orchestrator.deadletter_store import AsyncDeadLetterStore, DeadLetterStore
+
+
+class SlowConnection(sqlite3.Connection):
+    latency = 0.0
+
+    def execute(self, *args: Any, **kwargs: Any) -> sqlite3.Cursor:
+        time.sleep(self.latency)
+        return super().execute(*args, **kwargs)
+
+
+def _slow_store(latency: float) -> DeadLetterStore:
+    connection = sqlite3.connect(":memory:", factory=SlowConnection, check_same_thread=False)
+    connection.latency = latency
+    return DeadLetterStore(lambda: connection, close_connection=False)
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+async def _run(path: str, requests: int, interval: float) -> dict[str, list[float]]:
+    """Open-loop load: request ``i`` is due at ``i * interval``.
+
+    Latency is measured from the due time, so time a request spends waiting
+    for a blocked event loop is counted against it.
+    """
+    timings: dict[str, list[float]] = {"/health": [], path: []}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+
+        async def _one(index: int) -> None:
+            url = "/health" if index % 2 else path
+            due = started + index * interval
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            response = await client.get(url)
+            response.raise_for_status()
+            timings[url].append(time.perf_counter() - due)
+
+        await asyncio.gather(*(_one(index) for index in range(requests)))
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=200.0, help="requests per second")
+    parser.add_argument("--latencies", default="0,10,50", help="comma-separated DB latencies in ms")
+    args = parser.parse_args()
+
+    blocking_store: DeadLetterStore | None = None
+
+    @app.get("/bench/blocking-deadletter", include_in_schema=False)
+    async def _blocking_deadletter() -> int:
+        assert blocking_store is not None
+        return len(blocking_store.list())
+
+    print(f"{'db ms':>6} {'route':<28} {'health p99':>11} {'route p99':>10}")
+    for latency_ms in (float(value) for value in args.latencies.split(",")):
+        blocking_store = _slow_store(latency_ms / 1000)
+        deadletter_store._DEFAULT_ASYNC_STORE = AsyncDeadLetterStore(_slow_store(latency_ms / 1000))
+        for path in ("/bench/blocking-deadletter", "/deadletter"):
+            timings = asyncio.run(_run(path, args.requests, 1 / args.rate))
+            print(
+                f"{latency_ms:6.0f} {path:<28} "
+                f"{_percentile(timings['/health'], 0.99):9.1f}ms "
+                f"{_percentile(timings[path], 0.99):8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Audit storage saved by content-addressed payload deduplication.
+
+Replays audit traffic into two SQLite databases, one storing payloads
+inline and one with ``dedup_payloads=True``, then reports payload bytes and
+database size for each. Feed it a real trace exported from the API::
+
+    curl -s 'http://localhost:8000/audit/stream?since=2024-06-01' > trace.ndjson
+    python -m benchmarks.audit_payload_dedup --trace trace.ndjson
+
+Without ``--trace`` a synthetic trace shaped like production traffic is used:
+each intent plans its tasks twice (planner and orchestrator service), runs
+every worker once and then serves a number of cached duplicates.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+from collections.abc import Iterator
+from typing import Any
+
+from audit_log import AuditLogStore
+from audit_payloads import compression_available
+
+AuditEvent = tuple[str, dict[str, Any], dict[str, Any]]
+
+
+def _replay_trace(path: str) -> Iterator[AuditEvent]:
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield (
+                record["trigger_source"],
+                json.loads(record["input_json"]),
+                json.loads(record["output_result"]),
+            )
+
+
+def _synthetic_trace(intents: int, duplicates: int) -> Iterator[AuditEvent]:
+    task_types = ["company_search", "contact_finder", "news_collector", "email_generator"]
+    for intent_index in range(intents):
+        intent_id = f"intent-{intent_index}"
+        tasks = [
+            {
+                "task_id": f"{intent_id}-{task_type}",
+                "intent_id": intent_id,
+                "task_type": task_type,
+                "status": "queued",
+                "payload": {"filters": {"industries": ["SaaS"], "regions": ["APAC"]}},
+            }
+            for task_type in task_types
+        ]
+        yield "orchestrator.plan_tasks", {"intent_id": intent_id, "task_types": task_types}, {"tasks": tasks}
+        yield "orchestrator.plan_intent", {"intent_id": intent_id}, {"tasks": tasks}
+        for task_type in task_types:
+            payload = {"query": "saas", "filters": {"regions": ["APAC"]}}
+            response = {
+                "status": "success",
+                "task_type": task_type,
+                "idempotency_key": f"{intent_id}:{task_type}:none",
+                "result": {"items": [{"name": f"Company {i}", "domain": f"c{i}.example"} for i in range(50)]},
+            }
+            source = f"worker.{task_type}"
+            yield source, {"intent_id": intent_id, "payload": payload}, response
+            for _ in range(duplicates):
+                yield source, {"intent_id": intent_id, "payload": payload, "cached": True}, response
+
+
+def _measure(events: list[AuditEvent], *, dedup: bool, min_bytes: int) -> dict[str, int]:
+    connection = sqlite3.connect(":memory:")
+    store = AuditLogStore(
+        lambda: connection,
+        close_connection=False,
+        dedup_payloads=dedup,
+        dedup_min_bytes=min_bytes,
+    )
+    for trigger_source, input_payload, output_result in events:
+        store.append(trigger_source, input_payload, output_result)
+    inline = connection.execute(
+        "SELECT COALESCE(SUM(LENGTH(input_json) + LENGTH(output_result)), 0) FROM audit_log"
+    ).fetchone()[0]
+    side = connection.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM audit_payloads").fetchone()[0]
+    connection.execute("VACUUM")
+    page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+    page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+    return {"payload_bytes": inline + side, "database_bytes": page_count * page_size}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trace", help="NDJSON exported from GET /audit/stream")
+    parser.add_argument("--intents", type=int, default=200)
+    parser.add_argument("--duplicates", type=int, default=3)
+    parser.add_argument("--min-bytes", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.trace:
+        events = list(_replay_trace(args.trace))
+    else:
+        events = list(_synthetic_trace(args.intents, args.duplicates))
+
+    inline = _measure(events, dedup=False, min_bytes=args.min_bytes)
+    deduped = _measure(events, dedup=True, min_bytes=args.min_bytes)
+
+    print(f"events replayed:  {len(events)}")
+    print(f"zstd compression: {'on' if compression_available() else 'off (zstandard not installed)'}")
+    for metric in ("payload_bytes", "database_bytes"):
+        saved = 1 - deduped[metric] / inline[metric] if inline[metric] else 0.0
+        print(f"{metric:<16}  inline {inline[metric]:>12,}  deduped {deduped[metric]:>12,}  saved {saved:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
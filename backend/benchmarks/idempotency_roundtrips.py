@@ -0,0 +1,118 @@
+"""Redis round trips per idempotent task: legacy command sequence vs. Lua scripts.
+
+Counts the commands each protocol sends for a fresh, a cached and a locked
+task, and times them against a real server when ``--redis-url`` is given
+(fakeredis otherwise, which only makes the counts meaningful)::
+
+    python -m benchmarks.idempotency_roundtrips --redis-url redis://localhost:6379/15
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Callable
+from uuid import uuid4
+
+import redis
+
+from workers import idempotency
+
+LOCK_TTL = 300
+RESULT_TTL = 86400
+RESULT = '{"status":"success"}'
+
+
+class CountingRedis(redis.Redis):
+    calls = 0
+
+    def execute_command(self, *args: Any, **options: Any) -> Any:
+        self.calls += 1
+        return super().execute_command(*args, **options)
+
+
+def _client(redis_url: str | None) -> CountingRedis:
+    if redis_url:
+        return CountingRedis.from_url(redis_url, decode_responses=True)
+    import fakeredis
+
+    class CountingFakeRedis(CountingRedis, fakeredis.FakeRedis):
+        pass
+
+    return CountingFakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+
+def _legacy(client: redis.Redis, result_key: str, lock_key: str) -> None:
+    # Mirrors the GET / SET NX / GET / SET / GET+DEL flow the worker used to run.
+    if client.get(result_key):
+        return
+    token = str(uuid4())
+    if not client.set(lock_key, token, nx=True, ex=LOCK_TTL):
+        client.get(result_key)
+        return
+    try:
+        client.set(result_key, RESULT, ex=RESULT_TTL)
+    finally:
+        if client.get(lock_key) == token:
+            client.delete(lock_key)
+
+
+def _scripted(client: redis.Redis, result_key: str, lock_key: str) -> None:
+    token = str(uuid4())
+    outcome, _ = idempotency.acquire_or_fetch(client, result_key, lock_key, token, LOCK_TTL)
+    if outcome == idempotency.ACQUIRED:
+        idempotency.store_result_and_release(
+            client, result_key, lock_key, token, RESULT, RESULT_TTL
+        )
+
+
+def _scenarios(client: redis.Redis) -> dict[str, Callable[[str, str], None]]:
+    def fresh(result_key: str, lock_key: str) -> None:
+        client.delete(result_key, lock_key)
+
+    def cached(result_key: str, lock_key: str) -> None:
+        client.set(result_key, RESULT)
+        client.delete(lock_key)
+
+    def locked(result_key: str, lock_key: str) -> None:
+        client.delete(result_key)
+        client.set(lock_key, "another-worker")
+
+    return {"fresh": fresh, "cached": cached, "locked": locked}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = _client(args.redis_url)
+    prefix = f"bench:{uuid4()}"
+    result_key, lock_key = f"result:{prefix}", f"lock:{prefix}"
+    protocols = {"legacy": _legacy, "scripted": _scripted}
+    try:
+        for scenario, prepare in _scenarios(client).items():
+            for name, protocol in protocols.items():
+                # Warm-up run so the script SHA is cached and not counted.
+                prepare(result_key, lock_key)
+                protocol(client, result_key, lock_key)
+                calls = 0
+                elapsed = 0.0
+                for _ in range(args.iterations):
+                    prepare(result_key, lock_key)
+                    client.calls = 0
+                    started = time.perf_counter()
+                    protocol(client, result_key, lock_key)
+                    elapsed += time.perf_counter() - started
+                    calls += client.calls
+                print(
+                    f"{scenario:<7} {name:<9} "
+                    f"{calls / args.iterations:4.1f} calls/task  "
+                    f"{elapsed / args.iterations * 1e6:8.1f} us/task"
+                )
+    finally:
+        client.delete(result_key, lock_key)
+
+
+if __name__ == "__main__":
+    main()
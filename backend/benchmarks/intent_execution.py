@@ -0,0 +1,130 @@
+"""End-to-end intent latency: one task at a time vs. the DAG execution engine.
+
+Runs full intents (all six actions) through ``IntentExecutionEngine`` with
+the real worker tasks, stub providers that sleep for a fixed latency and
+fakeredis. ``sequential`` gives the dispatcher a single worker, so stages
+and entities run one after another as a chain of blocking calls would; ``dag``
+lets independent stages and entities overlap::
+
+    python -m benchmarks.intent_execution --intents 5 --companies 5
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import time
+from typing import Any
+from uuid import uuid4
+
+import fakeredis
+
+from app.config import settings
+from apps.api.services.orchestrator import ACTION_TO_CELERY_TASK, build_execution_engine
+from apps.api.services.intent_validator import IntentAction
+from audit_log import AuditLogStore
+from orchestrator.deadletter_store import DeadLetterStore
+from orchestrator.engine import LocalDispatcher
+from orchestrator.planner import TaskPlanner
+from orchestrator.state_machine import TaskStateMachine
+from workers import tasks
+
+# Simulated provider latencies in seconds.
+LATENCIES = {
+    "search": 0.2,
+    "contacts": 0.15,
+    "news": 0.15,
+}
+
+
+class NullAuditLogStore(AuditLogStore):
+    def __init__(self) -> None:
+        super().__init__(lambda: sqlite3.connect(":memory:"))
+
+    def append(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def append_many(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+def _install_stubs(companies: int) -> None:
+    def _search(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(LATENCIES["search"])
+        return [{"name": f"Company {index}", "source": "stub"} for index in range(companies)]
+
+    def _contacts(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(LATENCIES["contacts"])
+        return [{"name": "Taylor", "email": "taylor@example.com", "source": "stub"}]
+
+    def _news(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(LATENCIES["news"])
+        return [{"title": "Update", "url": "https://news.example", "source": "stub"}]
+
+    tasks.search_companies_with_playwright = _search
+    tasks.search_companies_with_selenium = lambda payload: []
+    tasks.find_contacts_with_mailscout = _contacts
+    tasks.find_contacts_with_theharvester = _contacts
+    tasks.collect_news_with_newsapi = _news
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    tasks.get_redis_client = lambda: client
+    tasks.AUDIT_LOG_STORE = NullAuditLogStore()
+    settings.worker_durable_result_task_types = []
+    settings.worker_provider_quotas = {
+        bucket: {"rate": 1_000_000, "burst": 1_000_000}
+        for bucket in ("linkedin", "mailscout", "theharvester", "newsapi")
+    }
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _run(mode: str, intents: int) -> list[float]:
+    functions = {
+        name: getattr(tasks, name.rsplit(".", 1)[1]) for name in ACTION_TO_CELERY_TASK.values()
+    }
+    dispatcher = LocalDispatcher(functions, max_workers=1 if mode == "sequential" else 64)
+    store = NullAuditLogStore()
+    engine = build_execution_engine(
+        dispatcher=dispatcher,
+        planner=TaskPlanner(audit_log_store=store),
+        state_machine=TaskStateMachine(
+            audit_log_store=store,
+            deadletter_store=DeadLetterStore(lambda: sqlite3.connect(":memory:")),
+        ),
+    )
+    actions = [action.value for action in IntentAction]
+    samples: list[float] = []
+    try:
+        for _ in range(intents):
+            execution = engine.execute(f"bench-{uuid4()}", actions, timeout=300)
+            if not execution.succeeded:
+                raise RuntimeError(f"Intent failed: {execution.status_counts()}")
+            samples.append(execution.elapsed_ms)
+    finally:
+        dispatcher.close()
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--intents", type=int, default=5)
+    parser.add_argument("--companies", type=int, default=5)
+    args = parser.parse_args()
+
+    _install_stubs(args.companies)
+    settings.orchestrator_poll_interval = 0.01
+    tasks_per_intent = 1 + args.companies * (len(IntentAction) - 1)
+    print(f"{args.companies} companies, {tasks_per_intent} tasks per intent")
+    print(f"{'mode':<12}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for mode in ("sequential", "dag"):
+        samples = _run(mode, args.intents)
+        print(
+            f"{mode:<12}{_percentile(samples, 0.5):>10.0f}"
+            f"{_percentile(samples, 0.95):>10.0f}{max(samples):>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Microbenchmark: stdlib json vs. orjson through the shared codec.
+
+Encodes and decodes payloads shaped like the real hot paths (an audit
+record for a planned intent and a cached worker result)::
+
+    python -m benchmarks.json_codec --iterations 20000
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+from datetime import datetime, timezone
+
+import serialization
+from orchestrator import Task, TaskStatus
+
+
+def _payloads() -> dict[str, object]:
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    tasks = [
+        Task(
+            task_id=f"task-{index}",
+            intent_id="intent-1",
+            task_type=task_type,
+            status=TaskStatus.queued,
+            retry_count=0,
+            idempotency_key=f"intent-1:{task_type}:none",
+            payload={"raw_text": "Find SaaS companies in APAC.", "filters": {"regions": ["APAC"]}},
+            created_at=created_at,
+        ).to_dict()
+        for index, task_type in enumerate(["search_companies", "find_contacts", "collect_news"])
+    ]
+    result = {
+        "status": "success",
+        "task_type": "company_search",
+        "idempotency_key": "intent-1:company_search:none",
+        "result": {"companies": [{"name": f"Company {i}", "source": "playwright"} for i in range(100)]},
+    }
+    return {"plan_tasks audit": {"tasks": tasks}, "cached result": result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10_000)
+    args = parser.parse_args()
+
+    backends = [name for name in serialization.BACKENDS if name != "orjson" or serialization.orjson]
+    original = serialization.get_backend()
+    try:
+        for label, payload in _payloads().items():
+            for backend in backends:
+                serialization.set_backend(backend)
+                encoded = serialization.dumps(payload)
+                dumps_s = timeit.timeit(lambda: serialization.dumps(payload), number=args.iterations)
+                loads_s = timeit.timeit(lambda: serialization.loads(encoded), number=args.iterations)
+                print(
+                    f"{label:<18} {backend:<7} "
+                    f"dumps {dumps_s / args.iterations * 1e6:7.2f} us  "
+                    f"loads {loads_s / args.iterations * 1e6:7.2f} us  "
+                    f"({len(encoded)} bytes)"
+                )
+    finally:
+        serialization.set_backend(original)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any
+from urllib.parse import urlparse
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from app.config import settings
+
+ConnectionFactory = Callable[[], Any]
+SchemaInitializer = Callable[[Any], None]
+
+
+def _sqlite_connection_factory(database_url: str) -> ConnectionFactory:
+    parsed = urlparse(database_url)
+    path = parsed.path or ":memory:"
+    if path == "/:memory:":
+        path = ":memory:"
+    return lambda: sqlite3.connect(path)
+
+
+def _postgres_url(database_url: str) -> str:
+    return database_url.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+def _postgres_connection_factory(database_url: str) -> ConnectionFactory:
+    postgres_url = _postgres_url(database_url)
+    return lambda: psycopg.connect(postgres_url)
+
+
+def is_sqlite_connection(connection: Any) -> bool:
+    return isinstance(connection, sqlite3.Connection)
+
+
+class PooledConnectionFactory:
+    """Process-wide Postgres pool shared by every store.
+
+    Calling the factory checks out a raw connection (the caller must hand it
+    back with ``release``); stores normally go through ``connection()`` which
+    returns it to the pool automatically. Schemas registered through
+    ``ensure_schema`` are created once per pool rather than on every call.
+    """
+
+    def __init__(
+        self,
+        conninfo: str,
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_idle: float = 600.0,
+        check: bool = True,
+    ) -> None:
+        self._conninfo = conninfo
+        self._pool_kwargs: dict[str, Any] = {
+            "min_size": min_size,
+            "max_size": max_size,
+            "timeout": timeout,
+            "max_idle": max_idle,
+            "check": ConnectionPool.check_connection if check else None,
+        }
+        self._pool = self._build_pool()
+        self._opened = False
+        self._lock = threading.Lock()
+        self._initialized_schemas: set[str] = set()
+
+    def _build_pool(self) -> ConnectionPool:
+        return ConnectionPool(self._conninfo, open=False, name="salesops", **self._pool_kwargs)
+
+    def _ensure_open(self) -> None:
+        if self._opened:
+            return
+        with self._lock:
+            if not self._opened:
+                self._pool.open()
+                self._opened = True
+
+    def __call__(self) -> Any:
+        self._ensure_open()
+        return self._pool.getconn()
+
+    def release(self, connection: Any) -> None:
+        self._pool.putconn(connection)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        self._ensure_open()
+        with self._pool.connection() as connection:
+            yield connection
+
+    @contextmanager
+    def schema_connection(self) -> Iterator[Any]:
+        """Short-lived connection outside the pool for ``ensure_schema``'s DDL."""
+        with psycopg.connect(self._conninfo) as connection:
+            yield connection
+
+    def schema_initialized(self, name: str) -> bool:
+        return name in self._initialized_schemas
+
+    def mark_schema_initialized(self, name: str) -> None:
+        with self._lock:
+            self._initialized_schemas.add(name)
+
+    def stats(self) -> dict[str, int]:
+        return dict(self._pool.get_stats()) if self._opened else {}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._opened:
+                self._pool.close()
+            self._pool = self._build_pool()
+            self._opened = False
+            self._initialized_schemas.clear()
+
+    def reset_after_fork(self) -> None:
+        """Drop the pool inherited from the parent process without closing it.
+
+        The parent's sockets and worker threads are unusable in a forked
+        child; closing them would disturb the parent, so the child simply
+        starts over with a fresh, lazily opened pool.
+        """
+        self._lock = threading.Lock()
+        self._pool = self._build_pool()
+        self._opened = False
+
+
+class AsyncPooledConnectionFactory:
+    """``AsyncConnectionPool`` counterpart of ``PooledConnectionFactory``.
+
+    Used by the FastAPI routes so database round trips are awaited instead
+    of blocking the event loop. Schemas are created once per pool from the
+    DDL statement lists the stores expose.
+    """
+
+    def __init__(
+        self,
+        conninfo: str,
+        *,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_idle: float = 600.0,
+        check: bool = True,
+    ) -> None:
+        self._conninfo = conninfo
+        self._pool_kwargs: dict[str, Any] = {
+            "min_size": min_size,
+            "max_size": max_size,
+            "timeout": timeout,
+            "max_idle": max_idle,
+            "check": AsyncConnectionPool.check_connection if check else None,
+        }
+        self._pool = self._build_pool()
+        self._opened = False
+        self._initialized_schemas: set[str] = set()
+
+    def _build_pool(self) -> AsyncConnectionPool:
+        return AsyncConnectionPool(
+            self._conninfo,
+            open=False,
+            name="salesops-async",
+            **self._pool_kwargs,
+        )
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Any]:
+        if not self._opened:
+            # open() is idempotent, so concurrent first callers are harmless.
+            await self._pool.open()
+            self._opened = True
+        async with self._pool.connection() as connection:
+            yield connection
+
+    async def ensure_schema(self, name: str, statements: Sequence[Any]) -> None:
+        """Create schema ``name`` once per pool, on its own connection.
+
+        Callers may already have written on their pooled connection, so the
+        DDL is committed elsewhere rather than committing their transaction.
+        """
+        if name in self._initialized_schemas:
+            return
+        async with await psycopg.AsyncConnection.connect(self._conninfo) as connection:
+            for statement in statements:
+                await connection.execute(statement)
+            await connection.commit()
+        self._initialized_schemas.add(name)
+
+    def stats(self) -> dict[str, int]:
+        return dict(self._pool.get_stats()) if self._opened else {}
+
+    async def close(self) -> None:
+        if self._opened:
+            await self._pool.close()
+        self._pool = self._build_pool()
+        self._opened = False
+        self._initialized_schemas.clear()
+
+
+@contextmanager
+def borrow_connection(
+    connection_factory: ConnectionFactory,
+    *,
+    close_connection: bool = True,
+) -> Iterator[Any]:
+    """Yield a connection from ``connection_factory``.
+
+    Pooled factories hand the connection back to the pool on exit; plain
+    factories close it unless ``close_connection`` is false.
+    """
+    if isinstance(connection_factory, PooledConnectionFactory):
+        with connection_factory.connection() as connection:
+            yield connection
+        return
+    connection = connection_factory()
+    try:
+        yield connection
+    finally:
+        if close_connection:
+            connection.close()
+
+
+def ensure_schema(
+    connection_factory: ConnectionFactory,
+    connection: Any,
+    name: str,
+    initializer: SchemaInitializer,
+) -> None:
+    """Run ``initializer`` once per pool, or on every call for plain factories.
+
+    Plain factories (notably in-memory SQLite) may hand out a brand new
+    database per call, so the DDL cannot be skipped for them. For pools the
+    DDL is committed on a separate connection: ``connection`` may be inside
+    a caller's transaction (``TaskStore.transaction``, ``TaskOutbox.enqueue``)
+    whose earlier writes must not be committed early. Plain factories run
+    it on ``connection`` without committing.
+    """
+    if isinstance(connection_factory, PooledConnectionFactory):
+        if connection_factory.schema_initialized(name):
+            return
+        with connection_factory.schema_connection() as schema_connection:
+            initializer(schema_connection)
+            schema_connection.commit()
+        connection_factory.mark_schema_initialized(name)
+        return
+    initializer(connection)
+
+
+_DEFAULT_POOL: PooledConnectionFactory | None = None
+_DEFAULT_POOL_LOCK = threading.Lock()
+
+
+def get_default_pool() -> PooledConnectionFactory:
+    global _DEFAULT_POOL
+    if _DEFAULT_POOL is None:
+        with _DEFAULT_POOL_LOCK:
+            if _DEFAULT_POOL is None:
+                _DEFAULT_POOL = PooledConnectionFactory(
+                    _postgres_url(settings.database_url),
+                    min_size=settings.database_pool_min_size,
+                    max_size=settings.database_pool_max_size,
+                    timeout=settings.database_pool_timeout,
+                    max_idle=settings.database_pool_max_idle,
+                )
+    return _DEFAULT_POOL
+
+
+def close_default_pool() -> None:
+    if _DEFAULT_POOL is not None:
+        _DEFAULT_POOL.close()
+
+
+def reset_default_pool_after_fork() -> None:
+    if _DEFAULT_POOL is not None:
+        _DEFAULT_POOL.reset_after_fork()
+
+
+_DEFAULT_ASYNC_POOL: AsyncPooledConnectionFactory | None = None
+
+
+def get_default_async_pool() -> AsyncPooledConnectionFactory | None:
+    """Return the process-wide async pool, or ``None`` when not on pooled Postgres."""
+    global _DEFAULT_ASYNC_POOL
+    if settings.database_url.startswith("sqlite://") or not settings.database_pool_enabled:
+        return None
+    if _DEFAULT_ASYNC_POOL is None:
+        _DEFAULT_ASYNC_POOL = AsyncPooledConnectionFactory(
+            _postgres_url(settings.database_url),
+            min_size=settings.database_pool_min_size,
+            max_size=settings.database_pool_max_size,
+            timeout=settings.database_pool_timeout,
+            max_idle=settings.database_pool_max_idle,
+        )
+    return _DEFAULT_ASYNC_POOL
+
+
+async def close_default_async_pool() -> None:
+    if _DEFAULT_ASYNC_POOL is not None:
+        await _DEFAULT_ASYNC_POOL.close()
+
+
+def default_connection_factory() -> ConnectionFactory:
+    database_url = settings.database_url
+    if database_url.startswith("sqlite://"):
+        return _sqlite_connection_factory(database_url)
+    if not settings.database_pool_enabled:
+        return _postgres_connection_factory(database_url)
+    return get_default_pool()
@@ -1,11 +1,22 @@
+from orchestrator.engine import IntentExecution, IntentExecutionEngine
 from orchestrator.models import Task, TaskStatus
 from orchestrator.planner import TaskPlanner, build_idempotency_key
-from orchestrator.state_machine import TaskStateMachine
+from orchestrator.state_machine import (
+    TaskStateMachine,
+    TaskTransitionConflict,
+    TransitionOutcome,
+)
+from orchestrator.task_store import TaskStore
 
 __all__ = [
+    "IntentExecution",
+    "IntentExecutionEngine",
     "Task",
     "TaskPlanner",
     "TaskStateMachine",
     "TaskStatus",
+    "TaskStore",
+    "TaskTransitionConflict",
+    "TransitionOutcome",
     "build_idempotency_key",
 ]
@@ -1,49 +1,83 @@
 from __future__ import annotations
 
-import json
-import sqlite3
+import asyncio
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any, Callable
 
-from audit_log import default_connection_factory
+import serialization
+from database import (
+    AsyncPooledConnectionFactory,
+    ConnectionFactory,
+    borrow_connection,
+    default_connection_factory,
+    ensure_schema,
+    get_default_async_pool,
+    is_sqlite_connection as _is_sqlite_connection,
+)
 from orchestrator.models import Task
 
 Clock = Callable[[], datetime]
-ConnectionFactory = Callable[[], Any]
 
 
 def default_clock() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def _is_sqlite_connection(connection: Any) -> bool:
-    return isinstance(connection, sqlite3.Connection)
+_SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS deadletter_tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_json TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        deadlettered_at TEXT NOT NULL
+    )
+    """,
+]
+
+_POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS deadletter_tasks (
+        id BIGSERIAL PRIMARY KEY,
+        task_json JSONB NOT NULL,
+        reason TEXT NOT NULL,
+        deadlettered_at TIMESTAMPTZ NOT NULL
+    )
+    """,
+]
+
+_POSTGRES_INSERT = """
+    INSERT INTO deadletter_tasks (task_json, reason, deadlettered_at)
+    VALUES (%s, %s, %s)
+    RETURNING id
+"""
+
+_SQLITE_INSERT_MANY = """
+    INSERT INTO deadletter_tasks (task_json, reason, deadlettered_at)
+    VALUES (?, ?, ?)
+"""
+
+_POSTGRES_INSERT_MANY = """
+    INSERT INTO deadletter_tasks (task_json, reason, deadlettered_at)
+    VALUES (%s, %s, %s)
+"""
+
+_POSTGRES_LIST = """
+    SELECT id, task_json, reason, deadlettered_at
+    FROM deadletter_tasks
+    ORDER BY id DESC
+    LIMIT %s
+"""
+
+
+def deadletter_schema(*, sqlite: bool) -> list[str]:
+    return list(_SQLITE_SCHEMA if sqlite else _POSTGRES_SCHEMA)
 
 
 def initialize_deadletter_table(connection: Any) -> None:
-    if _is_sqlite_connection(connection):
-        connection.execute(
-            """
-            CREATE TABLE IF NOT EXISTS deadletter_tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                task_json TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                deadlettered_at TEXT NOT NULL
-            )
-            """
-        )
-    else:
-        connection.execute(
-            """
-            CREATE TABLE IF NOT EXISTS deadletter_tasks (
-                id BIGSERIAL PRIMARY KEY,
-                task_json JSONB NOT NULL,
-                reason TEXT NOT NULL,
-                deadlettered_at TIMESTAMPTZ NOT NULL
-            )
-            """
-        )
+    for statement in deadletter_schema(sqlite=_is_sqlite_connection(connection)):
+        connection.execute(statement)
 
 
 @dataclass(frozen=True)
@@ -66,12 +100,22 @@ class DeadLetterStore:
         self._clock = clock or default_clock
         self._close_connection = close_connection
 
+    def now(self) -> datetime:
+        return self._clock()
+
     def append(self, task: Task, reason: str) -> DeadLetterItem:
         deadlettered_at = self._clock()
-        task_json = json.dumps(task.to_dict(), sort_keys=True)
-        connection = self._connection_factory()
-        try:
-            initialize_deadletter_table(connection)
+        task_json = serialization.dumps(task.to_dict())
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "deadletter_tasks",
+                initialize_deadletter_table,
+            )
             if _is_sqlite_connection(connection):
                 cursor = connection.execute(
                     """
@@ -83,19 +127,12 @@ class DeadLetterStore:
                 item_id = int(cursor.lastrowid)
             else:
                 cursor = connection.execute(
-                    """
-                    INSERT INTO deadletter_tasks (task_json, reason, deadlettered_at)
-                    VALUES (%s, %s, %s)
-                    RETURNING id
-                    """,
+                    _POSTGRES_INSERT,
                     (task_json, reason, deadlettered_at),
                 )
                 row = cursor.fetchone()
                 item_id = int(row[0]) if row else 0
             connection.commit()
-        finally:
-            if self._close_connection:
-                connection.close()
         return DeadLetterItem(
             id=item_id,
             task=task,
@@ -103,10 +140,49 @@ class DeadLetterStore:
             deadlettered_at=deadlettered_at,
         )
 
+    def append_many(self, entries: Sequence[tuple[Task, str]]) -> None:
+        """Deadletter ``(task, reason)`` entries in one write."""
+        if not entries:
+            return
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            self.insert_rows(connection, entries)
+            connection.commit()
+
+    def insert_rows(self, connection: Any, entries: Sequence[tuple[Task, str]]) -> None:
+        """Insert ``(task, reason)`` entries on ``connection`` without committing."""
+        if not entries:
+            return
+        ensure_schema(
+            self._connection_factory,
+            connection,
+            "deadletter_tasks",
+            initialize_deadletter_table,
+        )
+        deadlettered_at = self._clock().isoformat()
+        rows = [
+            (serialization.dumps(task.to_dict()), reason, deadlettered_at)
+            for task, reason in entries
+        ]
+        if _is_sqlite_connection(connection):
+            connection.executemany(_SQLITE_INSERT_MANY, rows)
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(_POSTGRES_INSERT_MANY, rows)
+
     def list(self, *, limit: int = 50) -> list[DeadLetterItem]:
-        connection = self._connection_factory()
-        try:
-            initialize_deadletter_table(connection)
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "deadletter_tasks",
+                initialize_deadletter_table,
+            )
             if _is_sqlite_connection(connection):
                 rows = connection.execute(
                     """
@@ -118,40 +194,85 @@ class DeadLetterStore:
                     (limit,),
                 ).fetchall()
             else:
-                rows = connection.execute(
-                    """
-                    SELECT id, task_json, reason, deadlettered_at
-                    FROM deadletter_tasks
-                    ORDER BY id DESC
-                    LIMIT %s
-                    """,
-                    (limit,),
-                ).fetchall()
-        finally:
-            if self._close_connection:
-                connection.close()
-        items: list[DeadLetterItem] = []
-        for item_id, task_payload, reason, deadlettered_at in rows:
-            if isinstance(task_payload, str):
-                task_data = json.loads(task_payload)
-            else:
-                task_data = task_payload
-            if isinstance(deadlettered_at, str):
-                deadlettered_dt = datetime.fromisoformat(deadlettered_at)
-            else:
-                deadlettered_dt = deadlettered_at
-            items.append(
-                DeadLetterItem(
-                    id=int(item_id),
-                    task=Task.from_dict(task_data),
-                    reason=reason,
-                    deadlettered_at=deadlettered_dt,
-                )
+                rows = connection.execute(_POSTGRES_LIST, (limit,)).fetchall()
+        return _rows_to_items(rows)
+
+
+def _rows_to_items(rows: Sequence[Sequence[Any]]) -> list[DeadLetterItem]:
+    items: list[DeadLetterItem] = []
+    for item_id, task_payload, reason, deadlettered_at in rows:
+        if isinstance(task_payload, str):
+            task_data = serialization.loads(task_payload)
+        else:
+            task_data = task_payload
+        if isinstance(deadlettered_at, str):
+            deadlettered_dt = datetime.fromisoformat(deadlettered_at)
+        else:
+            deadlettered_dt = deadlettered_at
+        items.append(
+            DeadLetterItem(
+                id=int(item_id),
+                task=Task.from_dict(task_data),
+                reason=reason,
+                deadlettered_at=deadlettered_dt,
             )
-        return items
+        )
+    return items
+
+
+class AsyncDeadLetterStore:
+    """Awaitable front end for a ``DeadLetterStore``.
+
+    Uses the async pool when one is configured and otherwise runs the sync
+    store in a worker thread, so callers on the event loop never block.
+    """
+
+    def __init__(
+        self,
+        store: DeadLetterStore,
+        pool: AsyncPooledConnectionFactory | None = None,
+    ) -> None:
+        self._store = store
+        self._pool = pool
+
+    async def append(self, task: Task, reason: str) -> DeadLetterItem:
+        if self._pool is None:
+            return await asyncio.to_thread(self._store.append, task, reason)
+        deadlettered_at = self._store.now()
+        task_json = serialization.dumps(task.to_dict())
+        async with self._pool.connection() as connection:
+            await self._pool.ensure_schema(
+                "deadletter_tasks",
+                deadletter_schema(sqlite=False),
+            )
+            cursor = await connection.execute(
+                _POSTGRES_INSERT,
+                (task_json, reason, deadlettered_at),
+            )
+            row = await cursor.fetchone()
+            await connection.commit()
+        return DeadLetterItem(
+            id=int(row[0]) if row else 0,
+            task=task,
+            reason=reason,
+            deadlettered_at=deadlettered_at,
+        )
+
+    async def list(self, *, limit: int = 50) -> list[DeadLetterItem]:
+        if self._pool is None:
+            return await asyncio.to_thread(self._store.list, limit=limit)
+        async with self._pool.connection() as connection:
+            await self._pool.ensure_schema(
+                "deadletter_tasks",
+                deadletter_schema(sqlite=False),
+            )
+            cursor = await connection.execute(_POSTGRES_LIST, (limit,))
+            rows = await cursor.fetchall()
+        return _rows_to_items(rows)
 
 
 _DEFAULT_STORE: DeadLetterStore | None = None
+_DEFAULT_ASYNC_STORE: AsyncDeadLetterStore | None = None
 
 
 def get_default_deadletter_store() -> DeadLetterStore:
@@ -159,3 +280,13 @@ def get_default_deadletter_store() -> DeadLetterStore:
     if _DEFAULT_STORE is None:
         _DEFAULT_STORE = DeadLetterStore(default_connection_factory())
     return _DEFAULT_STORE
+
+
+def get_default_async_deadletter_store() -> AsyncDeadLetterStore:
+    global _DEFAULT_ASYNC_STORE
+    if _DEFAULT_ASYNC_STORE is None:
+        _DEFAULT_ASYNC_STORE = AsyncDeadLetterStore(
+            get_default_deadletter_store(),
+            get_default_async_pool(),
+        )
+    return _DEFAULT_ASYNC_STORE
@@ -0,0 +1,397 @@
+"""Execution of planned intents as a dependency graph of worker tasks.
+
+Each intent action becomes a stage. A stage waits for the stages it depends
+on (``STAGE_DEPENDENCIES``, skipping actions the intent does not ask for),
+and independent stages run side by side: ``collect_news`` and
+``find_contacts`` both start as soon as ``search_companies`` is done. Stages
+downstream of a fan-out stage (``search_companies``) run once per entity it
+returned, and each entity moves on as soon as its own prerequisites are done
+rather than waiting for the whole stage.
+
+Every stage/entity pair is one ``Task`` dispatched as one worker task. Tasks
+move through ``TaskStateMachine`` as the dispatcher reports progress: queued
+on dispatch, running once started, then success, or failed and retried until
+they are dead-lettered, in which case the entity's downstream stages are
+never dispatched.
+"""
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+from orchestrator.models import Task, TaskStatus
+from orchestrator.planner import TaskPlanner
+from orchestrator.state_machine import TaskStateMachine
+
+# Progress states reported by dispatch handles (Celery's names).
+PENDING = "PENDING"
+STARTED = "STARTED"
+SUCCESS = "SUCCESS"
+FAILURE = "FAILURE"
+
+_RUNNING_STATES = {STARTED, "RECEIVED", "RETRY"}
+_FAILED_STATES = {FAILURE, "REVOKED"}
+
+STAGE_DEPENDENCIES: dict[str, tuple[str, ...]] = {
+    "search_companies": (),
+    "find_contacts": ("search_companies",),
+    "collect_news": ("search_companies",),
+    "generate_emails": ("find_contacts", "collect_news"),
+    "schedule_emails": ("generate_emails",),
+    "update_pipeline": ("find_contacts",),
+}
+
+# (entity_id, payload fields) for each entity a stage's result fans out to.
+EntityFanOut = Callable[[dict[str, Any]], list[tuple[str, dict[str, Any]]]]
+
+
+def company_entity_id(company: dict[str, Any]) -> str:
+    """The company's ``id``, else its name qualified by its domain."""
+    if company.get("id"):
+        return str(company["id"])
+    if company.get("domain"):
+        return f"{company['name']}@{company['domain']}"
+    return str(company["name"])
+
+
+def companies_as_entities(result: dict[str, Any]) -> list[tuple[str, dict[str, Any]]]:
+    """One entity per company; a repeated id gets its occurrence appended (``#2``)."""
+    entities: list[tuple[str, dict[str, Any]]] = []
+    seen: dict[str, int] = {}
+    for company in result.get("companies", []):
+        entity_id = company_entity_id(company)
+        seen[entity_id] = seen.get(entity_id, 0) + 1
+        if seen[entity_id] > 1:
+            entity_id = f"{entity_id}#{seen[entity_id]}"
+        fields: dict[str, Any] = {"company": company}
+        if company.get("domain"):
+            fields["domain"] = company["domain"]
+        entities.append((entity_id, fields))
+    return entities
+
+
+DEFAULT_FAN_OUT: dict[str, EntityFanOut] = {"search_companies": companies_as_entities}
+
+
+def build_stage_graph(
+    task_types: Iterable[str],
+    dependencies: Mapping[str, Sequence[str]] | None = None,
+) -> dict[str, tuple[str, ...]]:
+    """Return ``{task_type: prerequisites}`` restricted to ``task_types``.
+
+    A prerequisite the intent does not include is replaced by its own
+    prerequisites, so ``generate_emails`` without ``find_contacts`` still
+    waits for ``search_companies``.
+    """
+    dependencies = STAGE_DEPENDENCIES if dependencies is None else dependencies
+    present = list(dict.fromkeys(task_types))
+
+    def _resolve(task_type: str, seen: frozenset[str]) -> list[str]:
+        resolved: list[str] = []
+        for dependency in dependencies.get(task_type, ()):
+            if dependency in seen:
+                raise ValueError(f"Dependency cycle through {dependency}")
+            if dependency in present:
+                resolved.append(dependency)
+            else:
+                resolved.extend(_resolve(dependency, seen | {dependency}))
+        return resolved
+
+    return {
+        task_type: tuple(dict.fromkeys(_resolve(task_type, frozenset({task_type}))))
+        for task_type in present
+    }
+
+
+class DispatchHandle(Protocol):
+    @property
+    def state(self) -> str: ...
+
+    @property
+    def result(self) -> Any: ...
+
+
+class Dispatcher(Protocol):
+    def submit(self, task: Task, task_name: str, kwargs: dict[str, Any]) -> DispatchHandle: ...
+
+    def wait(self, handles: Sequence[DispatchHandle], timeout: float) -> None:
+        """Return once any handle may have progressed, or after ``timeout``."""
+        ...
+
+
+class CeleryDispatcher:
+    """Sends tasks through a Celery app and polls their ``AsyncResult``.
+
+    ``running`` is only observed when the app tracks started tasks
+    (``task_track_started``); otherwise tasks go straight from queued to
+    their outcome.
+    """
+
+    def __init__(self, app: Any, *, poll_interval: float = 0.1) -> None:
+        self._app = app
+        self._poll_interval = poll_interval
+
+    def submit(self, task: Task, task_name: str, kwargs: dict[str, Any]) -> DispatchHandle:
+        return self._app.send_task(task_name, kwargs=kwargs)
+
+    def wait(self, handles: Sequence[DispatchHandle], timeout: float) -> None:
+        time.sleep(min(timeout, self._poll_interval))
+
+
+class _FutureHandle:
+    def __init__(self, future: Future[Any]) -> None:
+        self.future = future
+
+    @property
+    def state(self) -> str:
+        if not self.future.done():
+            return STARTED if self.future.running() else PENDING
+        return FAILURE if self.future.exception() is not None else SUCCESS
+
+    @property
+    def result(self) -> Any:
+        return self.future.exception() or self.future.result()
+
+
+class LocalDispatcher:
+    """Runs task functions in a thread pool; used by tests and benchmarks."""
+
+    def __init__(self, functions: Mapping[str, Callable[..., Any]], *, max_workers: int = 16) -> None:
+        self._functions = dict(functions)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="intent")
+
+    def submit(self, task: Task, task_name: str, kwargs: dict[str, Any]) -> DispatchHandle:
+        return _FutureHandle(self._executor.submit(self._functions[task_name], **kwargs))
+
+    def wait(self, handles: Sequence[DispatchHandle], timeout: float) -> None:
+        futures = [handle.future for handle in handles if isinstance(handle, _FutureHandle)]
+        if futures:
+            wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        else:
+            time.sleep(timeout)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+@dataclass(frozen=True)
+class IntentExecution:
+    intent_id: str
+    tasks: list[Task]
+    results: dict[tuple[str, str | None], dict[str, Any]]
+    elapsed_ms: float
+
+    @property
+    def succeeded(self) -> bool:
+        return all(task.status == TaskStatus.success for task in self.tasks)
+
+    def status_counts(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for task in self.tasks:
+            counts[task.status.value] = counts.get(task.status.value, 0) + 1
+        return counts
+
+
+class IntentExecutionEngine:
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        task_names: Mapping[str, str],
+        *,
+        planner: TaskPlanner | None = None,
+        state_machine: TaskStateMachine | None = None,
+        dependencies: Mapping[str, Sequence[str]] | None = None,
+        fan_out: Mapping[str, EntityFanOut] | None = None,
+        max_retries: int = 3,
+        poll_interval: float = 0.1,
+    ) -> None:
+        self._dispatcher = dispatcher
+        self._task_names = dict(task_names)
+        self._planner = planner or TaskPlanner()
+        self._state_machine = state_machine or TaskStateMachine()
+        self._dependencies = dependencies
+        self._fan_out = DEFAULT_FAN_OUT if fan_out is None else fan_out
+        self._max_retries = max_retries
+        self._poll_interval = poll_interval
+
+    def execute(
+        self,
+        intent_id: str,
+        task_types: Iterable[str],
+        payloads: Mapping[str, dict[str, Any]] | None = None,
+        *,
+        timeout: float | None = None,
+    ) -> IntentExecution:
+        """Dispatch every stage of an intent and block until all tasks settle.
+
+        Raises ``TimeoutError`` if tasks are still outstanding after
+        ``timeout`` seconds.
+        """
+        run = _IntentRun(self, intent_id, task_types, payloads or {})
+        return run.execute(timeout)
+
+
+class _IntentRun:
+    """Bookkeeping for one ``IntentExecutionEngine.execute`` call."""
+
+    def __init__(
+        self,
+        engine: IntentExecutionEngine,
+        intent_id: str,
+        task_types: Iterable[str],
+        payloads: Mapping[str, dict[str, Any]],
+    ) -> None:
+        self.engine = engine
+        self.intent_id = intent_id
+        self.payloads = payloads
+        self.graph = build_stage_graph(task_types, engine._dependencies)
+        self.children: dict[str, list[str]] = {task_type: [] for task_type in self.graph}
+        for task_type, prerequisites in self.graph.items():
+            for prerequisite in prerequisites:
+                self.children[prerequisite].append(task_type)
+        self.tasks: dict[str, Task] = {}
+        self.entities: dict[str, str | None] = {}
+        self.handles: dict[str, DispatchHandle] = {}
+        # task_id -> time at which a task whose key was locked is sent again.
+        self.deferred: dict[str, float] = {}
+        self.spawned: set[tuple[str, str | None]] = set()
+        self.entity_fields: dict[str | None, dict[str, Any]] = {None: {}}
+        self.results: dict[tuple[str, str | None], dict[str, Any]] = {}
+
+    def execute(self, timeout: float | None) -> IntentExecution:
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+        for task_type, prerequisites in self.graph.items():
+            if not prerequisites:
+                self._spawn(task_type, None)
+        while self.handles or self.deferred:
+            progressed = False
+            now = time.perf_counter()
+            for task_id, due in list(self.deferred.items()):
+                if due <= now:
+                    del self.deferred[task_id]
+                    self._dispatch(self.tasks[task_id])
+            for task_id, handle in list(self.handles.items()):
+                progressed |= self._poll(task_id, handle)
+            if progressed:
+                continue
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                outstanding = len(self.handles) + len(self.deferred)
+                raise TimeoutError(
+                    f"Intent {self.intent_id} still has {outstanding} tasks outstanding"
+                )
+            remaining = self.engine._poll_interval
+            if self.deferred:
+                remaining = min(remaining, min(self.deferred.values()) - now)
+            if deadline is not None:
+                remaining = min(remaining, deadline - now)
+            remaining = max(remaining, 0.0)
+            if self.handles:
+                self.engine._dispatcher.wait(list(self.handles.values()), remaining)
+            else:
+                time.sleep(remaining)
+        return IntentExecution(
+            intent_id=self.intent_id,
+            tasks=list(self.tasks.values()),
+            results=dict(self.results),
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+        )
+
+    def _spawn(self, task_type: str, entity_id: str | None) -> None:
+        if (task_type, entity_id) in self.spawned:
+            return
+        for prerequisite in self.graph[task_type]:
+            if (prerequisite, entity_id) not in self.results and (
+                prerequisite,
+                None,
+            ) not in self.results:
+                return
+        self.spawned.add((task_type, entity_id))
+        payload = dict(self.payloads.get(task_type, {}))
+        payload.update(self.entity_fields.get(entity_id, {}))
+        upstream = {
+            prerequisite: self._upstream_result(prerequisite, entity_id)
+            for prerequisite in self.graph[task_type]
+        }
+        if upstream:
+            payload["upstream"] = upstream
+        (task,) = self.engine._planner.plan_tasks(
+            self.intent_id,
+            [task_type],
+            entity_id=entity_id,
+            payloads={task_type: payload},
+        )
+        self.tasks[task.task_id] = task
+        self.entities[task.task_id] = entity_id
+        self._dispatch(task)
+
+    def _upstream_result(self, task_type: str, entity_id: str | None) -> Any:
+        response = self.results.get((task_type, entity_id)) or self.results[(task_type, None)]
+        return response.get("result")
+
+    def _dispatch(self, task: Task) -> None:
+        kwargs = {
+            "intent_id": task.intent_id,
+            "entity_id": self.entities[task.task_id],
+            "payload": task.payload,
+        }
+        self.handles[task.task_id] = self.engine._dispatcher.submit(
+            task,
+            self.engine._task_names[task.task_type],
+            kwargs,
+        )
+
+    def _poll(self, task_id: str, handle: DispatchHandle) -> bool:
+        """Apply the handle's progress to its task; return whether anything changed."""
+        task = self.tasks[task_id]
+        state = handle.state
+        if state in _RUNNING_STATES:
+            if task.status == TaskStatus.queued:
+                self.tasks[task_id] = self.engine._state_machine.transition(task, TaskStatus.running)
+                return True
+            return False
+        if state != SUCCESS and state not in _FAILED_STATES:
+            return False
+        del self.handles[task_id]
+        if task.status == TaskStatus.queued:
+            task = self.engine._state_machine.transition(task, TaskStatus.running)
+        response = handle.result if state == SUCCESS else None
+        if isinstance(response, dict) and response.get("status") == "locked":
+            # Another worker holds this key; ask again once it may have finished.
+            self.tasks[task_id] = task
+            self.deferred[task_id] = time.perf_counter() + self.engine._poll_interval
+            return True
+        if isinstance(response, dict) and response.get("status") == "success":
+            self.tasks[task_id] = self.engine._state_machine.transition(task, TaskStatus.success)
+            self._complete(task, response)
+            return True
+        failed = self.engine._state_machine.record_failure(task)
+        retried = self.engine._state_machine.schedule_retry(
+            failed,
+            max_retries=self.engine._max_retries,
+        )
+        if retried.status == TaskStatus.retrying:
+            retried = self.engine._state_machine.requeue(retried)
+            self._dispatch(retried)
+        self.tasks[task_id] = retried
+        return True
+
+    def _complete(self, task: Task, response: dict[str, Any]) -> None:
+        entity_id = self.entities[task.task_id]
+        self.results[(task.task_type, entity_id)] = response
+        fan_out = self.engine._fan_out.get(task.task_type) if entity_id is None else None
+        if fan_out is not None:
+            entities = fan_out(response.get("result") or {})
+            for child_entity, fields in entities:
+                self.entity_fields[child_entity] = fields
+            targets: list[str | None] = [child_entity for child_entity, _ in entities]
+        else:
+            targets = [entity_id]
+        for child in self.children[task.task_type]:
+            for target in targets:
+                self._spawn(child, target)
+
@@ -31,11 +31,11 @@ class Task:
             "task_id": self.task_id,
             "intent_id": self.intent_id,
             "task_type": self.task_type,
-            "status": self.status.value,
+            "status": self.status,
             "retry_count": self.retry_count,
             "idempotency_key": self.idempotency_key,
             "payload": self.payload,
-            "created_at": self.created_at.isoformat(),
+            "created_at": self.created_at,
         }
 
     @classmethod
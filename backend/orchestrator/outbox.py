@@ -0,0 +1,396 @@
+"""Transactional outbox between task planning and the Celery broker.
+
+``TaskOutbox.enqueue`` writes planned tasks to ``task_outbox`` in the same
+transaction as their ``orchestrator.plan_tasks`` audit record, so a task is
+either planned and durably queued for dispatch or not planned at all.
+``OutboxRelay`` claims unpublished rows with ``FOR UPDATE SKIP LOCKED``,
+hands them to a publisher in batches and marks them published in the same
+transaction. Several relays can run side by side: each claims a disjoint
+batch. Delivery is at least once (a relay that dies after publishing but
+before committing leaves its batch to be sent again), which the worker
+tasks' idempotency keys absorb. Published rows are kept for
+``prune_published``'s ``max_age`` and then deleted.
+
+The outbox is off by default (``orchestrator_outbox_enabled``): it sends
+every planned action at once, without the execution engine's per-entity
+fan-out or dependency ordering, so it is only for deployments that run a
+relay and plan single-stage intents.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import threading
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+import serialization
+from audit_log import AuditLogStore, get_default_audit_log_store
+from database import (
+    ConnectionFactory,
+    borrow_connection,
+    default_connection_factory,
+    ensure_schema,
+    is_sqlite_connection as _is_sqlite_connection,
+)
+from orchestrator.models import Task
+
+Clock = Callable[[], datetime]
+
+logger = logging.getLogger(__name__)
+
+
+def default_clock() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+_SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS task_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id TEXT NOT NULL UNIQUE,
+        intent_id TEXT NOT NULL,
+        task_type TEXT NOT NULL,
+        entity_id TEXT,
+        payload_json TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        published_at TEXT
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_task_outbox_unpublished
+    ON task_outbox (id) WHERE published_at IS NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_task_outbox_published_at
+    ON task_outbox (published_at) WHERE published_at IS NOT NULL
+    """,
+]
+
+# The partial index keeps the relay's claim query proportional to the
+# backlog rather than to everything ever published.
+_POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS task_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        task_id TEXT NOT NULL UNIQUE,
+        intent_id TEXT NOT NULL,
+        task_type TEXT NOT NULL,
+        entity_id TEXT,
+        payload_json JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL,
+        published_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_task_outbox_unpublished
+    ON task_outbox (id) WHERE published_at IS NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_task_outbox_published_at
+    ON task_outbox (published_at) WHERE published_at IS NOT NULL
+    """,
+]
+
+_SQLITE_INSERT = """
+    INSERT INTO task_outbox (task_id, intent_id, task_type, entity_id, payload_json, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_POSTGRES_INSERT = """
+    INSERT INTO task_outbox (task_id, intent_id, task_type, entity_id, payload_json, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+_SQLITE_CLAIM = """
+    SELECT id, task_id, intent_id, task_type, entity_id, payload_json, created_at
+    FROM task_outbox
+    WHERE published_at IS NULL
+    ORDER BY id
+    LIMIT ?
+"""
+
+_POSTGRES_CLAIM = """
+    SELECT id, task_id, intent_id, task_type, entity_id, payload_json::text, created_at
+    FROM task_outbox
+    WHERE published_at IS NULL
+    ORDER BY id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+_POSTGRES_MARK_PUBLISHED = "UPDATE task_outbox SET published_at = %s WHERE id = ANY(%s)"
+
+_POSTGRES_PRUNE = "DELETE FROM task_outbox WHERE published_at < %s"
+
+
+def task_outbox_schema(*, sqlite: bool) -> list[str]:
+    return list(_SQLITE_SCHEMA if sqlite else _POSTGRES_SCHEMA)
+
+
+def initialize_task_outbox_table(connection: Any) -> None:
+    for statement in task_outbox_schema(sqlite=_is_sqlite_connection(connection)):
+        connection.execute(statement)
+
+
+@dataclass(frozen=True)
+class OutboxMessage:
+    id: int
+    task_id: str
+    intent_id: str
+    task_type: str
+    entity_id: str | None
+    payload: dict[str, Any]
+    created_at: datetime
+
+    def task_kwargs(self) -> dict[str, Any]:
+        return {"intent_id": self.intent_id, "entity_id": self.entity_id, "payload": self.payload}
+
+
+def _row_to_message(row: Sequence[Any]) -> OutboxMessage:
+    message_id, task_id, intent_id, task_type, entity_id, payload_json, created_at = row
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return OutboxMessage(
+        id=int(message_id),
+        task_id=task_id,
+        intent_id=intent_id,
+        task_type=task_type,
+        entity_id=entity_id,
+        payload=serialization.loads(payload_json),
+        created_at=created_at,
+    )
+
+
+class TaskOutbox:
+    def __init__(
+        self,
+        connection_factory: ConnectionFactory,
+        audit_log_store: AuditLogStore,
+        *,
+        clock: Clock | None = None,
+        close_connection: bool = True,
+    ) -> None:
+        self._connection_factory = connection_factory
+        self._audit_log_store = audit_log_store
+        self._clock = clock or default_clock
+        self._close_connection = close_connection
+
+    def enqueue(
+        self,
+        tasks: Sequence[Task],
+        *,
+        entity_id: str | None,
+        audit_entry: tuple[str, dict[str, Any], dict[str, Any]],
+    ) -> None:
+        """Write ``tasks`` and their ``audit_entry`` in one transaction."""
+        rows = [
+            (
+                task.task_id,
+                task.intent_id,
+                task.task_type,
+                entity_id,
+                serialization.dumps(task.payload),
+                task.created_at.isoformat(),
+            )
+            for task in tasks
+        ]
+        audit_rows = [self._audit_log_store.encode(*audit_entry)]
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "task_outbox",
+                initialize_task_outbox_table,
+            )
+            try:
+                months = self._audit_log_store.insert_rows(connection, audit_rows)
+                if _is_sqlite_connection(connection):
+                    connection.executemany(_SQLITE_INSERT, rows)
+                else:
+                    with connection.cursor() as cursor:
+                        cursor.executemany(_POSTGRES_INSERT, rows)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        self._audit_log_store.mark_partitions(months)
+
+    def pending_count(self) -> int:
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "task_outbox",
+                initialize_task_outbox_table,
+            )
+            row = connection.execute(
+                "SELECT COUNT(*) FROM task_outbox WHERE published_at IS NULL"
+            ).fetchone()
+        return int(row[0])
+
+    def prune_published(self, *, max_age: float) -> int:
+        """Delete rows published more than ``max_age`` seconds ago; return how many."""
+        cutoff = self._clock() - timedelta(seconds=max_age)
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "task_outbox",
+                initialize_task_outbox_table,
+            )
+            if _is_sqlite_connection(connection):
+                cursor = connection.execute(
+                    "DELETE FROM task_outbox WHERE published_at < ?",
+                    (cutoff.isoformat(),),
+                )
+            else:
+                cursor = connection.execute(_POSTGRES_PRUNE, (cutoff,))
+            deleted = cursor.rowcount
+            connection.commit()
+        return deleted
+
+
+_DEFAULT_OUTBOX: TaskOutbox | None = None
+
+
+def get_default_task_outbox() -> TaskOutbox:
+    global _DEFAULT_OUTBOX
+    if _DEFAULT_OUTBOX is None:
+        _DEFAULT_OUTBOX = TaskOutbox(default_connection_factory(), get_default_audit_log_store())
+    return _DEFAULT_OUTBOX
+
+
+Publisher = Callable[[Sequence[OutboxMessage]], None]
+
+
+class CeleryOutboxPublisher:
+    """Sends a batch of outbox messages over one broker connection.
+
+    The Celery task id is the orchestrator task id, so a batch sent twice
+    shows up as the same task ids.
+    """
+
+    def __init__(self, app: Any, task_names: Mapping[str, str]) -> None:
+        self._app = app
+        self._task_names = dict(task_names)
+
+    def __call__(self, messages: Sequence[OutboxMessage]) -> None:
+        with self._app.producer_or_acquire() as producer:
+            for message in messages:
+                self._app.send_task(
+                    self._task_names[message.task_type],
+                    kwargs=message.task_kwargs(),
+                    task_id=message.task_id,
+                    producer=producer,
+                )
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        connection_factory: ConnectionFactory,
+        publisher: Publisher,
+        *,
+        batch_size: int = 200,
+        clock: Clock | None = None,
+        close_connection: bool = True,
+    ) -> None:
+        self._connection_factory = connection_factory
+        self._publisher = publisher
+        self._batch_size = batch_size
+        self._clock = clock or default_clock
+        self._close_connection = close_connection
+
+    def relay_batch(self) -> int:
+        """Publish one batch of unpublished tasks; return how many were sent.
+
+        Rows stay locked from the claim until the commit, so concurrent
+        relays skip them. If publishing fails the transaction is rolled back
+        and the batch is claimed again later. SQLite has no row locks; there
+        the relay relies on being the only writer.
+        """
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "task_outbox",
+                initialize_task_outbox_table,
+            )
+            sqlite = _is_sqlite_connection(connection)
+            try:
+                rows = connection.execute(
+                    _SQLITE_CLAIM if sqlite else _POSTGRES_CLAIM,
+                    (self._batch_size,),
+                ).fetchall()
+                if not rows:
+                    connection.rollback()
+                    return 0
+                messages = [_row_to_message(row) for row in rows]
+                self._publisher(messages)
+                ids = [message.id for message in messages]
+                published_at = self._clock()
+                if sqlite:
+                    placeholders = ", ".join("?" for _ in ids)
+                    connection.execute(
+                        f"UPDATE task_outbox SET published_at = ? WHERE id IN ({placeholders})",
+                        [published_at.isoformat(), *ids],
+                    )
+                else:
+                    connection.execute(_POSTGRES_MARK_PUBLISHED, (published_at, ids))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        return len(messages)
+
+    def run(self, *, stop: threading.Event | None = None, idle_interval: float = 0.5) -> None:
+        """Relay until ``stop`` is set, draining full batches back to back."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                sent = self.relay_batch()
+            except Exception:  # noqa: BLE001
+                logger.exception("Outbox relay batch failed")
+                sent = 0
+            if sent < self._batch_size:
+                stop.wait(idle_interval)
+
+
+def main() -> None:
+    from app.config import settings
+    from apps.api.services.orchestrator import ACTION_TO_CELERY_TASK
+    from workers.celery_app import celery_app
+
+    parser = argparse.ArgumentParser(description="Relay planned tasks from task_outbox to Celery.")
+    parser.add_argument("--batch-size", type=int, default=settings.orchestrator_outbox_batch_size)
+    parser.add_argument("--idle-interval", type=float, default=settings.orchestrator_outbox_idle_interval)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    relay = OutboxRelay(
+        default_connection_factory(),
+        CeleryOutboxPublisher(
+            celery_app,
+            {action.value: task_name for action, task_name in ACTION_TO_CELERY_TASK.items()},
+        ),
+        batch_size=args.batch_size,
+    )
+    relay.run(idle_interval=args.idle_interval)
+
+
+if __name__ == "__main__":
+    main()
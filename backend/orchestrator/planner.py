@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 from collections.abc import Callable, Iterable, Mapping
 from datetime import datetime, timezone
 from typing import Any
 from uuid import uuid4
 
-from audit_log import AuditLogStore, get_default_audit_log_store
+from audit_log import (
+    AsyncAuditLogStore,
+    AuditLogStore,
+    get_default_async_audit_log_store,
+    get_default_audit_log_store,
+)
 from orchestrator.models import Task, TaskStatus
+from orchestrator.outbox import TaskOutbox
+from orchestrator.task_store import TaskStore
 
 IdGenerator = Callable[[str], str]
 Clock = Callable[[], datetime]
@@ -26,15 +34,41 @@ def build_idempotency_key(intent_id: str, task_type: str, entity_id: str | None)
 
 
 class TaskPlanner:
+    """Builds queued tasks and records the plan.
+
+    With an ``outbox``, planned tasks are queued for dispatch in the same
+    transaction as their audit record instead of only being audited. With a
+    ``task_store``, planned tasks are also stored as queued, in the same
+    transaction as their audit record, so their status can be
+    compared-and-set by ``TaskStateMachine``. The two are exclusive:
+    nothing moves a task dispatched through the outbox past queued, so
+    storing it would only inflate the stored queue depth.
+    """
+
     def __init__(
         self,
         id_generator: IdGenerator | None = None,
         clock: Clock | None = None,
         audit_log_store: AuditLogStore | None = None,
+        async_audit_log_store: AsyncAuditLogStore | None = None,
+        outbox: TaskOutbox | None = None,
+        task_store: TaskStore | None = None,
     ) -> None:
         self._id_generator = id_generator or default_id_generator
         self._clock = clock or default_clock
         self._audit_log_store = audit_log_store or get_default_audit_log_store()
+        if async_audit_log_store is None:
+            # An explicitly injected sync store must also receive the async writes.
+            async_audit_log_store = (
+                AsyncAuditLogStore(audit_log_store)
+                if audit_log_store is not None
+                else get_default_async_audit_log_store()
+            )
+        self._async_audit_log_store = async_audit_log_store
+        if outbox is not None and task_store is not None:
+            raise ValueError("Tasks planned through the outbox are not tracked in a task store.")
+        self._outbox = outbox
+        self._task_store = task_store
 
     def plan_tasks(
         self,
@@ -44,11 +78,75 @@ class TaskPlanner:
         entity_id: str | None = None,
         payloads: Mapping[str, dict[str, Any]] | None = None,
     ) -> list[Task]:
+        task_type_list = list(task_types)
+        tasks = self.build_tasks(intent_id, task_type_list, entity_id=entity_id, payloads=payloads)
+        if not tasks:
+            return tasks
+        record = _plan_audit_record(intent_id, task_type_list, entity_id, payloads or {}, tasks)
+        if self._outbox is not None:
+            self._outbox.enqueue(tasks, entity_id=entity_id, audit_entry=record)
+            return tasks
+        if self._task_store is not None:
+            self._store_plan(self._task_store, tasks, record)
+            return tasks
+        self._audit_log_store.append(*record)
+        return tasks
+
+    async def plan_tasks_async(
+        self,
+        intent_id: str,
+        task_types: Iterable[str],
+        *,
+        entity_id: str | None = None,
+        payloads: Mapping[str, dict[str, Any]] | None = None,
+    ) -> list[Task]:
+        task_type_list = list(task_types)
+        tasks = self.build_tasks(intent_id, task_type_list, entity_id=entity_id, payloads=payloads)
+        if not tasks:
+            return tasks
+        record = _plan_audit_record(intent_id, task_type_list, entity_id, payloads or {}, tasks)
+        if self._outbox is not None:
+            await asyncio.to_thread(
+                self._outbox.enqueue,
+                tasks,
+                entity_id=entity_id,
+                audit_entry=record,
+            )
+            return tasks
+        if self._task_store is not None:
+            await asyncio.to_thread(self._store_plan, self._task_store, tasks, record)
+            return tasks
+        await self._async_audit_log_store.append(*record)
+        return tasks
+
+    def _store_plan(
+        self,
+        task_store: TaskStore,
+        tasks: list[Task],
+        record: tuple[str, dict[str, Any], dict[str, Any]],
+    ) -> None:
+        """Store ``tasks`` as queued and their audit record in one transaction."""
+        with task_store.transaction() as connection:
+            task_store.insert_rows(connection, tasks)
+            months = self._audit_log_store.insert_rows(
+                connection,
+                [self._audit_log_store.encode(*record)],
+            )
+        self._audit_log_store.mark_partitions(months)
+
+    def build_tasks(
+        self,
+        intent_id: str,
+        task_types: Iterable[str],
+        *,
+        entity_id: str | None = None,
+        payloads: Mapping[str, dict[str, Any]] | None = None,
+    ) -> list[Task]:
+        """Build queued tasks without any I/O."""
         payload_map = payloads or {}
         created_at = self._clock()
-        task_type_list = list(task_types)
         tasks: list[Task] = []
-        for task_type in task_type_list:
+        for task_type in task_types:
             payload = dict(payload_map.get(task_type, {}))
             task = Task(
                 task_id=self._id_generator(task_type),
@@ -65,15 +163,23 @@ class TaskPlanner:
                 created_at=created_at,
             )
             tasks.append(task)
-        if tasks:
-            self._audit_log_store.append(
-                "orchestrator.plan_tasks",
-                {
-                    "intent_id": intent_id,
-                    "task_types": task_type_list,
-                    "entity_id": entity_id,
-                    "payloads": payload_map,
-                },
-                {"tasks": [task.to_dict() for task in tasks]},
-            )
         return tasks
+
+
+def _plan_audit_record(
+    intent_id: str,
+    task_types: list[str],
+    entity_id: str | None,
+    payloads: Mapping[str, dict[str, Any]],
+    tasks: list[Task],
+) -> tuple[str, dict[str, Any], dict[str, Any]]:
+    return (
+        "orchestrator.plan_tasks",
+        {
+            "intent_id": intent_id,
+            "task_types": task_types,
+            "entity_id": entity_id,
+            "payloads": payloads,
+        },
+        {"tasks": [task.to_dict() for task in tasks]},
+    )
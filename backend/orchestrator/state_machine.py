@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import replace
-from typing import Iterable
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import Any
 
 from audit_log import AuditLogStore, get_default_audit_log_store
 from orchestrator.deadletter_store import DeadLetterStore, get_default_deadletter_store
 from orchestrator.models import Task, TaskStatus
+from orchestrator.task_store import TaskStore
 
 _ALLOWED_TRANSITIONS: set[tuple[TaskStatus, TaskStatus]] = {
     (TaskStatus.queued, TaskStatus.running),
@@ -17,30 +20,75 @@ _ALLOWED_TRANSITIONS: set[tuple[TaskStatus, TaskStatus]] = {
 }
 
 
+AuditEntry = tuple[str, dict[str, Any], dict[str, Any]]
+
+INVALID_TRANSITION = "invalid_transition"
+CONFLICT = "conflict"
+
+RETRY_LIMIT_EXHAUSTED = "retry_limit_exhausted"
+
+
+@dataclass(frozen=True)
+class TransitionOutcome:
+    """What a bulk transition did to one task.
+
+    ``result`` is the transitioned task, or ``None`` with ``error`` set to
+    ``INVALID_TRANSITION`` or ``CONFLICT`` when the task was left as it was.
+    """
+
+    task: Task
+    target: TaskStatus
+    result: Task | None = None
+    error: str | None = None
+
+    @property
+    def applied(self) -> bool:
+        return self.result is not None
+
+
+class TaskTransitionConflict(ValueError):
+    """The stored task was no longer in the status the transition started from."""
+
+
+def _applied(outcome: TransitionOutcome, source: Task) -> Task:
+    """Return the transitioned task, or raise what the single-task API raises."""
+    if outcome.error == INVALID_TRANSITION:
+        raise ValueError(
+            f"Invalid transition from {source.status.value} to {outcome.target.value}"
+        )
+    if outcome.result is None:
+        raise TaskTransitionConflict(f"Task {source.task_id} is no longer {source.status.value}")
+    return outcome.result
+
+
 class TaskStateMachine:
+    """Validates task transitions and records them.
+
+    With a ``task_store``, each transition is applied to the stored row only
+    if it still has the status the caller saw, so when two workers move the
+    same task one of them gets ``TaskTransitionConflict`` instead of both
+    succeeding. The stored row, the audit record and any deadletter entry
+    commit in one transaction.
+    """
+
     def __init__(
         self,
         allowed_transitions: Iterable[tuple[TaskStatus, TaskStatus]] | None = None,
         audit_log_store: AuditLogStore | None = None,
         deadletter_store: DeadLetterStore | None = None,
+        task_store: TaskStore | None = None,
     ) -> None:
         self._allowed_transitions = set(allowed_transitions or _ALLOWED_TRANSITIONS)
         self._audit_log_store = audit_log_store or get_default_audit_log_store()
         self._deadletter_store = deadletter_store or get_default_deadletter_store()
+        self._task_store = task_store
 
     def can_transition(self, current: TaskStatus, target: TaskStatus) -> bool:
         return (current, target) in self._allowed_transitions
 
     def transition(self, task: Task, target: TaskStatus) -> Task:
-        if not self.can_transition(task.status, target):
-            raise ValueError(f"Invalid transition from {task.status.value} to {target.value}")
-        next_task = replace(task, status=target)
-        self._audit_log_store.append(
-            "orchestrator.transition",
-            {"task": task.to_dict(), "target_status": target.value},
-            {"task": next_task.to_dict()},
-        )
-        return next_task
+        (outcome,) = self._apply_many([(task, task, target, None)])
+        return _applied(outcome, task)
 
     def record_failure(self, task: Task) -> Task:
         return self.transition(task, TaskStatus.failed)
@@ -50,10 +98,113 @@ class TaskStateMachine:
             raise ValueError("Task must be in failed state to schedule retry.")
         next_task = replace(task, retry_count=task.retry_count + 1)
         if task.retry_count < max_retries:
-            return self.transition(next_task, TaskStatus.retrying)
-        transitioned = self.transition(next_task, TaskStatus.deadletter)
-        self._deadletter_store.append(transitioned, "retry_limit_exhausted")
-        return transitioned
+            request = (task, next_task, TaskStatus.retrying, None)
+        else:
+            request = (task, next_task, TaskStatus.deadletter, RETRY_LIMIT_EXHAUSTED)
+        (outcome,) = self._apply_many([request])
+        return _applied(outcome, next_task)
 
     def requeue(self, task: Task) -> Task:
         return self.transition(task, TaskStatus.queued)
+
+    def transition_many(self, tasks: Iterable[Task], target: TaskStatus) -> list[TransitionOutcome]:
+        """Move every task to ``target`` in one batch; outcomes follow ``tasks``' order.
+
+        Invalid transitions are reported rather than raised and do not stop
+        the others.
+        """
+        return self._apply_many([(task, task, target, None) for task in tasks])
+
+    def schedule_retry_many(
+        self,
+        tasks: Iterable[Task],
+        *,
+        max_retries: int,
+    ) -> list[TransitionOutcome]:
+        """Batch form of ``schedule_retry``; tasks not in failed state are reported invalid."""
+        requests: list[tuple[Task, Task, TaskStatus, str | None]] = []
+        for task in tasks:
+            next_task = replace(task, retry_count=task.retry_count + 1)
+            if task.status != TaskStatus.failed:
+                requests.append((task, task, TaskStatus.retrying, None))
+            elif task.retry_count < max_retries:
+                requests.append((task, next_task, TaskStatus.retrying, None))
+            else:
+                requests.append((task, next_task, TaskStatus.deadletter, RETRY_LIMIT_EXHAUSTED))
+        return self._apply_many(requests)
+
+    def _apply_many(
+        self,
+        requests: Sequence[tuple[Task, Task, TaskStatus, str | None]],
+    ) -> list[TransitionOutcome]:
+        """Apply ``(task, source, target, deadletter reason)`` requests.
+
+        Every request is validated before anything is written. With a task
+        store, the compare-and-set updates, audit rows and deadletter rows
+        commit in one transaction on its connection. Without one, deadletter
+        rows commit with their audit rows on the audit log store's
+        connection, and audit rows alone go through ``append_many``.
+        """
+        outcomes: list[TransitionOutcome | None] = [None] * len(requests)
+        valid: list[tuple[int, Task, Task]] = []
+        for index, (task, source, target, _) in enumerate(requests):
+            if self.can_transition(source.status, target):
+                valid.append((index, source, replace(source, status=target)))
+            else:
+                outcomes[index] = TransitionOutcome(task, target, error=INVALID_TRANSITION)
+
+        def _writes(applied: Sequence[bool]) -> tuple[list[AuditEntry], list[tuple[Task, str]]]:
+            audit_entries: list[AuditEntry] = []
+            deadletters: list[tuple[Task, str]] = []
+            for (index, source, next_task), ok in zip(valid, applied):
+                task, _, target, reason = requests[index]
+                if not ok:
+                    outcomes[index] = TransitionOutcome(task, target, error=CONFLICT)
+                    continue
+                outcomes[index] = TransitionOutcome(task, target, result=next_task)
+                audit_entries.append(
+                    (
+                        "orchestrator.transition",
+                        {"task": source.to_dict(), "target_status": target.value},
+                        {"task": next_task.to_dict()},
+                    )
+                )
+                if reason is not None:
+                    deadletters.append((next_task, reason))
+            return audit_entries, deadletters
+
+        if not valid:
+            return [outcome for outcome in outcomes if outcome is not None]
+        if self._task_store is None:
+            audit_entries, deadletters = _writes([True] * len(valid))
+            if not deadletters:
+                # Nothing else to commit with: a buffered store keeps the
+                # audit rows off the caller's path.
+                self._audit_log_store.append_many(audit_entries)
+                return [outcome for outcome in outcomes if outcome is not None]
+            with self._audit_log_store.transaction() as connection:
+                months = self._insert_writes(connection, audit_entries, deadletters)
+        else:
+            with self._task_store.transaction() as connection:
+                applied = self._task_store.compare_and_set_rows(
+                    connection,
+                    [(next_task, source.status) for _, source, next_task in valid],
+                )
+                months = self._insert_writes(connection, *_writes(applied))
+        self._audit_log_store.mark_partitions(months)
+        return [outcome for outcome in outcomes if outcome is not None]
+
+    def _insert_writes(
+        self,
+        connection: Any,
+        audit_entries: Sequence[AuditEntry],
+        deadletters: Sequence[tuple[Task, str]],
+    ) -> list[date]:
+        months: list[date] = []
+        if audit_entries:
+            months = self._audit_log_store.insert_rows(
+                connection,
+                [self._audit_log_store.encode(*entry) for entry in audit_entries],
+            )
+        self._deadletter_store.insert_rows(connection, deadletters)
+        return months
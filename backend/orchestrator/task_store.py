@@ -0,0 +1,326 @@
+"""Current state of orchestrator tasks, queryable by status.
+
+Every planned ``Task`` gets one row in ``orchestrator_tasks``; the audit log
+keeps the history, this table keeps the present. Transitions are applied
+with a single ``UPDATE ... WHERE task_id = ? AND status = ?`` so that of two
+workers moving the same task only one succeeds, without a read or an
+explicit lock. Status counts and queue depth are answered from the
+``(status, task_type)`` index.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+import serialization
+from database import (
+    ConnectionFactory,
+    borrow_connection,
+    default_connection_factory,
+    ensure_schema,
+    is_sqlite_connection as _is_sqlite_connection,
+)
+from orchestrator.models import Task, TaskStatus
+
+Clock = Callable[[], datetime]
+
+
+def default_clock() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+_SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS orchestrator_tasks (
+        task_id TEXT PRIMARY KEY,
+        intent_id TEXT NOT NULL,
+        task_type TEXT NOT NULL,
+        status TEXT NOT NULL,
+        retry_count INTEGER NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        payload_json TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_orchestrator_tasks_status
+    ON orchestrator_tasks (status, task_type)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_orchestrator_tasks_intent_id
+    ON orchestrator_tasks (intent_id)
+    """,
+]
+
+_POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS orchestrator_tasks (
+        task_id TEXT PRIMARY KEY,
+        intent_id TEXT NOT NULL,
+        task_type TEXT NOT NULL,
+        status TEXT NOT NULL,
+        retry_count INTEGER NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        payload_json JSONB NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_orchestrator_tasks_status
+    ON orchestrator_tasks (status, task_type)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_orchestrator_tasks_intent_id
+    ON orchestrator_tasks (intent_id)
+    """,
+]
+
+_SQLITE_INSERT = """
+    INSERT INTO orchestrator_tasks (
+        task_id, intent_id, task_type, status, retry_count, idempotency_key,
+        payload_json, created_at, updated_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (task_id) DO NOTHING
+"""
+
+_POSTGRES_INSERT = """
+    INSERT INTO orchestrator_tasks (
+        task_id, intent_id, task_type, status, retry_count, idempotency_key,
+        payload_json, created_at, updated_at
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (task_id) DO NOTHING
+"""
+
+_SQLITE_COMPARE_AND_SET = """
+    UPDATE orchestrator_tasks
+    SET status = ?, retry_count = ?, updated_at = ?
+    WHERE task_id = ? AND status = ?
+"""
+
+# One statement for the whole batch; RETURNING tells which rows matched.
+_POSTGRES_COMPARE_AND_SET = """
+    UPDATE orchestrator_tasks AS t
+    SET status = v.status, retry_count = v.retry_count, updated_at = %s
+    FROM unnest(%s::text[], %s::text[], %s::text[], %s::int[])
+        AS v(task_id, expected, status, retry_count)
+    WHERE t.task_id = v.task_id AND t.status = v.expected
+    RETURNING t.task_id
+"""
+
+_SQLITE_GET = """
+    SELECT task_id, intent_id, task_type, status, retry_count, idempotency_key,
+           payload_json, created_at
+    FROM orchestrator_tasks
+    WHERE task_id = ?
+"""
+
+_POSTGRES_GET = """
+    SELECT task_id, intent_id, task_type, status, retry_count, idempotency_key,
+           payload_json::text, created_at
+    FROM orchestrator_tasks
+    WHERE task_id = %s
+"""
+
+
+def task_store_schema(*, sqlite: bool) -> list[str]:
+    return list(_SQLITE_SCHEMA if sqlite else _POSTGRES_SCHEMA)
+
+
+def initialize_task_store_table(connection: Any) -> None:
+    for statement in task_store_schema(sqlite=_is_sqlite_connection(connection)):
+        connection.execute(statement)
+
+
+def _row_to_task(row: Sequence[Any]) -> Task:
+    task_id, intent_id, task_type, status, retry_count, idempotency_key, payload, created_at = row
+    return Task.from_dict(
+        {
+            "task_id": task_id,
+            "intent_id": intent_id,
+            "task_type": task_type,
+            "status": status,
+            "retry_count": retry_count,
+            "idempotency_key": idempotency_key,
+            "payload": serialization.loads(payload),
+            "created_at": created_at,
+        }
+    )
+
+
+class TaskStore:
+    def __init__(
+        self,
+        connection_factory: ConnectionFactory,
+        *,
+        clock: Clock | None = None,
+        close_connection: bool = True,
+    ) -> None:
+        self._connection_factory = connection_factory
+        self._clock = clock or default_clock
+        self._close_connection = close_connection
+
+    def _ensure_schema(self, connection: Any) -> None:
+        ensure_schema(
+            self._connection_factory,
+            connection,
+            "orchestrator_tasks",
+            initialize_task_store_table,
+        )
+
+    def insert_many(self, tasks: Sequence[Task]) -> None:
+        if not tasks:
+            return
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            self.insert_rows(connection, tasks)
+            connection.commit()
+
+    def insert_rows(self, connection: Any, tasks: Sequence[Task]) -> None:
+        """Insert ``tasks`` on ``connection`` without committing; existing ids are kept."""
+        self._ensure_schema(connection)
+        updated_at = self._clock().isoformat()
+        rows = [
+            (
+                task.task_id,
+                task.intent_id,
+                task.task_type,
+                task.status.value,
+                task.retry_count,
+                task.idempotency_key,
+                serialization.dumps(task.payload),
+                task.created_at.isoformat(),
+                updated_at,
+            )
+            for task in tasks
+        ]
+        if _is_sqlite_connection(connection):
+            connection.executemany(_SQLITE_INSERT, rows)
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(_POSTGRES_INSERT, rows)
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """Yield a connection whose writes commit together, or not at all."""
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            self._ensure_schema(connection)
+            try:
+                yield connection
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+    def compare_and_set(self, task: Task, expected: TaskStatus) -> bool:
+        """Store ``task``'s status and retry count if its row is still ``expected``.
+
+        Returns ``False`` when another writer moved the task first, or when
+        the task was never stored.
+        """
+        with self.transaction() as connection:
+            (updated,) = self.compare_and_set_rows(connection, [(task, expected)])
+        return updated
+
+    def compare_and_set_rows(
+        self,
+        connection: Any,
+        updates: Sequence[tuple[Task, TaskStatus]],
+    ) -> list[bool]:
+        """Apply ``(task, expected)`` updates on ``connection`` without committing.
+
+        Returns, per update, whether the row still had its expected status.
+        """
+        if not updates:
+            return []
+        updated_at = self._clock().isoformat()
+        if _is_sqlite_connection(connection):
+            return [
+                connection.execute(
+                    _SQLITE_COMPARE_AND_SET,
+                    (task.status.value, task.retry_count, updated_at, task.task_id, expected.value),
+                ).rowcount
+                == 1
+                for task, expected in updates
+            ]
+        rows = connection.execute(
+            _POSTGRES_COMPARE_AND_SET,
+            (
+                updated_at,
+                [task.task_id for task, _ in updates],
+                [expected.value for _, expected in updates],
+                [task.status.value for task, _ in updates],
+                [task.retry_count for task, _ in updates],
+            ),
+        ).fetchall()
+        matched = {row[0] for row in rows}
+        results: list[bool] = []
+        for task, _ in updates:
+            # A task listed twice is only applied once.
+            results.append(task.task_id in matched)
+            matched.discard(task.task_id)
+        return results
+
+    def get(self, task_id: str) -> Task | None:
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            self._ensure_schema(connection)
+            query = _SQLITE_GET if _is_sqlite_connection(connection) else _POSTGRES_GET
+            row = connection.execute(query, (task_id,)).fetchone()
+        return _row_to_task(row) if row else None
+
+    def status_counts(self, *, intent_id: str | None = None) -> dict[str, dict[str, int]]:
+        """Return ``{task_type: {status: count}}``, optionally for one intent."""
+        query = "SELECT task_type, status, COUNT(*) FROM orchestrator_tasks"
+        params: tuple[Any, ...] = ()
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            self._ensure_schema(connection)
+            if intent_id is not None:
+                placeholder = "?" if _is_sqlite_connection(connection) else "%s"
+                query += f" WHERE intent_id = {placeholder}"
+                params = (intent_id,)
+            rows = connection.execute(f"{query} GROUP BY task_type, status", params).fetchall()
+        counts: dict[str, dict[str, int]] = {}
+        for task_type, status, count in rows:
+            counts.setdefault(task_type, {})[status] = int(count)
+        return counts
+
+    def queue_depth(self) -> dict[str, int]:
+        """Return ``{task_type: queued task count}``."""
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            self._ensure_schema(connection)
+            placeholder = "?" if _is_sqlite_connection(connection) else "%s"
+            rows = connection.execute(
+                "SELECT task_type, COUNT(*) FROM orchestrator_tasks "
+                f"WHERE status = {placeholder} GROUP BY task_type",
+                (TaskStatus.queued.value,),
+            ).fetchall()
+        return {task_type: int(count) for task_type, count in rows}
+
+
+_DEFAULT_STORE: TaskStore | None = None
+
+
+def get_default_task_store() -> TaskStore:
+    global _DEFAULT_STORE
+    if _DEFAULT_STORE is None:
+        _DEFAULT_STORE = TaskStore(default_connection_factory())
+    return _DEFAULT_STORE
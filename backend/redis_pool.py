@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+import redis
+
+from app.config import settings
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Blocking Redis pool that counts how checkouts were served.
+
+    A hit reuses an idle connection, a miss opens a new socket and a timeout
+    means no connection freed up within ``timeout`` seconds. The pool blocks
+    instead of growing past ``max_connections`` so a busy worker cannot
+    exhaust the server's client limit.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._misses = 0
+        self._timeouts = 0
+
+    def make_connection(self) -> Any:
+        with self._stats_lock:
+            self._misses += 1
+        return super().make_connection()
+
+    def get_connection(self, command_name: str, *keys: Any, **options: Any) -> Any:
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as exc:
+            if str(exc) == "No connection available.":
+                with self._stats_lock:
+                    self._timeouts += 1
+            raise
+        with self._stats_lock:
+            self._checkouts += 1
+        return connection
+
+    def stats(self) -> dict[str, int]:
+        with self._stats_lock:
+            return {
+                "checkouts": self._checkouts,
+                "hits": self._checkouts - self._misses,
+                "misses": self._misses,
+                "timeouts": self._timeouts,
+                "connections": len(self._connections),
+                "max_connections": self.max_connections,
+            }
+
+
+def redis_pool_size() -> int:
+    """Connections the pool allows, never fewer than the threads can hold.
+
+    Each batch thread can hold a command connection, a pub/sub subscription
+    while it waits on another holder and its lease renewal at once; every
+    provider thread holds one more. ``redis_pool_max_connections`` only
+    raises the limit, so a pool smaller than that demand cannot make lease
+    renewals time out behind long waits.
+    """
+    demand = 3 * settings.worker_batch_max_workers + settings.worker_provider_pool_size + 1
+    return max(settings.redis_pool_max_connections, demand)
+
+
+def build_redis_pool(redis_url: str | None = None) -> InstrumentedConnectionPool:
+    return InstrumentedConnectionPool.from_url(
+        redis_url or settings.redis_url,
+        max_connections=redis_pool_size(),
+        timeout=settings.redis_pool_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_connect_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+        decode_responses=True,
+    )
+
+
+_DEFAULT_POOL: InstrumentedConnectionPool | None = None
+_DEFAULT_CLIENT: redis.Redis | None = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_default_redis_client() -> redis.Redis:
+    """Return the per-process client; every call shares one connection pool."""
+    global _DEFAULT_POOL, _DEFAULT_CLIENT
+    if _DEFAULT_CLIENT is None:
+        with _DEFAULT_LOCK:
+            if _DEFAULT_CLIENT is None:
+                _DEFAULT_POOL = build_redis_pool()
+                _DEFAULT_CLIENT = redis.Redis(connection_pool=_DEFAULT_POOL)
+    return _DEFAULT_CLIENT
+
+
+def default_redis_pool_stats() -> dict[str, int]:
+    return _DEFAULT_POOL.stats() if _DEFAULT_POOL is not None else {}
+
+
+def reset_default_redis_pool_after_fork() -> None:
+    """Forget the pool inherited from the parent process.
+
+    The parent's sockets must not be shared or closed by a forked child, so
+    the child drops its references and lazily builds its own pool.
+    """
+    global _DEFAULT_POOL, _DEFAULT_CLIENT, _DEFAULT_LOCK
+    _DEFAULT_LOCK = threading.Lock()
+    _DEFAULT_POOL = None
+    _DEFAULT_CLIENT = None
+
+
+def close_default_redis_pool() -> None:
+    global _DEFAULT_POOL, _DEFAULT_CLIENT
+    with _DEFAULT_LOCK:
+        if _DEFAULT_POOL is not None:
+            _DEFAULT_POOL.disconnect()
+        _DEFAULT_POOL = None
+        _DEFAULT_CLIENT = None
@@ -0,0 +1,201 @@
+"""Canonical JSON codec shared by the audit log, deadletter store and worker caches.
+
+Output is compact, key-sorted UTF-8 JSON. orjson is used when installed and
+the standard library otherwise; both backends emit identical bytes for
+strings, 64-bit ints, floats, bools, None, lists, dicts, datetimes, dates
+and enums. Datetimes and dates are written as ISO 8601 and enums as their
+value, so callers can pass domain objects directly instead of
+pre-converting them.
+
+The canonical form is orjson's: floats in shortest round-trip form with
+exponents such as ``1e16`` and ``1e-7``, NaN and infinities as ``null``, and
+non-string keys converted to strings before sorting. The stdlib backend
+produces the same bytes by stringifying keys itself and, when the C
+encoder's float output would differ, substituting orjson-style floats into
+``json.dumps`` output.
+"""
+from __future__ import annotations
+
+import json
+import math
+import re
+from collections.abc import Callable
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+from uuid import uuid4
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+BACKENDS = ("orjson", "json")
+
+_backend = "orjson" if orjson is not None else "json"
+_NUMERIC_KEY = re.compile(r'"[-\d][^"]*":')
+_ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _format_float(value: float) -> str:
+    """``repr`` rewritten to orjson's float format."""
+    if not math.isfinite(value):
+        return "null"
+    text = repr(value)
+    if "e" not in text:
+        return text
+    mantissa, exponent = text.split("e")
+    power = int(exponent)
+    if power == -5:
+        # orjson keeps one more negative power in positional notation.
+        sign = "-" if mantissa.startswith("-") else ""
+        digits = mantissa.lstrip("-").replace(".", "")
+        return f"{sign}0.0000{digits}"
+    return f"{mantissa}e{power}"
+
+
+def _format_key(key: Any) -> str:
+    if isinstance(key, str):
+        return key.value if isinstance(key, Enum) else key
+    if key is True or key is False:
+        return "true" if key else "false"
+    if key is None:
+        return "null"
+    if isinstance(key, Enum):
+        return _format_key(key.value)
+    if isinstance(key, int):
+        return str(int(key))
+    if isinstance(key, float):
+        return _format_float(key)
+    if isinstance(key, (datetime, date)):
+        return key.isoformat()
+    raise TypeError(f"Dict key of type {type(key).__name__} is not JSON serializable")
+
+
+def _has_str_keys(value: Any) -> bool:
+    pending = [value]
+    while pending:
+        item = pending.pop()
+        if type(item) is dict:
+            for key in item:
+                if type(key) is not str:
+                    return False
+            pending.extend(item.values())
+        elif type(item) is list or type(item) is tuple:
+            pending.extend(item)
+    return True
+
+
+def _stringify_keys(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {_format_key(key): _stringify_keys(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_stringify_keys(item) for item in value]
+    return value
+
+
+def _c_dumps(value: Any) -> str | None:
+    try:
+        return json.dumps(
+            value,
+            default=_default,
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            allow_nan=False,
+        )
+    except ValueError:
+        return None  # NaN or an infinity
+
+
+def _stdlib_dumps(value: Any) -> str:
+    try:
+        text = _c_dumps(value)
+        unsortable = False
+    except TypeError:
+        text, unsortable = None, True
+    # The C encoder sorts non-string keys by value (2 before 10) while
+    # orjson sorts the strings they become ("10" before "2"). Every numeric
+    # key shows up as '"<digit>...":'; matches that are not keys only cost
+    # the walk that confirms it.
+    if unsortable or text is None or _NUMERIC_KEY.search(text):
+        if not _has_str_keys(value):
+            value = _stringify_keys(value)
+            text = _c_dumps(value)
+    # repr() exponents look like "1e+16" or "1e-05"; any other float already
+    # matches orjson, so the re-encoding below is rarely needed.
+    if text is not None and "e+" not in text and "e-0" not in text:
+        return text
+    # Floats are encoded as placeholder strings (a per-call token the data
+    # cannot contain by chance) and swapped for their orjson form afterwards.
+    token = uuid4().hex
+    floats: list[str] = []
+
+    def _placeholder(number: float) -> str:
+        floats.append(_format_float(number))
+        return f"{token}{len(floats) - 1}"
+
+    def _default_with_floats(item: Any) -> Any:
+        converted = _default(item)
+        return _placeholder(converted) if isinstance(converted, float) else converted
+
+    text = json.dumps(
+        _replace_floats(value, _placeholder),
+        default=_default_with_floats,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return re.sub(f'"{token}(\\d+)"', lambda match: floats[int(match[1])], text)
+
+
+def _replace_floats(value: Any, placeholder: Callable[[float], str]) -> Any:
+    if isinstance(value, float):
+        return placeholder(value)
+    if isinstance(value, dict):
+        return {key: _replace_floats(item, placeholder) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_replace_floats(item, placeholder) for item in value]
+    return value
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def set_backend(name: str) -> None:
+    """Select ``"orjson"`` or ``"json"``; mainly for benchmarks and tests."""
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {name}")
+    if name == "orjson" and orjson is None:
+        raise RuntimeError("orjson is not installed.")
+    _backend = name
+
+
+def dumps_bytes(value: Any) -> bytes:
+    if _backend == "orjson":
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+    return _stdlib_dumps(value).encode("utf-8")
+
+
+def dumps(value: Any) -> str:
+    if _backend == "orjson":
+        return dumps_bytes(value).decode("utf-8")
+    return _stdlib_dumps(value)
+
+
+def loads(data: str | bytes | bytearray | memoryview) -> Any:
+    if _backend == "orjson":
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
@@ -0,0 +1,65 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from apps.api.routes import audit as audit_routes
+from audit_log import AuditLogStore
+
+
+client = TestClient(app)
+
+
+@pytest.fixture()
+def store(monkeypatch) -> AuditLogStore:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    start = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    ticks = iter(range(100))
+    audit_store = AuditLogStore(
+        lambda: connection,
+        clock=lambda: start + timedelta(minutes=next(ticks)),
+        close_connection=False,
+    )
+    for index in range(5):
+        audit_store.append("worker.company_search", {"intent_id": "intent-1", "index": index}, {})
+    audit_store.append("worker.contact_finder", {"intent_id": "intent-2"}, {})
+    monkeypatch.setattr(audit_routes, "get_default_audit_log_store", lambda: audit_store)
+    return audit_store
+
+
+def test_list_audit_log_pages_with_keyset_cursor(store: AuditLogStore) -> None:
+    first = client.get("/audit", params={"intent_id": "intent-1", "limit": 3}).json()
+    second = client.get(
+        "/audit",
+        params={"intent_id": "intent-1", "limit": 3, "after_id": first["next_cursor"]},
+    ).json()
+
+    assert [json.loads(item["input_json"])["index"] for item in first["items"]] == [0, 1, 2]
+    assert [json.loads(item["input_json"])["index"] for item in second["items"]] == [3, 4]
+    assert second["next_cursor"] is None
+    assert first["items"][0]["task_type"] == "company_search"
+
+
+def test_list_audit_log_filters_by_source_and_time(store: AuditLogStore) -> None:
+    by_source = client.get("/audit", params={"trigger_source": "worker.contact_finder"}).json()
+    by_time = client.get(
+        "/audit",
+        params={"since": "2024-03-01T00:01:00+00:00", "until": "2024-03-01T00:03:00+00:00"},
+    ).json()
+
+    assert [item["intent_id"] for item in by_source["items"]] == ["intent-2"]
+    assert len(by_time["items"]) == 2
+
+
+def test_stream_audit_log_returns_ndjson(store: AuditLogStore) -> None:
+    response = client.get("/audit/stream", params={"intent_id": "intent-1"})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert len(lines) == 5
@@ -2,29 +2,34 @@ from __future__ import annotations
 
 import json
 import sqlite3
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timezone
 from typing import Any
 
-from audit_log import AuditLogStore
-from orchestrator import TaskPlanner, TaskStateMachine, TaskStatus
-from workers import tasks
+import fakeredis
 
+from psycopg import errors as pg_errors, sql
 
-class InMemoryRedis:
-    def __init__(self) -> None:
-        self.store: dict[str, str] = {}
+from audit_log import (
+    AuditLogStore,
+    BufferedAuditLogStore,
+    audit_log_partition_bound,
+    initialize_audit_log_table,
+)
+from database import PooledConnectionFactory
+from orchestrator.deadletter_store import DeadLetterStore
+from orchestrator import TaskPlanner, TaskStateMachine, TaskStatus
+from orchestrator.task_store import initialize_task_store_table
+from workers import tasks
 
-    def get(self, key: str) -> str | None:
-        return self.store.get(key)
 
-    def set(self, key: str, value: str, nx: bool = False, ex: int | None = None) -> bool:
-        if nx and key in self.store:
-            return False
-        self.store[key] = value
-        return True
+class InMemoryRedis(fakeredis.FakeRedis):
+    """Isolated fakeredis instance; its Lua support runs the idempotency scripts."""
 
-    def delete(self, key: str) -> int:
-        return 1 if self.store.pop(key, None) is not None else 0
+    def __init__(self) -> None:
+        super().__init__(server=fakeredis.FakeServer(), decode_responses=True)
 
 
 def test_audit_log_append_only() -> None:
@@ -84,3 +89,242 @@ def test_orchestrator_and_worker_actions_log_entries(monkeypatch: Any) -> None:
     assert "orchestrator.plan_tasks" in sources
     assert "orchestrator.transition" in sources
     assert "worker.company_search" in sources
+
+
+class SqlitePool(PooledConnectionFactory):
+    def __init__(self) -> None:
+        super().__init__("postgresql://unused")
+        self.shared = sqlite3.connect(":memory:")
+        self.statements: list[str] = []
+        self.shared.set_trace_callback(self.statements.append)
+        self.checkouts = 0
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        self.checkouts += 1
+        yield self.shared
+
+    @contextmanager
+    def schema_connection(self) -> Iterator[sqlite3.Connection]:
+        yield self.shared
+
+
+def test_pooled_stores_share_connections_and_create_schema_once() -> None:
+    pool = SqlitePool()
+    audit_store = AuditLogStore(pool)
+    deadletter_store = DeadLetterStore(pool)
+
+    for index in range(3):
+        audit_store.append("worker.company_search", {"index": index}, {"status": "success"})
+    deadletter_store.list()
+    deadletter_store.list()
+
+    ddl = [statement for statement in pool.statements if "CREATE TABLE" in statement]
+    assert len(ddl) == 3
+    assert pool.checkouts == 5
+    count = pool.shared.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0]
+    assert count == 3
+
+
+def test_pooled_schema_creation_leaves_the_callers_transaction_open() -> None:
+    pool = SqlitePool()
+    audit_store = AuditLogStore(pool)
+    initialize_task_store_table(pool.shared)
+    initialize_audit_log_table(pool.shared)
+    pool.shared.commit()
+    pool.schema_connection = lambda: nullcontext(sqlite3.connect(":memory:"))  # type: ignore[method-assign]
+
+    with pool.connection() as connection:
+        connection.execute(
+            "INSERT INTO orchestrator_tasks VALUES ('t', 'i', 'x', 'queued', 0, 'k', '{}', '', '')"
+        )
+        # First use of audit_log on this pool ensures its schema mid-transaction.
+        audit_store.insert_rows(connection, [audit_store.encode("x", {}, {})])
+        assert connection.in_transaction
+        connection.rollback()
+
+    assert pool.shared.execute("SELECT COUNT(*) FROM orchestrator_tasks").fetchone() == (0,)
+    assert pool.schema_initialized("audit_log")
+
+
+def test_buffered_store_group_commits_on_flush() -> None:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    statements: list[str] = []
+    connection.set_trace_callback(statements.append)
+    store = BufferedAuditLogStore(
+        lambda: connection,
+        close_connection=False,
+        batch_size=50,
+        flush_interval=0.05,
+    )
+
+    for index in range(120):
+        store.append("worker.company_search", {"index": index}, {"status": "success"})
+    store.flush(timeout=5)
+
+    rows = connection.execute("SELECT input_json FROM audit_log ORDER BY id").fetchall()
+    assert [json.loads(row[0])["index"] for row in rows] == list(range(120))
+    commits = [statement for statement in statements if statement == "COMMIT"]
+    assert 0 < len(commits) < 120
+    store.close(timeout=5)
+
+
+def test_buffered_store_close_drains_queue() -> None:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    store = BufferedAuditLogStore(
+        lambda: connection,
+        close_connection=False,
+        max_buffer=4,
+        batch_size=2,
+        flush_interval=10,
+    )
+
+    for index in range(10):
+        store.append("worker.contact_finder", {"index": index}, {"status": "success"})
+    store.close(timeout=5)
+
+    count = connection.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0]
+    assert count == 10
+
+
+def test_buffered_store_close_timeout_keeps_single_writer() -> None:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    store = BufferedAuditLogStore(lambda: connection, close_connection=False, flush_interval=0.01)
+    release = threading.Event()
+    write_rows = store.write_rows
+
+    def _slow_write(rows: Any) -> None:
+        release.wait(5)
+        write_rows(rows)
+
+    store.write_rows = _slow_write  # type: ignore[method-assign]
+    store.append("worker.company_search", {"index": 0}, {"status": "success"})
+    writer = store._writer._thread
+    store.close(timeout=0.05)
+    assert store._writer._thread is writer and writer.is_alive()
+
+    store.append("worker.company_search", {"index": 1}, {"status": "success"})
+    assert store._writer._thread is writer
+    release.set()
+    writer.join(5)
+    # The old writer stopped at the close sentinel; the next append replaces it.
+    store.append("worker.company_search", {"index": 2}, {"status": "success"})
+    assert store._writer._thread is not writer
+    store.close(timeout=5)
+    assert store._writer._thread is None
+    count = connection.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0]
+    assert count == 3
+
+
+def test_identity_columns_extracted_at_write_time() -> None:
+    connection = sqlite3.connect(":memory:")
+    store = AuditLogStore(lambda: connection, close_connection=False)
+
+    store.append("orchestrator.plan_tasks", {"intent_id": "intent-1"}, {"tasks": []})
+    store.append(
+        "orchestrator.transition",
+        {"task": {"intent_id": "intent-1", "task_type": "collect_news"}},
+        {"task": {}},
+    )
+    store.append("worker.company_search", {"intent_id": "intent-2"}, {"status": "success"})
+
+    rows = connection.execute(
+        "SELECT trigger_source, intent_id, task_type FROM audit_log ORDER BY id"
+    ).fetchall()
+    assert rows == [
+        ("orchestrator.plan_tasks", "intent-1", None),
+        ("orchestrator.transition", "intent-1", "collect_news"),
+        ("worker.company_search", "intent-2", "company_search"),
+    ]
+
+
+def test_dedup_stores_identical_payloads_once_and_reads_them_back() -> None:
+    connection = sqlite3.connect(":memory:")
+    store = AuditLogStore(
+        lambda: connection,
+        close_connection=False,
+        dedup_payloads=True,
+        dedup_min_bytes=64,
+    )
+    result = {"status": "success", "result": {"companies": [{"name": f"Acme {i}"} for i in range(20)]}}
+
+    for _ in range(3):
+        store.append("worker.company_search", {"intent_id": "intent-1", "cached": True}, result)
+
+    payload_rows = connection.execute("SELECT ref, size_bytes FROM audit_payloads").fetchall()
+    inline = connection.execute("SELECT input_json, output_result, output_ref FROM audit_log").fetchall()
+    entries = store.list(intent_id="intent-1")
+
+    assert len(payload_rows) == 1
+    assert {row[1] for row in inline} == {""}
+    assert {row[2] for row in inline} == {payload_rows[0][0]}
+    assert json.loads(inline[0][0]) == {"intent_id": "intent-1", "cached": True}
+    assert [json.loads(entry.output_result) for entry in entries] == [result] * 3
+
+
+class FakePostgresConnection:
+    """Records statements; answers the relkind probe and can fail inserts."""
+
+    def __init__(self, *, relkind: str, failing_inserts: int = 0) -> None:
+        self.relkind = relkind
+        self.failing_inserts = failing_inserts
+        self.partition_statements = 0
+        self.inserted: list[Any] = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def execute(self, statement: Any, params: Any = None) -> Any:
+        if isinstance(statement, sql.Composed):
+            self.partition_statements += 1
+        rows = [(self.relkind,)] if "relkind" in str(statement) else []
+        return type("Result", (), {"fetchone": lambda _: rows[0] if rows else None})()
+
+    @contextmanager
+    def cursor(self) -> Iterator[Any]:
+        yield self
+
+    def executemany(self, statement: str, rows: Any) -> None:
+        if self.failing_inserts:
+            self.failing_inserts -= 1
+            raise pg_errors.CheckViolation("no partition of relation \"audit_log\" found for row")
+        self.inserted.extend(rows)
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+    def close(self) -> None:
+        pass
+
+
+def test_partition_bounds_are_utc_timestamps() -> None:
+    assert audit_log_partition_bound(datetime(2026, 10, 1).date()) == "2026-10-01 00:00:00+00:00"
+
+
+def test_unpartitioned_legacy_table_skips_partition_management() -> None:
+    connection = FakePostgresConnection(relkind="r")
+    store = AuditLogStore(lambda: connection)
+
+    store.append("worker.company_search", {"index": 0}, {"status": "success"})
+    store.append("worker.company_search", {"index": 1}, {"status": "success"})
+
+    assert connection.partition_statements == 0
+    assert len(connection.inserted) == 2
+
+
+def test_detached_partition_is_recreated_on_retry() -> None:
+    connection = FakePostgresConnection(relkind="p")
+    store = AuditLogStore(lambda: connection)
+    store.append("worker.company_search", {"index": 0}, {"status": "success"})
+    assert connection.partition_statements == 1
+
+    # The month's partition was detached elsewhere; the cached month is stale.
+    connection.failing_inserts = 1
+    store.append("worker.company_search", {"index": 1}, {"status": "success"})
+
+    assert connection.partition_statements == 2
+    assert connection.rollbacks == 1
+    assert connection.commits == 2
+    assert len(connection.inserted) == 2
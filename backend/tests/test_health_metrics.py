@@ -1,11 +1,16 @@
+from typing import Any
+
+import fakeredis
 import pytest
 
 pytest.importorskip("httpx")
 
 from fastapi.testclient import TestClient
 
+from app import main
 from app.config import settings
 from app.main import app
+from workers.circuit_breaker import CircuitBreaker
 
 
 client = TestClient(app)
@@ -18,8 +23,20 @@ def test_health_check() -> None:
     assert response.json() == {"status": "ok"}
 
 
-def test_metrics() -> None:
+def test_metrics(monkeypatch: Any) -> None:
+    redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    monkeypatch.setattr(main, "get_default_redis_client", lambda: redis_client)
+    CircuitBreaker(redis_client, failure_threshold=1).record_failure("newsapi")
+
     response = client.get("/metrics")
 
     assert response.status_code == 200
-    assert response.json() == {"status": "ok", "service": settings.app_name}
+    body = response.json()
+    assert body["status"] == "ok"
+    assert body["service"] == settings.app_name
+    assert body["circuit_breakers"]["newsapi"]["state"] == "open"
+    assert body["circuit_breakers"]["mailscout"] == {
+        "state": "closed",
+        "failures": 0,
+        "opened_at_ms": None,
+    }
@@ -1,11 +1,25 @@
+import asyncio
 import sqlite3
-from datetime import datetime, timezone
+import threading
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Any
 
 import pytest
 
-from audit_log import AuditLogStore
+from audit_log import AuditLogStore, BufferedAuditLogStore
 from orchestrator import Task, TaskPlanner, TaskStateMachine, TaskStatus
-from orchestrator.deadletter_store import DeadLetterStore
+from orchestrator.deadletter_store import AsyncDeadLetterStore, DeadLetterStore
+from orchestrator.engine import (
+    IntentExecutionEngine,
+    LocalDispatcher,
+    build_stage_graph,
+    companies_as_entities,
+)
+from orchestrator.outbox import OutboxRelay, TaskOutbox
+from orchestrator.state_machine import TaskTransitionConflict
+from orchestrator.task_store import TaskStore
 
 
 def test_task_planning_is_deterministic() -> None:
@@ -121,3 +135,516 @@ def test_deadletter_store_records_retry_exhaustion() -> None:
     assert len(items) == 1
     assert items[0].task.task_id == "task-3"
     assert items[0].reason == "retry_limit_exhausted"
+
+
+def test_async_deadletter_store_falls_back_to_sync_store() -> None:
+    task = Task(
+        task_id="task-4",
+        intent_id="intent-3",
+        task_type="find_contacts",
+        status=TaskStatus.deadletter,
+        retry_count=3,
+        idempotency_key="intent-3:find_contacts:none",
+        payload={},
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    )
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    store = AsyncDeadLetterStore(DeadLetterStore(lambda: connection, close_connection=False))
+
+    async def _scenario() -> list:
+        await store.append(task, "retry_limit_exhausted")
+        return await store.list()
+
+    items = asyncio.run(_scenario())
+
+    assert [item.task.task_id for item in items] == ["task-4"]
+
+
+def _engine(functions: dict[str, Any], connection: sqlite3.Connection) -> IntentExecutionEngine:
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    return IntentExecutionEngine(
+        LocalDispatcher(functions),
+        {task_type: task_type for task_type in functions},
+        planner=TaskPlanner(audit_log_store=audit_log_store),
+        state_machine=TaskStateMachine(
+            audit_log_store=audit_log_store,
+            deadletter_store=DeadLetterStore(lambda: connection, close_connection=False),
+        ),
+        max_retries=1,
+        poll_interval=0.01,
+    )
+
+
+def _success(result: dict[str, Any]) -> dict[str, Any]:
+    return {"status": "success", "result": result}
+
+
+def test_stage_graph_skips_actions_the_intent_omits() -> None:
+    graph = build_stage_graph(["search_companies", "generate_emails", "collect_news"])
+
+    assert graph == {
+        "search_companies": (),
+        "generate_emails": ("search_companies", "collect_news"),
+        "collect_news": ("search_companies",),
+    }
+
+
+def test_engine_runs_independent_stages_in_parallel_per_entity() -> None:
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+    seen: dict[str, list[dict[str, Any]]] = {"generate_emails": []}
+
+    def _timed_stage(result: dict[str, Any]) -> Any:
+        def _run(intent_id: str, entity_id: str | None, payload: dict[str, Any]) -> dict[str, Any]:
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.1)
+            with lock:
+                active["now"] -= 1
+            return _success(result)
+
+        return _run
+
+    def _generate(intent_id: str, entity_id: str | None, payload: dict[str, Any]) -> dict[str, Any]:
+        seen["generate_emails"].append(payload)
+        return _success({"email": f"Hi {entity_id}"})
+
+    functions = {
+        "search_companies": lambda intent_id, entity_id, payload: _success(
+            {"companies": [{"name": "Acme", "domain": "acme.com"}, {"name": "Beta"}]}
+        ),
+        "find_contacts": _timed_stage({"contacts": [{"name": "Taylor"}]}),
+        "collect_news": _timed_stage({"articles": []}),
+        "generate_emails": _generate,
+    }
+    engine = _engine(functions, sqlite3.connect(":memory:"))
+
+    started = time.monotonic()
+    execution = engine.execute("intent-9", list(functions), {"search_companies": {"q": "saas"}})
+
+    # Four 100 ms tasks (2 stages x 2 entities) overlap instead of queueing.
+    assert time.monotonic() - started < 0.3
+    assert active["peak"] == 4
+    assert execution.succeeded
+    assert execution.status_counts() == {"success": 7}
+    assert sorted(entity for task_type, entity in execution.results if task_type == "generate_emails") == [
+        "Acme@acme.com",
+        "Beta",
+    ]
+    acme = next(payload for payload in seen["generate_emails"] if payload["company"]["name"] == "Acme")
+    assert acme["domain"] == "acme.com"
+    assert acme["upstream"]["find_contacts"] == {"contacts": [{"name": "Taylor"}]}
+
+
+def test_companies_with_the_same_name_stay_separate_entities() -> None:
+    result = {
+        "companies": [
+            {"name": "Acme", "domain": "acme.com"},
+            {"name": "Acme", "domain": "acme.io"},
+            {"name": "Beta"},
+            {"name": "Beta"},
+            {"id": 7, "name": "Gamma"},
+        ]
+    }
+
+    assert [entity_id for entity_id, _ in companies_as_entities(result)] == [
+        "Acme@acme.com",
+        "Acme@acme.io",
+        "Beta",
+        "Beta#2",
+        "7",
+    ]
+
+
+def test_engine_retries_then_deadletters_and_skips_dependents() -> None:
+    calls: dict[str, int] = {}
+    responses = iter([{"status": "locked"}])
+
+    def _contacts(intent_id: str, entity_id: str | None, payload: dict[str, Any]) -> dict[str, Any]:
+        calls[entity_id] = calls.get(entity_id, 0) + 1
+        if entity_id == "Beta":
+            raise ConnectionError("provider down")
+        if entity_id == "Acme":
+            return next(responses, _success({"contacts": []}))
+        return _success({"contacts": []})
+
+    functions = {
+        "search_companies": lambda intent_id, entity_id, payload: _success(
+            {"companies": [{"name": "Acme"}, {"name": "Beta"}]}
+        ),
+        "find_contacts": _contacts,
+        "generate_emails": lambda intent_id, entity_id, payload: _success({}),
+    }
+    connection = sqlite3.connect(":memory:")
+    engine = _engine(functions, connection)
+
+    execution = engine.execute("intent-10", list(functions))
+
+    statuses = {
+        (task.task_type, task.payload.get("company", {}).get("name")): task.status
+        for task in execution.tasks
+    }
+    assert statuses == {
+        ("search_companies", None): TaskStatus.success,
+        ("find_contacts", "Acme"): TaskStatus.success,
+        ("find_contacts", "Beta"): TaskStatus.deadletter,
+        ("generate_emails", "Acme"): TaskStatus.success,
+    }
+    # Acme was locked once and asked again; Beta failed, retried once, then gave up.
+    assert calls == {"Acme": 2, "Beta": 2}
+    items = DeadLetterStore(lambda: connection, close_connection=False).list()
+    assert [item.task.task_type for item in items] == ["find_contacts"]
+
+
+def test_planner_writes_outbox_and_audit_in_one_transaction() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    outbox = TaskOutbox(lambda: connection, audit_log_store, close_connection=False)
+    planner = TaskPlanner(
+        id_generator=lambda task_type: f"id-{task_type}",
+        audit_log_store=audit_log_store,
+        outbox=outbox,
+    )
+
+    planner.plan_tasks("intent-11", ["search_companies", "collect_news"], entity_id="acme")
+    with pytest.raises(sqlite3.IntegrityError):
+        # Same task ids: the outbox insert fails and takes the audit row with it.
+        planner.plan_tasks("intent-11", ["search_companies"], entity_id="acme")
+
+    audit_rows = connection.execute("SELECT trigger_source FROM audit_log").fetchall()
+    outbox_rows = connection.execute(
+        "SELECT task_id, entity_id, published_at FROM task_outbox ORDER BY id"
+    ).fetchall()
+    assert audit_rows == [("orchestrator.plan_tasks",)]
+    assert outbox_rows == [("id-search_companies", "acme", None), ("id-collect_news", "acme", None)]
+    assert outbox.pending_count() == 2
+
+
+def test_outbox_relay_publishes_in_batches_and_retries_failures() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    outbox = TaskOutbox(lambda: connection, audit_log_store, close_connection=False)
+    counter = iter(range(100))
+    planner = TaskPlanner(
+        id_generator=lambda task_type: f"id-{next(counter)}",
+        audit_log_store=audit_log_store,
+        outbox=outbox,
+    )
+    planner.plan_tasks(
+        "intent-12",
+        ["search_companies"] * 5,
+        payloads={"search_companies": {"query": "saas"}},
+    )
+    batches: list[list[str]] = []
+    fail = {"next": True}
+
+    def _publish(messages: Any) -> None:
+        if fail["next"]:
+            fail["next"] = False
+            raise ConnectionError("broker down")
+        batches.append([message.task_id for message in messages])
+        assert messages[0].task_kwargs() == {
+            "intent_id": "intent-12",
+            "entity_id": None,
+            "payload": {"query": "saas"},
+        }
+
+    relay = OutboxRelay(lambda: connection, _publish, batch_size=2, close_connection=False)
+
+    with pytest.raises(ConnectionError):
+        relay.relay_batch()
+    assert outbox.pending_count() == 5
+    assert [relay.relay_batch() for _ in range(4)] == [2, 2, 1, 0]
+    assert batches == [["id-0", "id-1"], ["id-2", "id-3"], ["id-4"]]
+    assert outbox.pending_count() == 0
+
+
+def test_outbox_prunes_only_rows_published_before_the_retention() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    now = {"at": datetime(2024, 5, 1, tzinfo=timezone.utc)}
+    outbox = TaskOutbox(
+        lambda: connection,
+        audit_log_store,
+        clock=lambda: now["at"],
+        close_connection=False,
+    )
+    counter = iter(range(100))
+    planner = TaskPlanner(
+        id_generator=lambda task_type: f"id-{next(counter)}",
+        audit_log_store=audit_log_store,
+        outbox=outbox,
+    )
+    planner.plan_tasks("intent-16", ["search_companies"] * 3)
+    relay = OutboxRelay(
+        lambda: connection,
+        lambda messages: None,
+        batch_size=2,
+        clock=lambda: now["at"],
+        close_connection=False,
+    )
+    relay.relay_batch()
+    now["at"] += timedelta(hours=2)
+    relay.relay_batch()
+    planner.plan_tasks("intent-16", ["search_companies"])
+
+    assert outbox.prune_published(max_age=3600) == 2
+    remaining = connection.execute("SELECT task_id FROM task_outbox ORDER BY id").fetchall()
+    assert remaining == [("id-2",), ("id-3",)]
+    assert outbox.pending_count() == 1
+
+
+def test_task_store_compare_and_set_lets_one_writer_win() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    deadletter_store = DeadLetterStore(lambda: connection, close_connection=False)
+    task_store = TaskStore(lambda: connection, close_connection=False)
+    planner = TaskPlanner(
+        id_generator=lambda task_type: f"id-{task_type}",
+        audit_log_store=audit_log_store,
+        task_store=task_store,
+    )
+    worker_a, worker_b = (
+        TaskStateMachine(
+            audit_log_store=audit_log_store,
+            deadletter_store=deadletter_store,
+            task_store=task_store,
+        )
+        for _ in range(2)
+    )
+    (task,) = planner.plan_tasks("intent-13", ["find_contacts"])
+
+    running = worker_a.transition(task, TaskStatus.running)
+    with pytest.raises(TaskTransitionConflict):
+        worker_b.transition(task, TaskStatus.running)
+    failed = worker_a.record_failure(running)
+    retried = worker_a.schedule_retry(failed, max_retries=3)
+
+    stored = task_store.get(task.task_id)
+    assert stored == retried
+    assert stored.status == TaskStatus.retrying
+    assert stored.retry_count == 1
+    transitions = connection.execute(
+        "SELECT COUNT(*) FROM audit_log WHERE trigger_source = 'orchestrator.transition'"
+    ).fetchone()
+    assert transitions == (3,)
+
+
+def test_task_store_counts_statuses_and_queue_depth() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    task_store = TaskStore(lambda: connection, close_connection=False)
+    counter = iter(range(100))
+    planner = TaskPlanner(
+        id_generator=lambda task_type: f"id-{next(counter)}",
+        audit_log_store=audit_log_store,
+        task_store=task_store,
+    )
+    state_machine = TaskStateMachine(
+        audit_log_store=audit_log_store,
+        deadletter_store=DeadLetterStore(lambda: connection, close_connection=False),
+        task_store=task_store,
+    )
+    tasks = planner.plan_tasks("intent-14", ["find_contacts"] * 3 + ["collect_news"] * 2)
+    planner.plan_tasks("intent-15", ["collect_news"])
+    state_machine.transition(tasks[0], TaskStatus.running)
+    state_machine.transition(tasks[3], TaskStatus.running)
+
+    assert task_store.queue_depth() == {"find_contacts": 2, "collect_news": 2}
+    assert task_store.status_counts(intent_id="intent-14") == {
+        "find_contacts": {"queued": 2, "running": 1},
+        "collect_news": {"queued": 1, "running": 1},
+    }
+
+
+def test_outbox_planned_tasks_are_not_stored_as_queued() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    outbox = TaskOutbox(lambda: connection, audit_log_store, close_connection=False)
+    task_store = TaskStore(lambda: connection, close_connection=False)
+
+    # Nothing would ever move them past queued, so queue depth would only grow.
+    with pytest.raises(ValueError):
+        TaskPlanner(audit_log_store=audit_log_store, outbox=outbox, task_store=task_store)
+
+
+def test_transition_rolls_back_state_when_its_audit_row_fails() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    task_store = TaskStore(lambda: connection, close_connection=False)
+    planner = TaskPlanner(audit_log_store=audit_log_store, task_store=task_store)
+    state_machine = TaskStateMachine(
+        audit_log_store=audit_log_store,
+        deadletter_store=DeadLetterStore(lambda: connection, close_connection=False),
+        task_store=task_store,
+    )
+    (task,) = planner.plan_tasks("intent-17", ["find_contacts"])
+
+    def _fail(*args: Any, **kwargs: Any) -> Any:
+        raise sqlite3.OperationalError("disk I/O error")
+
+    audit_log_store.insert_rows = _fail  # type: ignore[method-assign]
+    with pytest.raises(sqlite3.OperationalError):
+        state_machine.transition(task, TaskStatus.running)
+
+    assert task_store.get(task.task_id).status == TaskStatus.queued
+
+
+def test_planned_tasks_are_not_stored_when_their_audit_row_fails() -> None:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    task_store = TaskStore(lambda: connection, close_connection=False)
+    planner = TaskPlanner(audit_log_store=audit_log_store, task_store=task_store)
+    (stored,) = asyncio.run(planner.plan_tasks_async("intent-18", ["find_contacts"]))
+
+    def _fail(*args: Any, **kwargs: Any) -> Any:
+        raise sqlite3.OperationalError("disk I/O error")
+
+    audit_log_store.insert_rows = _fail  # type: ignore[method-assign]
+    with pytest.raises(sqlite3.OperationalError):
+        planner.plan_tasks("intent-19", ["find_contacts"])
+
+    assert task_store.get(stored.task_id).status == TaskStatus.queued
+    assert task_store.queue_depth() == {"find_contacts": 1}
+
+
+def test_bulk_retry_deadletters_in_one_transaction_and_reports_outcomes() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    deadletter_store = DeadLetterStore(lambda: connection, close_connection=False)
+    task_store = TaskStore(lambda: connection, close_connection=False)
+    counter = iter(range(100))
+    planner = TaskPlanner(
+        id_generator=lambda task_type: f"id-{next(counter)}",
+        audit_log_store=audit_log_store,
+        task_store=task_store,
+    )
+    state_machine = TaskStateMachine(
+        audit_log_store=audit_log_store,
+        deadletter_store=deadletter_store,
+        task_store=task_store,
+    )
+    tasks = planner.plan_tasks("intent-16", ["find_contacts"] * 4)
+    running = state_machine.transition_many(tasks[:3], TaskStatus.running)
+    failed = state_machine.transition_many(
+        [outcome.result for outcome in running], TaskStatus.failed
+    )
+    failed_tasks = [outcome.result for outcome in failed]
+    # Another worker already retried the second task.
+    state_machine.schedule_retry(failed_tasks[1], max_retries=3)
+    exhausted = replace(failed_tasks[2], retry_count=3)
+    task_store.compare_and_set(exhausted, TaskStatus.failed)
+
+    outcomes = state_machine.schedule_retry_many(
+        [failed_tasks[0], failed_tasks[1], exhausted, tasks[3]],
+        max_retries=3,
+    )
+
+    assert [outcome.error for outcome in outcomes] == [
+        None,
+        "conflict",
+        None,
+        "invalid_transition",
+    ]
+    assert [outcome.result.status for outcome in outcomes if outcome.applied] == [
+        TaskStatus.retrying,
+        TaskStatus.deadletter,
+    ]
+    assert task_store.status_counts() == {
+        "find_contacts": {"queued": 1, "retrying": 2, "deadletter": 1},
+    }
+    assert [(item.task.task_id, item.reason) for item in deadletter_store.list()] == [
+        (exhausted.task_id, "retry_limit_exhausted"),
+    ]
+    transitions = connection.execute(
+        "SELECT COUNT(*) FROM audit_log WHERE trigger_source = 'orchestrator.transition'"
+    ).fetchone()
+    assert transitions == (3 + 3 + 1 + 2,)
+
+
+def test_bulk_transition_rolls_back_every_write_on_failure() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    deadletter_store = DeadLetterStore(lambda: connection, close_connection=False)
+    task_store = TaskStore(lambda: connection, close_connection=False)
+    planner = TaskPlanner(audit_log_store=audit_log_store, task_store=task_store)
+    state_machine = TaskStateMachine(
+        audit_log_store=audit_log_store,
+        deadletter_store=deadletter_store,
+        task_store=task_store,
+    )
+    tasks = planner.plan_tasks("intent-17", ["collect_news"] * 3)
+
+    def _fail(*_: Any) -> None:
+        raise sqlite3.OperationalError("disk full")
+
+    deadletter_store.insert_rows = _fail  # type: ignore[method-assign]
+    with pytest.raises(sqlite3.OperationalError):
+        state_machine.transition_many(tasks, TaskStatus.running)
+
+    assert task_store.queue_depth() == {"collect_news": 3}
+    transitions = connection.execute(
+        "SELECT COUNT(*) FROM audit_log WHERE trigger_source = 'orchestrator.transition'"
+    ).fetchone()
+    assert transitions == (0,)
+
+
+def test_bulk_retry_without_task_store_commits_audit_and_deadletters_together() -> None:
+    connection = sqlite3.connect(":memory:")
+    audit_log_store = AuditLogStore(lambda: connection, close_connection=False)
+    deadletter_store = DeadLetterStore(lambda: connection, close_connection=False)
+    state_machine = TaskStateMachine(
+        audit_log_store=audit_log_store,
+        deadletter_store=deadletter_store,
+    )
+    tasks = [
+        replace(task, status=TaskStatus.failed, retry_count=retry_count)
+        for task, retry_count in zip(
+            TaskPlanner(audit_log_store=audit_log_store).plan_tasks("intent-18", ["collect_news"] * 2),
+            (0, 3),
+        )
+    ]
+    insert_rows = deadletter_store.insert_rows
+
+    def _fail(*_: Any) -> None:
+        raise sqlite3.OperationalError("disk full")
+
+    deadletter_store.insert_rows = _fail  # type: ignore[method-assign]
+    with pytest.raises(sqlite3.OperationalError):
+        state_machine.schedule_retry_many(tasks, max_retries=3)
+    transitions = "SELECT COUNT(*) FROM audit_log WHERE trigger_source = 'orchestrator.transition'"
+    assert connection.execute(transitions).fetchone() == (0,)
+
+    deadletter_store.insert_rows = insert_rows  # type: ignore[method-assign]
+    outcomes = state_machine.schedule_retry_many(tasks, max_retries=3)
+
+    assert [outcome.result.status for outcome in outcomes] == [
+        TaskStatus.retrying,
+        TaskStatus.deadletter,
+    ]
+    assert connection.execute(transitions).fetchone() == (2,)
+    assert [item.task.task_id for item in deadletter_store.list()] == [tasks[1].task_id]
+
+
+def test_transition_without_task_store_leaves_buffered_audit_rows_to_the_writer() -> None:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    statements: list[str] = []
+    audit_log_store = BufferedAuditLogStore(
+        lambda: connection,
+        close_connection=False,
+        flush_interval=10,
+    )
+    state_machine = TaskStateMachine(
+        audit_log_store=audit_log_store,
+        deadletter_store=DeadLetterStore(lambda: connection, close_connection=False),
+    )
+    task = TaskPlanner(audit_log_store=audit_log_store).build_tasks("intent-20", ["collect_news"])[0]
+    connection.set_trace_callback(statements.append)
+
+    state_machine.transition(task, TaskStatus.running)
+
+    assert statements == []
+    audit_log_store.close(timeout=5)
+    transitions = "SELECT COUNT(*) FROM audit_log WHERE trigger_source = 'orchestrator.transition'"
+    assert connection.execute(transitions).fetchone() == (1,)
@@ -1,10 +1,24 @@
+import asyncio
 import sqlite3
 from datetime import datetime, timezone
 
 from apps.api.services.intent_validator import SalesOpsIntent
-from apps.api.services.orchestrator import map_tasks_to_celery, plan_tasks_for_intent
+from apps.api.services import orchestrator as orchestrator_service
+from apps.api.services.orchestrator import (
+    ACTION_TO_CELERY_TASK,
+    build_execution_engine,
+    execute_intent,
+    map_tasks_to_celery,
+    plan_tasks_for_intent,
+    stream_intent,
+    plan_tasks_for_intent_async,
+)
 from audit_log import AuditLogStore
+from orchestrator.deadletter_store import DeadLetterStore
+from orchestrator.engine import LocalDispatcher
 from orchestrator.planner import TaskPlanner
+from orchestrator.state_machine import TaskStateMachine
+from orchestrator.task_store import TaskStore
 
 
 def test_plan_tasks_for_intent_produces_celery_mapping() -> None:
@@ -39,3 +53,133 @@ def test_plan_tasks_for_intent_produces_celery_mapping() -> None:
             "celery_task": "workers.tasks.news_collector",
         },
     ]
+
+
+def test_plan_tasks_for_intent_async_writes_audit_off_the_loop(monkeypatch) -> None:
+    intent = SalesOpsIntent.model_validate(
+        {
+            "intent_id": "intent-2",
+            "raw_text": "Find SaaS companies in APAC.",
+            "filters": {},
+            "actions": ["search_companies"],
+        }
+    )
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    store = AuditLogStore(lambda: connection, close_connection=False)
+    planner = TaskPlanner(
+        id_generator=lambda task_type: f"id-{task_type}",
+        clock=lambda: datetime(2024, 1, 1, tzinfo=timezone.utc),
+        audit_log_store=store,
+    )
+    service_writes: list[str] = []
+
+    async def _append(trigger_source, input_payload, output_result) -> None:
+        service_writes.append(trigger_source)
+
+    monkeypatch.setattr(orchestrator_service, "append_audit_log_async", _append)
+
+    tasks = asyncio.run(plan_tasks_for_intent_async(intent, planner=planner))
+
+    rows = connection.execute("SELECT trigger_source FROM audit_log").fetchall()
+    assert [task.task_id for task in tasks] == ["id-search_companies"]
+    assert rows == [("orchestrator.plan_tasks",)]
+    assert service_writes == ["orchestrator.plan_intent"]
+
+
+def test_only_the_execution_engine_stores_planned_tasks(monkeypatch) -> None:
+    requested: list[str] = []
+    monkeypatch.setattr(orchestrator_service.settings, "orchestrator_task_store_enabled", True)
+    monkeypatch.setattr(orchestrator_service.settings, "orchestrator_outbox_enabled", False)
+    monkeypatch.setattr(
+        orchestrator_service,
+        "get_default_task_store",
+        lambda: requested.append("task_store") or TaskStore(lambda: sqlite3.connect(":memory:")),
+    )
+
+    # Nothing advances tasks planned for POST /intents past queued.
+    orchestrator_service._default_planner()
+    assert requested == []
+    build_execution_engine(dispatcher=LocalDispatcher({}))
+    assert requested == ["task_store"]
+
+
+def test_execute_intent_dispatches_mapped_celery_tasks(monkeypatch) -> None:
+    intent = SalesOpsIntent.model_validate(
+        {
+            "intent_id": "intent-3",
+            "raw_text": "Find SaaS companies in APAC and their news.",
+            "filters": {"regions": ["APAC"]},
+            "actions": ["collect_news", "search_companies"],
+        }
+    )
+    connection = sqlite3.connect(":memory:")
+    store = AuditLogStore(lambda: connection, close_connection=False)
+    dispatched: list[tuple[str, str | None, dict]] = []
+
+    def _worker(task_name: str):
+        def _run(intent_id: str, entity_id: str | None, payload: dict) -> dict:
+            dispatched.append((task_name, entity_id, payload))
+            if task_name.endswith("company_search"):
+                return {"status": "success", "result": {"companies": [{"name": "Acme"}]}}
+            return {"status": "success", "result": {"articles": []}}
+
+        return _run
+
+    service_writes: list[dict] = []
+    monkeypatch.setattr(
+        orchestrator_service,
+        "append_audit_log",
+        lambda trigger_source, input_payload, output_result: service_writes.append(output_result),
+    )
+    engine = build_execution_engine(
+        dispatcher=LocalDispatcher({name: _worker(name) for name in ACTION_TO_CELERY_TASK.values()}),
+        planner=TaskPlanner(audit_log_store=store),
+        state_machine=TaskStateMachine(
+            audit_log_store=store,
+            deadletter_store=DeadLetterStore(lambda: connection, close_connection=False),
+        ),
+    )
+
+    execution = execute_intent(intent, engine=engine, timeout=5)
+
+    assert [(name, entity) for name, entity, _ in dispatched] == [
+        ("workers.tasks.company_search", None),
+        ("workers.tasks.news_collector", "Acme"),
+    ]
+    assert dispatched[1][2]["filters"] == {"regions": ["APAC"]}
+    assert execution.succeeded
+    assert service_writes[0]["status_counts"] == {"success": 2}
+
+
+def test_stream_intent_starts_producer_and_consumer_groups(monkeypatch) -> None:
+    intent = SalesOpsIntent.model_validate(
+        {
+            "intent_id": "intent-4",
+            "raw_text": "Find SaaS companies and email their buyers.",
+            "filters": {},
+            "actions": ["search_companies", "find_contacts", "generate_emails"],
+        }
+    )
+    sent: list[tuple[str, dict]] = []
+
+    class _Result:
+        def __init__(self, index: int) -> None:
+            self.id = f"celery-{index}"
+
+    def _send_task(name: str, kwargs: dict) -> _Result:
+        sent.append((name, kwargs))
+        return _Result(len(sent))
+
+    monkeypatch.setattr(orchestrator_service.celery_app, "send_task", _send_task)
+    monkeypatch.setattr(orchestrator_service, "append_audit_log", lambda *args: None)
+
+    task_ids = stream_intent(intent, consumers_per_stage=2)
+
+    assert task_ids == [f"celery-{index}" for index in range(1, 6)]
+    assert sent[0][0] == "workers.tasks.company_search_stream"
+    assert [(kwargs["task_type"], kwargs["consumer"]) for _, kwargs in sent[1:]] == [
+        ("contact_finder", "contact_finder-0"),
+        ("contact_finder", "contact_finder-1"),
+        ("email_generator", "email_generator-0"),
+        ("email_generator", "email_generator-1"),
+    ]
@@ -0,0 +1,86 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+import serialization
+from orchestrator import Task, TaskStatus
+
+SAMPLE = {
+    "task": Task(
+        task_id="task-1",
+        intent_id="intent-1",
+        task_type="company_search",
+        status=TaskStatus.running,
+        retry_count=1,
+        idempotency_key="intent-1:company_search:none",
+        payload={"filters": {"regions": ["APAC"]}, "limit": 2.5},
+        created_at=datetime(2024, 1, 1, 8, 30, 15, 123456, tzinfo=timezone.utc),
+    ).to_dict(),
+    "day": date(2024, 1, 2),
+    "name": "Zürich – \"quoted\"\n",
+    "flags": [True, False, None],
+}
+
+
+@pytest.fixture()
+def backend():
+    original = serialization.get_backend()
+    yield serialization.set_backend
+    serialization.set_backend(original)
+
+
+def test_stdlib_backend_encodes_domain_types_canonically(backend) -> None:
+    backend("json")
+
+    encoded = serialization.dumps(SAMPLE)
+
+    assert encoded.startswith('{"day":"2024-01-02","flags":[true,false,null]')
+    assert '"created_at":"2024-01-01T08:30:15.123456+00:00"' in encoded
+    assert '"status":"running"' in encoded
+    assert serialization.loads(encoded)["task"]["status"] == "running"
+
+
+def test_orjson_backend_is_byte_identical(backend) -> None:
+    pytest.importorskip("orjson")
+    backend("json")
+    stdlib = serialization.dumps_bytes(SAMPLE)
+    backend("orjson")
+    fast = serialization.dumps_bytes(SAMPLE)
+
+    assert fast == stdlib
+    assert serialization.loads(fast) == serialization.loads(stdlib.decode("utf-8"))
+
+
+def test_task_round_trips_through_codec() -> None:
+    task = Task.from_dict(serialization.loads(serialization.dumps(SAMPLE["task"])))
+
+    assert task.status == TaskStatus.running
+    assert task.created_at == datetime(2024, 1, 1, 8, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+PARITY_CASES = [
+    {"a": 1e16, "b": 1e-7, "c": 1.25e-5, "d": -2.5e300, "e": 0.0001, "f": 5e-324},
+    {"nan": float("nan"), "inf": float("inf"), "-inf": float("-inf")},
+    {1: "x", 10: "y", 2: "z"},
+    {True: 1, None: 2, 1.5: 3, date(2024, 1, 2): 4, TaskStatus.queued: 5},
+    {"text": "1e+16 and 1e-05 stay as written"},
+    [SAMPLE, (1, 2.5)],
+]
+
+
+@pytest.mark.parametrize("value", PARITY_CASES)
+def test_backends_agree_on_floats_non_finite_and_keys(backend, value) -> None:
+    pytest.importorskip("orjson")
+    backend("json")
+    stdlib = serialization.dumps(value)
+    backend("orjson")
+
+    assert serialization.dumps(value) == stdlib
+
+
+def test_canonical_float_and_key_forms(backend) -> None:
+    backend("json")
+
+    assert serialization.dumps({"a": 1e16, "b": 1e-5}) == '{"a":1e16,"b":0.00001}'
+    assert serialization.dumps([float("nan")]) == "[null]"
+    assert serialization.dumps({10: 1, 2: 2}) == '{"10":1,"2":2}'
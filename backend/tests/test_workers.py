@@ -1,32 +1,36 @@
 from __future__ import annotations
 
+import json
+import os
+import socket
 import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
+import fakeredis
 import pytest
+import redis
 
+import redis_pool
 from audit_log import AuditLogStore
-from workers import tasks
+from redis_pool import InstrumentedConnectionPool
+from orchestrator.engine import companies_as_entities
+from workers import idempotency, providers, rate_limit, result_cache, result_codec, streams, tasks
+from workers.circuit_breaker import CircuitBreaker
+from workers.latency import LatencyHistogram, LatencyHistograms
+from workers.result_cache import LocalResultCache
+from workers.result_store import TaskResultStore, WriteBehindTaskResultStore
 
 
-class InMemoryRedis:
-    def __init__(self) -> None:
-        self.store: dict[str, str] = {}
-
-    def get(self, key: str) -> str | None:
-        return self.store.get(key)
-
-    def set(self, key: str, value: str, nx: bool = False, ex: int | None = None) -> bool:
-        if nx and key in self.store:
-            return False
-        self.store[key] = value
-        return True
+class InMemoryRedis(fakeredis.FakeRedis):
+    """Isolated fakeredis instance; its Lua support runs the idempotency scripts."""
 
-    def delete(self, key: str) -> int:
-        return 1 if self.store.pop(key, None) is not None else 0
-
-    def keys(self) -> list[str]:
-        return list(self.store.keys())
+    def __init__(self) -> None:
+        super().__init__(server=fakeredis.FakeServer(), decode_responses=True)
 
 
 def _attach_redis(monkeypatch: Any, client: InMemoryRedis) -> None:
@@ -41,6 +45,14 @@ def audit_log_store(monkeypatch: Any) -> AuditLogStore:
     return store
 
 
+@pytest.fixture(autouse=True)
+def task_result_store(monkeypatch: Any) -> TaskResultStore:
+    connection = sqlite3.connect(":memory:")
+    store = TaskResultStore(lambda: connection, close_connection=False)
+    monkeypatch.setattr(tasks, "RESULT_STORE", store)
+    return store
+
+
 def test_company_search_task(monkeypatch: Any) -> None:
     client = InMemoryRedis()
     _attach_redis(monkeypatch, client)
@@ -250,3 +262,962 @@ def test_lock_idempotency_returns_locked(monkeypatch: Any) -> None:
 
     assert result["status"] == "locked"
     assert lock_key in client.keys()
+
+
+def test_failed_task_releases_only_its_own_lock(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    lock_key = (
+        "lock:"
+        f"{tasks.build_idempotency_key('intent-10', 'company_search', 'entity-10', None)}"
+    )
+
+    def _handler(payload: dict[str, Any]) -> dict[str, Any]:
+        # Simulate the lease expiring and another worker taking the lock.
+        client.set(lock_key, "other-worker")
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(tasks, "_company_search", _handler)
+
+    with pytest.raises(RuntimeError):
+        tasks.company_search(intent_id="intent-10", entity_id="entity-10", payload={})
+
+    assert client.get(lock_key) == "other-worker"
+
+
+def test_lost_lease_does_not_overwrite_the_new_owners_result(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks.settings, "worker_lock_renew_interval", 0.01)
+    keys = [
+        tasks.build_idempotency_key("intent-12", "company_search", entity_id, None)
+        for entity_id in ("entity-12", "entity-13")
+    ]
+
+    def _handler(payload: dict[str, Any]) -> dict[str, Any]:
+        # The lease expires and another worker takes the lock and finishes.
+        client.set(f"lock:{payload['key']}", "other-worker")
+        client.set(f"result:{payload['key']}", "other-result")
+        time.sleep(0.1)
+        return {"companies": []}
+
+    monkeypatch.setattr(tasks, "_company_search", _handler)
+
+    single = tasks.company_search(
+        intent_id="intent-12", entity_id="entity-12", payload={"key": keys[0]}
+    )
+    batch = tasks.run_idempotent_batch(
+        "company_search",
+        "intent-12",
+        [{"entity_id": "entity-13", "payload": {"key": keys[1]}}],
+        None,
+        _handler,
+    )
+
+    assert [single["status"], batch[0]["status"]] == ["success", "success"]
+    for key in keys:
+        assert client.get(f"result:{key}") == "other-result"
+        assert client.get(f"lock:{key}") == "other-worker"
+
+
+def test_success_stores_result_and_releases_lock(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks, "_company_search", lambda payload: {"companies": []})
+    key = tasks.build_idempotency_key("intent-11", "company_search", "entity-11", None)
+
+    tasks.company_search(intent_id="intent-11", entity_id="entity-11", payload={})
+
+    assert sorted(client.keys()) == [f"delta:{key}", f"result:{key}"]
+    assert 0 < client.ttl(f"result:{key}") <= tasks.result_ttl("company_search")
+
+
+def test_redis_pool_reuses_connections_and_counts_stats() -> None:
+    server = fakeredis.FakeServer()
+    pool = InstrumentedConnectionPool(
+        connection_class=fakeredis.FakeConnection,
+        server=server,
+        max_connections=2,
+        timeout=0.01,
+        decode_responses=True,
+    )
+    client = redis.Redis(connection_pool=pool)
+
+    for index in range(5):
+        client.set(f"key-{index}", "value")
+    held = [pool.get_connection("GET"), pool.get_connection("GET")]
+    with pytest.raises(redis.ConnectionError):
+        pool.get_connection("GET")
+    for connection in held:
+        pool.release(connection)
+
+    stats = pool.stats()
+    assert stats["misses"] == 2
+    assert stats["hits"] == 5
+    assert stats["timeouts"] == 1
+    assert stats["connections"] == 2
+
+
+def test_redis_pool_is_sized_for_worker_threads(monkeypatch: Any) -> None:
+    monkeypatch.setattr(redis_pool.settings, "redis_pool_max_connections", 20)
+    monkeypatch.setattr(redis_pool.settings, "worker_batch_max_workers", 8)
+    monkeypatch.setattr(redis_pool.settings, "worker_provider_pool_size", 32)
+    assert redis_pool.build_redis_pool("redis://localhost:6379/0").max_connections == 57
+
+    monkeypatch.setattr(redis_pool.settings, "redis_pool_max_connections", 100)
+    assert redis_pool.redis_pool_size() == 100
+
+
+def test_worker_redis_client_is_shared_per_process() -> None:
+    redis_pool.reset_default_redis_pool_after_fork()
+    try:
+        assert redis_pool.get_default_redis_client() is redis_pool.get_default_redis_client()
+        redis_pool.reset_default_redis_pool_after_fork()
+        assert redis_pool.default_redis_pool_stats() == {}
+    finally:
+        redis_pool.reset_default_redis_pool_after_fork()
+
+
+def test_duplicate_waits_for_winner_result(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks.settings, "worker_wait_timeout", 5.0)
+    key = tasks.build_idempotency_key("intent-12", "company_search", "entity-12", None)
+    lock_key, result_key = f"lock:{key}", f"result:{key}"
+    client.set(lock_key, "winner")
+    winner_response = {"status": "success", "task_type": "company_search", "result": {}}
+
+    def _finish_winner() -> None:
+        time.sleep(0.05)
+        idempotency.store_result_and_release(
+            client,
+            result_key,
+            lock_key,
+            "winner",
+            json.dumps(winner_response),
+            60,
+        )
+
+    monkeypatch.setattr(tasks, "_company_search", lambda payload: pytest.fail("ran twice"))
+    winner = threading.Thread(target=_finish_winner)
+    winner.start()
+    result = tasks.run_idempotent_task(
+        "company_search",
+        "intent-12",
+        "entity-12",
+        {},
+        None,
+        tasks._company_search,
+        wait_for_result=True,
+    )
+    winner.join()
+
+    assert result == winner_response
+    assert lock_key not in client.keys()
+
+
+def test_duplicate_wait_is_bounded(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks.settings, "worker_wait_for_result", True)
+    monkeypatch.setattr(tasks.settings, "worker_wait_timeout", 0.05)
+    key = tasks.build_idempotency_key("intent-13", "company_search", "entity-13", None)
+    client.set(f"lock:{key}", "winner")
+
+    started = time.monotonic()
+    result = tasks.company_search(intent_id="intent-13", entity_id="entity-13", payload={})
+
+    assert result["status"] == "locked"
+    assert time.monotonic() - started < 1.0
+
+
+def test_lock_lease_renews_until_lost() -> None:
+    client = InMemoryRedis()
+    client.set("lock:lease", "token-1", ex=1)
+
+    with idempotency.LockLease(client, "lock:lease", "token-1", ttl=30, interval=0.01) as lease:
+        time.sleep(0.05)
+        assert client.ttl("lock:lease") > 1
+        client.set("lock:lease", "token-2")
+        time.sleep(0.05)
+
+    assert lease.lost is True
+    assert client.get("lock:lease") == "token-2"
+
+
+def test_reaper_releases_locks_of_dead_processes() -> None:
+    client = InMemoryRedis()
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    dead_token = f"worker-a:{finished.pid}:abc"
+    live_token = f"worker-a:{os.getpid()}:def"
+    client.set("lock:dead", dead_token, ex=30)
+    client.set("lock:live", live_token, ex=30)
+    client.set("lock:remote", f"worker-b:{finished.pid}:ghi", ex=30)
+    client.set("lock:stuck", "token-without-ttl")
+
+    reaped = idempotency.reap_orphaned_locks(client, hostname="worker-a")
+
+    assert reaped == 2
+    assert sorted(client.keys("lock:*")) == ["lock:live", "lock:remote"]
+
+
+def test_lock_token_owner_round_trip() -> None:
+    owner = idempotency.lock_token_owner(idempotency.new_lock_token())
+
+    assert owner == (socket.gethostname(), os.getpid())
+    assert idempotency.lock_token_owner("token-1") is None
+
+
+def test_local_result_cache_evicts_and_invalidates_versions() -> None:
+    now = {"value": 0.0}
+    cache = LocalResultCache(max_entries=2, ttl=10, clock=lambda: now["value"])
+
+    cache.put("a", "v1", "A1")
+    cache.put("b", None, "B")
+    assert cache.get("a", "v1") == "A1"
+    cache.put("c", None, "C")
+
+    assert cache.get("b", None) is None
+    assert cache.get("a", "v2") is None
+    assert cache.get("a", "v1") is None
+    assert cache.get("c", None) == "C"
+    now["value"] = 11.0
+    assert cache.get("c", None) is None
+    assert cache.evictions == 1
+    assert cache.stats.snapshot()["local"] == {"hits": 2, "misses": 4, "hit_ratio": 2 / 6}
+
+
+def test_local_tier_serves_repeat_invocations(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    cache = LocalResultCache()
+    monkeypatch.setattr(result_cache, "get_local_result_cache", lambda: cache)
+    result_cache.get_cache_stats().reset()
+    calls: dict[str, int] = {"count": 0}
+
+    def _handler(payload: dict[str, Any]) -> dict[str, Any]:
+        calls["count"] += 1
+        return {"companies": []}
+
+    monkeypatch.setattr(tasks, "_company_search", _handler)
+    for version in ("v1", "v1", "v2"):
+        tasks.company_search(
+            intent_id="intent-14",
+            entity_id="entity-14",
+            payload={},
+            version=version,
+        )
+    client.flushall()
+    repeat = tasks.company_search(
+        intent_id="intent-14", entity_id="entity-14", payload={}, version="v2"
+    )
+
+    assert repeat["status"] == "success"
+    assert calls["count"] == 2
+    assert cache.stats.snapshot()["local"]["hits"] == 2
+    assert result_cache.get_cache_stats().snapshot()["redis"] == {
+        "hits": 0,
+        "misses": 2,
+        "hit_ratio": 0.0,
+    }
+
+
+@pytest.mark.parametrize("codec", [result_codec.CODEC_ZLIB, result_codec.default_codec()])
+def test_result_codec_round_trip(codec: str) -> None:
+    small = json.dumps({"status": "success"})
+    large = json.dumps({"companies": [{"name": f"Company {i}"} for i in range(200)]})
+
+    assert result_codec.encode_result(small, min_bytes=1024, codec=codec) == small
+    encoded = result_codec.encode_result(large, min_bytes=1024, codec=codec)
+    assert encoded.startswith(f"{codec}:{len(large)}:")
+    assert len(encoded) < len(large)
+    assert result_codec.decode_result(encoded) == large
+    assert result_codec.decode_result(small) == small
+
+
+def test_large_results_are_compressed_with_per_task_ttl(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks.settings, "worker_result_compress_min_bytes", 512)
+    monkeypatch.setattr(tasks.settings, "worker_result_ttls", {"company_search": 3600})
+    companies = [{"name": f"Company {i}", "source": "playwright"} for i in range(100)]
+    monkeypatch.setattr(tasks, "_company_search", lambda payload: {"companies": companies})
+    monkeypatch.setattr(tasks, "score_pipeline_bant", lambda payload: {"score": 1})
+
+    first = tasks.company_search(intent_id="intent-15", entity_id="entity-15", payload={})
+    second = tasks.company_search(intent_id="intent-15", entity_id="entity-15", payload={})
+    tasks.pipeline_bant(intent_id="intent-15", entity_id="entity-15", payload={})
+
+    assert first == second
+    assert first["result"]["companies"] == companies
+    key = tasks.build_idempotency_key("intent-15", "company_search", "entity-15")
+    assert 0 < client.ttl(f"result:{key}") <= 3600
+    stats = result_codec.result_memory_stats(client)
+    assert stats["company_search"]["keys"] == 1
+    assert stats["company_search"]["compressed_keys"] == 1
+    assert stats["company_search"]["compression_ratio"] > 1
+    assert stats["pipeline_bant"]["compressed_keys"] == 0
+    assert stats["pipeline_bant"]["compression_ratio"] == 1.0
+
+
+def test_result_near_expiry_is_refreshed_early_by_one_worker(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    key = tasks.build_idempotency_key("intent-16", "company_search", "entity-16")
+    monkeypatch.setattr(idempotency.random, "random", lambda: 0.5)
+    stale = {"status": "success", "task_type": "company_search", "result": {"companies": []}}
+    client.set(f"result:{key}", json.dumps(stale), px=5_000)
+    # The last computation took far longer than the remaining TTL.
+    client.set(f"delta:{key}", 60_000)
+    calls: dict[str, int] = {"count": 0}
+
+    def _handler(payload: dict[str, Any]) -> dict[str, Any]:
+        calls["count"] += 1
+        # A concurrent duplicate keeps getting the cached value meanwhile.
+        duplicate = tasks.company_search(intent_id="intent-16", entity_id="entity-16", payload={})
+        assert duplicate == stale
+        return {"companies": [{"name": "Fresh"}]}
+
+    monkeypatch.setattr(tasks, "_company_search", _handler)
+
+    refreshed = tasks.company_search(intent_id="intent-16", entity_id="entity-16", payload={})
+
+    assert calls["count"] == 1
+    assert refreshed["result"]["companies"] == [{"name": "Fresh"}]
+    assert client.ttl(f"result:{key}") > 5
+    assert int(client.get(f"delta:{key}")) >= 1
+
+
+def test_failed_early_refresh_serves_stale_result(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    key = tasks.build_idempotency_key("intent-17", "company_search", "entity-17")
+    monkeypatch.setattr(idempotency.random, "random", lambda: 0.5)
+    stale = {"status": "success", "task_type": "company_search", "result": {"companies": []}}
+    client.set(f"result:{key}", json.dumps(stale), px=5_000)
+    client.set(f"delta:{key}", 60_000)
+
+    def _handler(payload: dict[str, Any]) -> dict[str, Any]:
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(tasks, "_company_search", _handler)
+
+    result = tasks.company_search(intent_id="intent-17", entity_id="entity-17", payload={})
+
+    assert result == stale
+    assert f"lock:{key}" not in client.keys()
+
+
+def test_fresh_result_is_not_refreshed(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    key = tasks.build_idempotency_key("intent-18", "company_search", "entity-18")
+    client.set(f"result:{key}", json.dumps({"status": "success"}), ex=86_400)
+    client.set(f"delta:{key}", 50)
+    monkeypatch.setattr(tasks, "_company_search", lambda payload: pytest.fail("refreshed"))
+
+    for _ in range(20):
+        tasks.company_search(intent_id="intent-18", entity_id="entity-18", payload={})
+
+
+def test_durable_tier_survives_redis_flush(
+    monkeypatch: Any,
+    task_result_store: TaskResultStore,
+) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    calls: dict[str, int] = {"count": 0}
+
+    def _handler(payload: dict[str, Any]) -> dict[str, Any]:
+        calls["count"] += 1
+        return {"contacts": [{"name": "Taylor"}]}
+
+    monkeypatch.setattr(tasks, "_contact_finder", _handler)
+    first = tasks.contact_finder(intent_id="intent-19", entity_id="entity-19", payload={})
+    client.flushall()
+    second = tasks.contact_finder(intent_id="intent-19", entity_id="entity-19", payload={})
+    third = tasks.contact_finder(intent_id="intent-19", entity_id="entity-19", payload={})
+
+    key = tasks.build_idempotency_key("intent-19", "contact_finder", "entity-19")
+    assert first == second == third
+    assert calls["count"] == 1
+    assert f"result:{key}" in client.keys()
+    assert f"lock:{key}" not in client.keys()
+    assert json.loads(task_result_store.get(key)) == first
+
+
+def test_non_durable_task_types_skip_the_database(
+    monkeypatch: Any,
+    task_result_store: TaskResultStore,
+) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks, "score_pipeline_bant", lambda payload: {"score": 1})
+
+    tasks.pipeline_bant(intent_id="intent-20", entity_id="entity-20", payload={})
+
+    key = tasks.build_idempotency_key("intent-20", "pipeline_bant", "entity-20")
+    assert task_result_store.get(key) is None
+
+
+def test_durable_rows_older_than_result_ttl_are_recomputed_and_pruned(
+    monkeypatch: Any,
+) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    connection = sqlite3.connect(":memory:")
+    now = {"value": datetime.now(timezone.utc) - timedelta(days=2)}
+    store = TaskResultStore(
+        lambda: connection,
+        clock=lambda: now["value"],
+        close_connection=False,
+    )
+    monkeypatch.setattr(tasks, "RESULT_STORE", store)
+    key = tasks.build_idempotency_key("intent-21", "contact_finder", "entity-21")
+    store.put(key, "contact_finder", json.dumps({"status": "success", "result": "stale"}))
+    store.put("other", "contact_finder", json.dumps({"status": "success"}))
+    now["value"] = datetime.now(timezone.utc)
+    monkeypatch.setattr(tasks, "_contact_finder", lambda payload: {"contacts": []})
+
+    response = tasks.contact_finder(intent_id="intent-21", entity_id="entity-21", payload={})
+
+    assert response["result"] == {"contacts": []}
+    assert tasks.prune_task_results() == {"company_search": 0, "contact_finder": 1}
+    assert store.get("other") is None
+    assert json.loads(store.get(key)) == response
+
+
+def test_write_behind_store_flushes_batches() -> None:
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    store = WriteBehindTaskResultStore(
+        lambda: connection,
+        close_connection=False,
+        flush_interval=0.01,
+    )
+
+    for index in range(5):
+        store.put(f"key-{index}", "company_search", json.dumps({"index": index}))
+    store.put("key-0", "company_search", json.dumps({"index": 99}))
+    store.flush(timeout=5)
+    store.close(timeout=5)
+
+    assert json.loads(store.get("key-0")) == {"index": 99}
+    assert json.loads(store.get("key-4")) == {"index": 4}
+
+
+class CountingRedis(InMemoryRedis):
+    def __init__(self) -> None:
+        super().__init__()
+        self.commands: list[str] = []
+
+    def execute_command(self, *args: Any, **options: Any) -> Any:
+        self.commands.append(str(args[0]))
+        return super().execute_command(*args, **options)
+
+
+def test_batch_task_keeps_per_entity_idempotency(
+    monkeypatch: Any,
+    audit_log_store: AuditLogStore,
+) -> None:
+    client = CountingRedis()
+    _attach_redis(monkeypatch, client)
+    cached_key = tasks.build_idempotency_key("intent-21", "contact_finder", "cached")
+    cached = {"status": "success", "task_type": "contact_finder", "result": {"contacts": []}}
+    client.set(f"result:{cached_key}", json.dumps(cached))
+    locked_key = tasks.build_idempotency_key("intent-21", "contact_finder", "locked")
+    client.set(f"lock:{locked_key}", "another-worker")
+    calls: list[str] = []
+
+    def _handler(payload: dict[str, Any]) -> dict[str, Any]:
+        calls.append(payload["domain"])
+        if payload["domain"] == "broken.com":
+            raise RuntimeError("provider down")
+        return {"contacts": [{"email": f"a@{payload['domain']}"}]}
+
+    monkeypatch.setattr(tasks, "_contact_finder", _handler)
+    items = [
+        {"entity_id": "fresh-1", "payload": {"domain": "one.com"}},
+        {"entity_id": "cached", "payload": {"domain": "cached.com"}},
+        {"entity_id": "locked", "payload": {"domain": "locked.com"}},
+        {"entity_id": "broken", "payload": {"domain": "broken.com"}},
+        {"entity_id": "fresh-1", "payload": {"domain": "one.com"}},
+        {"entity_id": "fresh-2", "payload": {"domain": "two.com"}},
+    ]
+    client.commands.clear()
+
+    results = tasks.contact_finder_batch(intent_id="intent-21", items=items)
+
+    assert [result["status"] for result in results] == [
+        "success",
+        "success",
+        "locked",
+        "failed",
+        "success",
+        "success",
+    ]
+    assert results[1] == cached
+    assert results[0] == results[4]
+    assert sorted(calls) == ["broken.com", "one.com", "two.com"]
+    # Cached results come from one MGET rather than a GET per entity.
+    assert client.commands.count("MGET") == 1
+    assert client.commands.count("GET") == 0
+    broken_key = tasks.build_idempotency_key("intent-21", "contact_finder", "broken")
+    assert f"lock:{broken_key}" not in client.keys()
+    assert client.get(f"lock:{locked_key}") == "another-worker"
+    rows = audit_log_store.list(limit=50)
+    assert len(rows) == 5
+
+    again = tasks.contact_finder_batch(intent_id="intent-21", items=items[:1])
+    assert again[0] == results[0]
+    assert sorted(calls) == ["broken.com", "one.com", "two.com"]
+
+
+def test_company_search_runs_providers_concurrently(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks.settings, "worker_provider_timeouts", {"selenium": 0.05})
+
+    def _slow_playwright(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(0.2)
+        return [{"name": "Acme", "source": "playwright"}]
+
+    def _hung_selenium(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(1.0)
+        return [{"name": "Late", "source": "selenium"}]
+
+    monkeypatch.setattr(tasks, "search_companies_with_playwright", _slow_playwright)
+    monkeypatch.setattr(tasks, "search_companies_with_selenium", _hung_selenium)
+
+    started = time.monotonic()
+    result = tasks.company_search(intent_id="intent-22", entity_id="entity-22", payload={})
+
+    assert time.monotonic() - started < 0.8
+    assert result["result"]["companies"] == [{"name": "Acme", "source": "playwright"}]
+    outcomes = result["result"]["providers"]
+    assert outcomes["playwright"]["status"] == "ok"
+    assert outcomes["playwright"]["count"] == 1
+    assert outcomes["playwright"]["latency_ms"] >= 200
+    assert outcomes["selenium"]["status"] == "timeout"
+
+
+def test_contact_finder_fails_when_every_provider_fails(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+
+    def _down(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        raise ConnectionError("provider down")
+
+    monkeypatch.setattr(tasks, "find_contacts_with_mailscout", _down)
+    monkeypatch.setattr(tasks, "find_contacts_with_theharvester", _down)
+
+    with pytest.raises(providers.ProvidersFailedError) as excinfo:
+        tasks.contact_finder(intent_id="intent-23", entity_id="entity-23", payload={})
+
+    assert excinfo.value.outcomes["mailscout"].status == providers.ERROR
+    key = tasks.build_idempotency_key("intent-23", "contact_finder", "entity-23")
+    assert f"result:{key}" not in client.keys()
+
+
+def test_contact_finder_hedges_a_slow_primary(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(providers, "get_latency_histograms", lambda: LatencyHistograms())
+    monkeypatch.setattr(tasks.settings, "worker_contact_hedging", True)
+    monkeypatch.setattr(tasks.settings, "worker_hedge_default_delay", 0.05)
+
+    def _slow_mailscout(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(0.5)
+        return [{"name": "Taylor", "email": "t@acme.com", "source": "mailscout"}]
+
+    monkeypatch.setattr(tasks, "find_contacts_with_mailscout", _slow_mailscout)
+    monkeypatch.setattr(
+        tasks,
+        "find_contacts_with_theharvester",
+        lambda payload: [{"name": "Jordan", "email": "j@acme.com", "source": "theharvester"}],
+    )
+
+    started = time.monotonic()
+    result = tasks.contact_finder(intent_id="intent-25", entity_id="entity-25", payload={})
+
+    assert time.monotonic() - started < 0.4
+    assert [contact["source"] for contact in result["result"]["contacts"]] == ["theharvester"]
+    outcomes = result["result"]["providers"]
+    assert outcomes["mailscout"]["status"] == "cancelled"
+    assert outcomes["theharvester"]["status"] == "ok"
+
+
+def test_hedge_skips_fallbacks_when_primary_satisfies(monkeypatch: Any) -> None:
+    calls: list[str] = []
+
+    def _provider(name: str, contacts: list[dict[str, Any]]) -> providers.ProviderCall:
+        def _call(payload: dict[str, Any]) -> list[dict[str, Any]]:
+            calls.append(name)
+            return contacts
+
+        return _call
+
+    contacts, outcomes = providers.hedge(
+        {
+            "no_email": _provider("no_email", [{"name": "Casey"}]),
+            "mailscout": _provider("mailscout", [{"name": "Taylor", "email": "t@acme.com"}]),
+            "theharvester": _provider("theharvester", [{"name": "Jordan", "email": "j@a.com"}]),
+        },
+        {},
+        satisfied=lambda items: any(item.get("email") for item in items),
+        histograms=LatencyHistograms(),
+    )
+
+    assert contacts == [{"name": "Taylor", "email": "t@acme.com"}]
+    assert calls == ["no_email", "mailscout"]
+    assert list(outcomes) == ["no_email", "mailscout"]
+
+
+def test_hedge_delay_follows_observed_p95(monkeypatch: Any) -> None:
+    monkeypatch.setattr(tasks.settings, "worker_hedge_min_samples", 20)
+    monkeypatch.setattr(tasks.settings, "worker_hedge_default_delay", 2.0)
+    histograms = LatencyHistograms()
+
+    assert providers.hedge_delay("mailscout", histograms) == 2.0
+    for latency in [10.0] * 95 + [1000.0] * 5:
+        histograms.record("mailscout", latency)
+
+    assert 0.01 <= providers.hedge_delay("mailscout", histograms) < 0.0125
+    assert histograms.get("mailscout").quantile(0.99) >= 1000
+
+
+def test_latency_histogram_decays_old_samples() -> None:
+    histogram = LatencyHistogram(max_samples=100)
+    for _ in range(99):
+        histogram.record(5000.0)
+    for _ in range(150):
+        histogram.record(5.0)
+
+    assert histogram.count < 100
+    assert histogram.quantile(0.5) < 10
+
+
+def test_token_bucket_is_shared_across_clients() -> None:
+    server = fakeredis.FakeServer()
+    worker_a = fakeredis.FakeRedis(server=server, decode_responses=True)
+    worker_b = fakeredis.FakeRedis(server=server, decode_responses=True)
+
+    grants = [
+        rate_limit.try_take(client, "linkedin", rate=1.0, capacity=2)
+        for client in (worker_a, worker_b, worker_a)
+    ]
+
+    assert [granted for granted, _ in grants] == [True, True, False]
+    assert 0 < grants[2][1] <= 1.0
+    with pytest.raises(rate_limit.RateLimitedError):
+        rate_limit.take(worker_b, "linkedin", rate=1.0, capacity=2, max_wait=0.1)
+
+
+def test_rate_limited_provider_is_reported_and_skipped(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    registry = providers.ProviderRegistry(
+        [
+            providers.ProviderSpec("mailscout", "mailscout", providers.Quota(rate=0.01, burst=1)),
+            providers.ProviderSpec("theharvester", "harvester", providers.Quota(rate=100, burst=100)),
+        ]
+    )
+    monkeypatch.setattr(providers, "get_default_registry", lambda: registry)
+    monkeypatch.setattr(tasks.settings, "worker_rate_limit_max_wait", 0.05)
+
+    first = tasks.contact_finder(intent_id="intent-24", entity_id="entity-a", payload={})
+    second = tasks.contact_finder(intent_id="intent-24", entity_id="entity-b", payload={})
+
+    assert first["result"]["providers"]["mailscout"]["status"] == "ok"
+    assert second["result"]["providers"]["mailscout"]["status"] == "rate_limited"
+    assert [contact["source"] for contact in second["result"]["contacts"]] == ["theharvester"]
+
+
+def test_circuit_breaker_opens_skips_and_recovers(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    monkeypatch.setattr(tasks.settings, "worker_breaker_failure_threshold", 2)
+    monkeypatch.setattr(tasks.settings, "worker_breaker_open_seconds", 0.2)
+    calls: dict[str, int] = {"count": 0}
+    state = {"up": False}
+
+    def _newsapi(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        calls["count"] += 1
+        if not state["up"]:
+            raise ConnectionError("newsapi down")
+        return [{"title": "Back", "url": "https://n.example"}]
+
+    monkeypatch.setattr(tasks, "collect_news_with_newsapi", _newsapi)
+
+    for index in range(4):
+        with pytest.raises(providers.ProvidersFailedError) as excinfo:
+            tasks.news_collector(intent_id="intent-25", entity_id=f"e-{index}", payload={})
+    assert calls["count"] == 2
+    assert excinfo.value.outcomes["newsapi"].status == providers.CIRCUIT_OPEN
+    assert tasks.get_circuit_breaker().states(["newsapi"])["newsapi"]["state"] == "open"
+
+    time.sleep(0.25)
+    state["up"] = True
+    result = tasks.news_collector(intent_id="intent-25", entity_id="e-probe", payload={})
+
+    assert result["result"]["providers"]["newsapi"]["status"] == "ok"
+    assert tasks.get_circuit_breaker().states(["newsapi"])["newsapi"] == {
+        "state": "closed",
+        "failures": 0,
+        "opened_at_ms": None,
+    }
+
+
+def test_half_open_breaker_admits_a_single_probe() -> None:
+    client = InMemoryRedis()
+    breaker = CircuitBreaker(client, failure_threshold=1, open_seconds=0, probe_timeout=60)
+
+    assert breaker.record_failure("mailscout") == "open"
+    assert breaker.allow("mailscout") is True
+    assert breaker.allow("mailscout") is False
+    assert breaker.record_failure("mailscout") == "open"
+
+
+def test_cancelled_hedge_releases_half_open_slot(monkeypatch: Any) -> None:
+    monkeypatch.setattr(tasks.settings, "worker_hedge_default_delay", 0.05)
+    breaker = CircuitBreaker(InMemoryRedis(), failure_threshold=1, open_seconds=0, probe_timeout=60)
+    breaker.record_failure("mailscout")
+
+    def _slow_mailscout(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(0.3)
+        return []
+
+    contacts, outcomes = providers.hedge(
+        {
+            "mailscout": _slow_mailscout,
+            "theharvester": lambda payload: [{"name": "Jordan", "email": "j@a.com"}],
+        },
+        {},
+        breaker=breaker,
+        histograms=LatencyHistograms(),
+        timeouts={"mailscout": 5.0, "theharvester": 5.0},
+    )
+
+    assert outcomes["mailscout"].status == providers.CANCELLED
+    assert contacts == [{"name": "Jordan", "email": "j@a.com"}]
+    assert breaker.allow("mailscout") is True
+
+
+def test_rate_limited_probe_releases_half_open_slot(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    registry = providers.ProviderRegistry(
+        [providers.ProviderSpec("mailscout", "mailscout", providers.Quota(rate=0.01, burst=1))]
+    )
+    limiter = providers.ProviderLimiter(client, registry, max_wait=0.05)
+    breaker = CircuitBreaker(client, failure_threshold=1, open_seconds=0, probe_timeout=60)
+    breaker.record_failure("mailscout")
+    limiter.acquire("mailscout")
+
+    with pytest.raises(rate_limit.RateLimitedError):
+        providers._timed("mailscout", lambda payload: [], {}, limiter, breaker, 0.05)
+
+    assert breaker.states(["mailscout"])["mailscout"]["state"] == "half_open"
+    assert breaker.allow("mailscout") is True
+    assert breaker.allow("mailscout") is False
+
+
+def test_contacts_and_emails_stream_before_company_search_finishes(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    monkeypatch.setattr(tasks, "AUDIT_LOG_STORE", AuditLogStore(lambda: connection, close_connection=False))
+    monkeypatch.setattr(tasks.settings, "worker_durable_result_task_types", [])
+    monkeypatch.setattr(tasks.settings, "worker_stream_block_ms", 0)
+    monkeypatch.setattr(tasks.settings, "worker_stream_timeout", 5.0)
+    events: list[tuple[str, str]] = []
+
+    def _selenium(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        time.sleep(0.3)
+        events.append(("selenium", "done"))
+        return [{"name": "Beta", "domain": "beta.io"}]
+
+    def _mailscout(payload: dict[str, Any]) -> list[dict[str, Any]]:
+        events.append(("contacts", payload["company"]))
+        return [{"name": "Taylor", "email": f"taylor@{payload['domain']}"}]
+
+    monkeypatch.setattr(
+        tasks,
+        "search_companies_with_playwright",
+        lambda payload: [{"name": "Acme", "domain": "acme.com"}],
+    )
+    monkeypatch.setattr(tasks, "search_companies_with_selenium", _selenium)
+    monkeypatch.setattr(tasks, "find_contacts_with_mailscout", _mailscout)
+    monkeypatch.setattr(tasks, "find_contacts_with_theharvester", lambda payload: [])
+
+    def _email(payload: dict[str, Any]) -> dict[str, Any]:
+        events.append(("email", payload["email"]))
+        return {"subject": f"Idea for {payload['recipient']}", "channel": "email"}
+
+    monkeypatch.setattr(tasks, "generate_email_with_template", _email)
+    counts: dict[str, dict[str, int]] = {}
+
+    def _consume(task_type: str) -> None:
+        counts[task_type] = tasks.stream_stage(task_type, "intent-30", f"{task_type}-0")
+
+    consumers = [
+        threading.Thread(target=_consume, args=(task_type,))
+        for task_type in ("contact_finder", "email_generator")
+    ]
+    for consumer in consumers:
+        consumer.start()
+    response = tasks.company_search_stream(intent_id="intent-30", payload={})
+    for consumer in consumers:
+        consumer.join(timeout=5)
+
+    assert [company["name"] for company in response["result"]["companies"]] == ["Acme", "Beta"]
+    assert events.index(("email", "taylor@acme.com")) < events.index(("selenium", "done"))
+    assert ("email", "taylor@beta.io") in events
+    assert counts == {"contact_finder": {"success": 2}, "email_generator": {"success": 2}}
+    stream = streams.stream_key("intent-30", "company_search")
+    assert streams.drained(client, stream, "contact_finder")
+
+
+def test_stream_consumers_share_entries_and_claim_abandoned_ones() -> None:
+    client = InMemoryRedis()
+    stream = streams.stream_key("intent-31", "company_search")
+    for name in ("Acme", "Beta", "Gamma"):
+        streams.publish(client, stream, {"entity_id": name, "payload": {}}, ttl=60)
+    streams.close(client, stream, ttl=60)
+    streams.ensure_group(client, stream, "contact_finder")
+    # A consumer that read an entry and died before acknowledging it.
+    client.xreadgroup("contact_finder", "dead", {stream: ">"}, count=1)
+
+    seen: list[str] = []
+    for entry_id, entity in streams.consume(
+        client, stream, "contact_finder", "live", block_ms=0, claim_idle=0
+    ):
+        seen.append(entity["entity_id"])
+        streams.ack(client, stream, "contact_finder", entry_id)
+
+    assert sorted(seen) == ["Acme", "Beta", "Gamma"]
+    assert streams.drained(client, stream, "contact_finder")
+
+
+def test_stream_consumer_waits_for_entries_pending_with_a_dead_consumer() -> None:
+    client = InMemoryRedis()
+    stream = streams.stream_key("intent-32", "company_search")
+    for name in ("Acme", "Beta"):
+        streams.publish(client, stream, {"entity_id": name, "payload": {}}, ttl=60)
+    streams.close(client, stream, ttl=60)
+    streams.ensure_group(client, stream, "contact_finder")
+    client.xreadgroup("contact_finder", "dead", {stream: ">"}, count=1)
+
+    seen: list[str] = []
+    for entry_id, entity in streams.consume(
+        client, stream, "contact_finder", "live", block_ms=0, claim_idle=0.2, timeout=5
+    ):
+        seen.append(entity["entity_id"])
+        streams.ack(client, stream, "contact_finder", entry_id)
+
+    # Returning after Beta would have left Acme with the dead consumer.
+    assert seen == ["Beta", "Acme"]
+    assert streams.drained(client, stream, "contact_finder")
+
+
+def test_stream_stage_retries_then_deadletters_failing_entities(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    monkeypatch.setattr(tasks, "AUDIT_LOG_STORE", AuditLogStore(lambda: connection, close_connection=False))
+    monkeypatch.setattr(tasks.settings, "worker_durable_result_task_types", [])
+    monkeypatch.setattr(tasks.settings, "worker_stream_block_ms", 0)
+    monkeypatch.setattr(tasks.settings, "worker_stream_max_retries", 2)
+    monkeypatch.setattr(tasks.settings, "worker_stream_retry_delay", 0)
+    calls: dict[str, int] = {}
+
+    def _news(payload: dict[str, Any]) -> dict[str, Any]:
+        company = payload["company"]
+        calls[company] = calls.get(company, 0) + 1
+        if company == "Beta" or calls[company] == 1:
+            raise ConnectionError(f"{company} unavailable")
+        return {"articles": []}
+
+    monkeypatch.setitem(tasks._STREAM_HANDLERS, "news_collector", _news)
+    stream = streams.stream_key("intent-33", "company_search")
+    for name in ("Acme", "Beta"):
+        streams.publish(client, stream, {"entity_id": name, "payload": {"company": name}}, ttl=60)
+    streams.close(client, stream, ttl=60)
+
+    counts = tasks.stream_stage("news_collector", "intent-33", "news-0")
+
+    assert counts == {"success": 1, "failed": 1}
+    assert calls == {"Acme": 2, "Beta": 3}
+    assert streams.drained(client, stream, "news_collector")
+    assert streams.deadlettered(client, stream) == [
+        {
+            "entity": {"entity_id": "Beta", "payload": {"company": "Beta"}},
+            "group": "news_collector",
+            "error": "Beta unavailable",
+        }
+    ]
+
+
+def test_stream_stage_leaves_locked_entities_pending_and_skips_cached_republish(
+    monkeypatch: Any,
+) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    monkeypatch.setattr(tasks, "AUDIT_LOG_STORE", AuditLogStore(lambda: connection, close_connection=False))
+    monkeypatch.setattr(tasks.settings, "worker_durable_result_task_types", [])
+    monkeypatch.setattr(tasks.settings, "worker_stream_block_ms", 0)
+    monkeypatch.setattr(tasks.settings, "worker_stream_timeout", 5.0)
+    monkeypatch.setattr(tasks, "stream_claim_idle", lambda: 0.2)
+    calls: list[str] = []
+
+    def _contacts(payload: dict[str, Any]) -> dict[str, Any]:
+        calls.append(payload["company"])
+        return {"contacts": [{"name": "Taylor", "email": "taylor@acme.com"}]}
+
+    monkeypatch.setitem(tasks._STREAM_HANDLERS, "contact_finder", _contacts)
+    key = tasks.build_idempotency_key("intent-34", "contact_finder", "Acme", None)
+    # Another worker is still running Acme; its lock expires shortly.
+    client.set(f"lock:{key}", "other-worker", px=100)
+    source = streams.stream_key("intent-34", "company_search")
+    output = streams.stream_key("intent-34", "contact_finder")
+    streams.publish(client, source, {"entity_id": "Acme", "payload": {"company": "Acme"}}, ttl=60)
+    streams.close(client, source, ttl=60)
+
+    first = tasks.stream_stage("contact_finder", "intent-34", "contacts-0")
+    # A redelivered entry is served from the cache and not passed on again.
+    streams.publish(client, source, {"entity_id": "Acme", "payload": {"company": "Acme"}}, ttl=60)
+    second = tasks.stream_stage("contact_finder", "intent-34", "contacts-1")
+
+    assert first == {"success": 1}
+    assert second == {"success": 1}
+    assert calls == ["Acme"]
+    assert client.xlen(output) == 1
+    assert streams.drained(client, source, "contact_finder")
+
+
+def test_company_search_stream_suffixes_repeated_companies(monkeypatch: Any) -> None:
+    client = InMemoryRedis()
+    _attach_redis(monkeypatch, client)
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    monkeypatch.setattr(tasks, "AUDIT_LOG_STORE", AuditLogStore(lambda: connection, close_connection=False))
+    monkeypatch.setattr(tasks.settings, "worker_durable_result_task_types", [])
+    monkeypatch.setattr(
+        tasks,
+        "search_companies_with_playwright",
+        lambda payload: [{"name": "Acme"}, {"name": "Beta", "domain": "beta.io"}],
+    )
+    monkeypatch.setattr(tasks, "search_companies_with_selenium", lambda payload: [{"name": "Acme"}])
+
+    tasks.company_search(intent_id="intent-36", entity_id=None, payload={})
+
+    response = tasks.company_search_stream(intent_id="intent-35", payload={})
+    # A cached search is replayed with the same entity ids.
+    tasks.company_search_stream(intent_id="intent-36", payload={})
+
+    expected = sorted(entity_id for entity_id, _ in companies_as_entities(response["result"]))
+    assert expected == ["Acme", "Acme#2", "Beta@beta.io"]
+    for intent_id in ("intent-35", "intent-36"):
+        entries = client.xrange(streams.stream_key(intent_id, "company_search"))
+        published = [json.loads(fields["entity"])["entity_id"] for _, fields in entries]
+        assert sorted(published) == expected
@@ -1,6 +1,21 @@
 from celery import Celery
+from celery.signals import (
+    worker_process_init,
+    worker_process_shutdown,
+    worker_ready,
+    worker_shutdown,
+)
 
 from app.config import settings
+from audit_log import shutdown_default_audit_log_store
+from database import close_default_pool, reset_default_pool_after_fork
+from redis_pool import (
+    close_default_redis_pool,
+    get_default_redis_client,
+    reset_default_redis_pool_after_fork,
+)
+from workers.idempotency import reap_orphaned_locks
+from workers.result_store import shutdown_default_task_result_store
 
 celery_app = Celery(
     "salesops",
@@ -10,10 +25,48 @@ celery_app = Celery(
 
 celery_app.conf.update(
     task_routes={"workers.tasks.*": {"queue": "default"}},
+    # Lets the orchestrator see when a dispatched task actually starts.
+    task_track_started=True,
     beat_schedule={
         "heartbeat": {
             "task": "workers.tasks.heartbeat",
             "schedule": 60.0,
-        }
+        },
+        "reap-orphaned-locks": {
+            "task": "workers.tasks.reap_orphaned_locks",
+            "schedule": float(settings.worker_lock_ttl),
+        },
+        "prune-task-results": {
+            "task": "workers.tasks.prune_task_results",
+            "schedule": settings.worker_durable_result_prune_interval,
+        },
     },
 )
+
+if settings.orchestrator_outbox_enabled:
+    celery_app.conf.beat_schedule["prune-task-outbox"] = {
+        "task": "workers.tasks.prune_task_outbox",
+        "schedule": settings.orchestrator_outbox_prune_interval,
+    }
+
+
+@worker_process_init.connect
+def _reset_pools_after_fork(**_: object) -> None:
+    reset_default_pool_after_fork()
+    reset_default_redis_pool_after_fork()
+    get_default_redis_client()
+
+
+@worker_ready.connect
+def _reap_orphaned_locks(**_: object) -> None:
+    # Leases left behind by processes of a previous run on this host.
+    reap_orphaned_locks(get_default_redis_client())
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _flush_audit_log_and_close_pool(**_: object) -> None:
+    shutdown_default_audit_log_store()
+    shutdown_default_task_result_store()
+    close_default_pool()
+    close_default_redis_pool()
@@ -0,0 +1,160 @@
+"""Per-provider circuit breakers with their state shared in Redis.
+
+A breaker is ``closed`` while its provider works. After
+``failure_threshold`` consecutive failures it turns ``open`` and every worker
+skips the provider without calling it. Once ``open_seconds`` have passed the
+breaker goes ``half_open`` and lets a single probe call through: success
+closes it, failure opens it again. A probe that never reports back (its
+worker died) is given up after ``probe_timeout`` seconds, and a probe that
+never reached the provider (it was rate limited) hands its slot back at once.
+
+State lives in the hash ``breaker:<provider>`` and every transition is a Lua
+script timed by the Redis server clock, so all workers agree on it.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any
+
+from app.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_NOW_MS = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+"""
+
+# KEYS: breaker key. ARGV: open milliseconds, probe timeout milliseconds.
+# Returns 1 when the call may proceed.
+_ALLOW = _NOW_MS + """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'closed' then
+    return 1
+end
+if state == 'open' then
+    local opened_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0')
+    if now_ms - opened_at < tonumber(ARGV[1]) then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'state', 'half_open', 'probe_until', now_ms + tonumber(ARGV[2]))
+    return 1
+end
+local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until') or '0')
+if now_ms >= probe_until then
+    redis.call('HSET', KEYS[1], 'probe_until', now_ms + tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+# KEYS: breaker key.
+_SUCCESS = """
+local state = redis.call('HGET', KEYS[1], 'state')
+local failures = tonumber(redis.call('HGET', KEYS[1], 'failures') or '0')
+if state == 'half_open' or failures > 0 then
+    redis.call('HSET', KEYS[1], 'state', 'closed', 'failures', 0)
+    redis.call('HDEL', KEYS[1], 'opened_at', 'probe_until')
+end
+return 1
+"""
+
+# KEYS: breaker key.
+_RELEASE_PROBE = """
+if redis.call('HGET', KEYS[1], 'state') == 'half_open' then
+    redis.call('HDEL', KEYS[1], 'probe_until')
+end
+return 1
+"""
+
+# KEYS: breaker key. ARGV: failure threshold.
+# Returns the resulting state.
+_FAILURE = _NOW_MS + """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'open' then
+    return state
+end
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if state == 'half_open' or failures >= tonumber(ARGV[1]) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now_ms)
+    redis.call('HDEL', KEYS[1], 'probe_until')
+    return 'open'
+end
+redis.call('HSET', KEYS[1], 'state', 'closed')
+return 'closed'
+"""
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, provider: str) -> None:
+        super().__init__(f"Circuit breaker for {provider} is open")
+        self.provider = provider
+
+
+def breaker_key(provider: str) -> str:
+    return f"breaker:{provider}"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        client: Any,
+        *,
+        failure_threshold: int = 5,
+        open_seconds: float = 30.0,
+        probe_timeout: float = 60.0,
+    ) -> None:
+        self._client = client
+        self._failure_threshold = failure_threshold
+        self._open_ms = int(open_seconds * 1000)
+        self._probe_timeout_ms = int(probe_timeout * 1000)
+
+    def allow(self, provider: str) -> bool:
+        script = self._client.register_script(_ALLOW)
+        allowed = script(
+            keys=[breaker_key(provider)],
+            args=[self._open_ms, self._probe_timeout_ms],
+        )
+        return bool(int(allowed))
+
+    def record_success(self, provider: str) -> None:
+        script = self._client.register_script(_SUCCESS)
+        script(keys=[breaker_key(provider)])
+
+    def release_probe(self, provider: str) -> None:
+        """Let the next caller probe a half-open provider; the admitted call never ran."""
+        script = self._client.register_script(_RELEASE_PROBE)
+        script(keys=[breaker_key(provider)])
+
+    def record_failure(self, provider: str) -> str:
+        script = self._client.register_script(_FAILURE)
+        state = script(keys=[breaker_key(provider)], args=[self._failure_threshold])
+        return state.decode("utf-8") if isinstance(state, bytes) else state
+
+    def states(self, providers: Iterable[str]) -> dict[str, dict[str, Any]]:
+        """Return ``{provider: {"state", "failures", "opened_at_ms"}}``."""
+        names = list(providers)
+        pipeline = self._client.pipeline(transaction=False)
+        for name in names:
+            pipeline.hmget(breaker_key(name), "state", "failures", "opened_at")
+        states: dict[str, dict[str, Any]] = {}
+        for name, (state, failures, opened_at) in zip(names, pipeline.execute()):
+            if isinstance(state, bytes):
+                state = state.decode("utf-8")
+            states[name] = {
+                "state": state or CLOSED,
+                "failures": int(failures or 0),
+                "opened_at_ms": int(opened_at) if opened_at else None,
+            }
+        return states
+
+
+def get_default_circuit_breaker(client: Any) -> CircuitBreaker:
+    return CircuitBreaker(
+        client,
+        failure_threshold=settings.worker_breaker_failure_threshold,
+        open_seconds=settings.worker_breaker_open_seconds,
+        probe_timeout=settings.worker_breaker_probe_timeout,
+    )
@@ -0,0 +1,356 @@
+"""Server-side Redis scripts for the idempotent task protocol.
+
+Each helper is a single round trip. The scripts touch both the result and
+the lock key of one idempotency key, so they assume a single Redis node (or
+keys that hash to the same cluster slot).
+
+Storing a result or releasing a lock also publishes on the key's completion
+channel so duplicates blocked in ``wait_for_result`` wake up immediately:
+the message is the stored result, or an empty string when the lock was
+released without one.
+
+Locks are short leases: the value is a token naming the owning host and
+process, ``LockLease`` renews the TTL from a background thread while the
+handler runs, and ``reap_orphaned_locks`` frees leases whose owning process
+on this host has died, so a crashed task can be retried within seconds.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections.abc import Sequence
+from typing import Any
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# (result key, lock key, delta key, result, result TTL seconds, delta ms)
+StoredResult = tuple[str, str, str, str, int, int]
+
+# KEYS: result key, lock key[, delta key]. ARGV: lock token, lock TTL seconds,
+# beta, random number in (0, 1].
+# Returns {"cached", <result>} | {"refresh", <result>} | {"acquired"} | {"locked"}.
+#
+# With a delta key and beta > 0 a cached result is refreshed early, XFetch
+# style: the caller takes the lock and recomputes when
+# ``delta * beta * -ln(rand) >= remaining TTL``, where delta is how long the
+# last computation took. Only the caller that wins the lock refreshes; all
+# others keep getting the cached value.
+_ACQUIRE_OR_FETCH = """
+local cached = redis.call('GET', KEYS[1])
+if cached then
+    local beta = tonumber(ARGV[3])
+    if KEYS[3] and beta > 0 then
+        local delta = tonumber(redis.call('GET', KEYS[3]) or '0')
+        local ttl = redis.call('PTTL', KEYS[1])
+        if delta > 0 and ttl > 0 and delta * beta * -math.log(tonumber(ARGV[4])) >= ttl then
+            if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'EX', tonumber(ARGV[2])) then
+                return {'refresh', cached}
+            end
+        end
+    end
+    return {'cached', cached}
+end
+if redis.call('SET', KEYS[2], ARGV[1], 'NX', 'EX', tonumber(ARGV[2])) then
+    return {'acquired'}
+end
+return {'locked'}
+"""
+
+# KEYS: result key, lock key[, delta key]. ARGV: result, result TTL seconds,
+# lock token, channel, computation time in milliseconds.
+_STORE_AND_RELEASE = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+if KEYS[3] then
+    redis.call('SET', KEYS[3], ARGV[5], 'EX', tonumber(ARGV[2]))
+end
+if redis.call('GET', KEYS[2]) == ARGV[3] then
+    redis.call('DEL', KEYS[2])
+end
+redis.call('PUBLISH', ARGV[4], ARGV[1])
+return 1
+"""
+
+# KEYS: lock key. ARGV: lock token, channel.
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('PUBLISH', ARGV[2], '')
+    return 1
+end
+return 0
+"""
+
+# KEYS: lock key. ARGV: lock token, lock TTL seconds.
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+end
+return 0
+"""
+
+CACHED = "cached"
+REFRESH = "refresh"
+ACQUIRED = "acquired"
+LOCKED = "locked"
+
+
+def new_lock_token() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex}"
+
+
+def lock_token_owner(token: str) -> tuple[str, int] | None:
+    """Return ``(hostname, pid)`` for tokens made by ``new_lock_token``."""
+    parts = token.rsplit(":", 2)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None
+    return parts[0], int(parts[1])
+
+
+def completion_channel(lock_key: str) -> str:
+    return f"done:{lock_key}"
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def acquire_or_fetch(
+    client: Any,
+    result_key: str,
+    lock_key: str,
+    token: str,
+    lock_ttl: int,
+    *,
+    delta_key: str | None = None,
+    beta: float = 0.0,
+) -> tuple[str, str | None]:
+    """Return ``(CACHED | REFRESH, result)``, ``(ACQUIRED, None)`` or ``(LOCKED, None)``.
+
+    ``REFRESH`` means the lock was taken to recompute a result that is close
+    to expiry; the stale result is returned so the caller can fall back to it.
+    """
+    keys = [result_key, lock_key] if delta_key is None else [result_key, lock_key, delta_key]
+    # 1 - random() lies in (0, 1], so the logarithm is always defined.
+    script = client.register_script(_ACQUIRE_OR_FETCH)
+    reply = script(keys=keys, args=[token, lock_ttl, beta, 1.0 - random.random()])
+    outcome = _text(reply[0])
+    if outcome in (CACHED, REFRESH):
+        return outcome, _text(reply[1])
+    return outcome, None
+
+
+def store_result_and_release(
+    client: Any,
+    result_key: str,
+    lock_key: str,
+    token: str,
+    result: str,
+    result_ttl: int,
+    *,
+    delta_key: str | None = None,
+    delta_ms: int = 0,
+) -> None:
+    keys = [result_key, lock_key] if delta_key is None else [result_key, lock_key, delta_key]
+    script = client.register_script(_STORE_AND_RELEASE)
+    script(
+        keys=keys,
+        args=[result, result_ttl, token, completion_channel(lock_key), delta_ms],
+    )
+
+
+def acquire_or_fetch_many(
+    client: Any,
+    keys: Sequence[tuple[str, str]],
+    token: str,
+    lock_ttl: int,
+) -> list[tuple[str, str | None]]:
+    """Pipelined ``acquire_or_fetch`` for ``(result_key, lock_key)`` pairs.
+
+    One round trip for the whole batch; each key is still checked and locked
+    atomically by the script, so per-key semantics are unchanged.
+    """
+    if not keys:
+        return []
+    script = client.register_script(_ACQUIRE_OR_FETCH)
+    pipeline = client.pipeline(transaction=False)
+    for result_key, lock_key in keys:
+        script(keys=[result_key, lock_key], args=[token, lock_ttl, 0, 1], client=pipeline)
+    outcomes: list[tuple[str, str | None]] = []
+    for reply in pipeline.execute():
+        outcome = _text(reply[0])
+        outcomes.append((outcome, _text(reply[1]) if outcome == CACHED else None))
+    return outcomes
+
+
+def store_results_and_release_many(
+    client: Any,
+    results: Sequence[StoredResult],
+    token: str,
+) -> None:
+    """Pipelined ``store_result_and_release`` for a batch holding ``token``."""
+    if not results:
+        return
+    script = client.register_script(_STORE_AND_RELEASE)
+    pipeline = client.pipeline(transaction=False)
+    for result_key, lock_key, delta_key, result, result_ttl, delta_ms in results:
+        script(
+            keys=[result_key, lock_key, delta_key],
+            args=[result, result_ttl, token, completion_channel(lock_key), delta_ms],
+            client=pipeline,
+        )
+    pipeline.execute()
+
+
+def release_locks(client: Any, lock_keys: Sequence[str], token: str) -> None:
+    if not lock_keys:
+        return
+    script = client.register_script(_RELEASE)
+    pipeline = client.pipeline(transaction=False)
+    for lock_key in lock_keys:
+        script(keys=[lock_key], args=[token, completion_channel(lock_key)], client=pipeline)
+    pipeline.execute()
+
+
+def release_lock(client: Any, lock_key: str, token: str) -> bool:
+    """Delete ``lock_key`` only if it still holds ``token``."""
+    script = client.register_script(_RELEASE)
+    return bool(script(keys=[lock_key], args=[token, completion_channel(lock_key)]))
+
+
+def wait_for_result(
+    client: Any,
+    result_key: str,
+    lock_key: str,
+    timeout: float,
+) -> str | None:
+    """Block until the lock holder stores a result, for at most ``timeout`` seconds.
+
+    Returns the result, or ``None`` when the wait timed out or the holder
+    released the lock without storing one (the caller may then retry).
+    """
+    deadline = time.monotonic() + timeout
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(completion_channel(lock_key))
+        # The holder may have finished before the subscription was active.
+        pipeline = client.pipeline(transaction=False)
+        pipeline.get(result_key)
+        pipeline.exists(lock_key)
+        existing, locked = pipeline.execute()
+        if existing is not None:
+            return _text(existing)
+        if not locked:
+            return None
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = pubsub.get_message(timeout=remaining)
+            if message is None:
+                continue
+            data = _text(message["data"])
+            return data or None
+        return None
+    finally:
+        pubsub.close()
+
+
+def renew_lock(client: Any, lock_key: str, token: str, ttl: int) -> bool:
+    """Reset the TTL of ``lock_key`` if it still holds ``token``."""
+    script = client.register_script(_RENEW)
+    return bool(script(keys=[lock_key], args=[token, ttl]))
+
+
+class LockLease:
+    """Context manager renewing a lock every ``interval`` seconds in a thread.
+
+    ``lost`` turns true once a renewal finds the lock expired or taken by
+    another owner; renewal then stops and the caller decides what to do.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        lock_key: str,
+        token: str,
+        ttl: int,
+        interval: float | None = None,
+    ) -> None:
+        self._client = client
+        self._lock_key = lock_key
+        self._token = token
+        self._ttl = ttl
+        self._interval = interval if interval is not None else ttl / 3
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.lost = False
+
+    def __enter__(self) -> LockLease:
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"lease:{self._lock_key}",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                renewed = renew_lock(self._client, self._lock_key, self._token, self._ttl)
+            except Exception:  # noqa: BLE001
+                # A transient Redis error is retried on the next tick; the
+                # TTL leaves room for a couple of missed renewals.
+                logger.warning("Failed to renew lease on %s", self._lock_key, exc_info=True)
+                continue
+            if not renewed:
+                self.lost = True
+                logger.warning("Lost lease on %s", self._lock_key)
+                return
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def reap_orphaned_locks(
+    client: Any,
+    *,
+    pattern: str = "lock:*",
+    hostname: str | None = None,
+) -> int:
+    """Release locks whose owner process on ``hostname`` is gone.
+
+    Only owners on this host can be checked; leases held elsewhere expire on
+    their own short TTL. Locks without any TTL can never expire and are
+    released regardless of owner. Returns the number of locks released.
+    """
+    hostname = hostname or socket.gethostname()
+    reaped = 0
+    for lock_key in client.scan_iter(match=pattern, count=500):
+        lock_key = _text(lock_key)
+        token = client.get(lock_key)
+        if token is None:
+            continue
+        token = _text(token)
+        owner = lock_token_owner(token)
+        orphaned = client.ttl(lock_key) == -1
+        if owner is not None and owner[0] == hostname and owner[1] != os.getpid():
+            orphaned = orphaned or not _process_alive(owner[1])
+        if orphaned and release_lock(client, lock_key, token):
+            logger.info("Reaped orphaned lock %s held by %s", lock_key, token)
+            reaped += 1
+    return reaped
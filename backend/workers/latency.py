@@ -0,0 +1,86 @@
+"""Per-provider latency histograms, kept in each worker process.
+
+Buckets grow geometrically from 1 ms to about two minutes, so a quantile is
+accurate to within one bucket (25%) at a fixed, small memory cost. Counts
+are halved once ``max_samples`` is reached so the histogram follows recent
+behaviour instead of averaging over the life of the process.
+"""
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+
+_GROWTH = 1.25
+_BOUNDS: list[float] = []
+_bound = 1.0
+while _bound < 120_000:
+    _BOUNDS.append(_bound)
+    _bound *= _GROWTH
+_BOUNDS.append(float("inf"))
+
+
+class LatencyHistogram:
+    def __init__(self, *, max_samples: int = 10_000) -> None:
+        self._counts = [0] * len(_BOUNDS)
+        self._total = 0
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return self._total
+
+    def record(self, latency_ms: float) -> None:
+        with self._lock:
+            self._counts[bisect_left(_BOUNDS, latency_ms)] += 1
+            self._total += 1
+            if self._total >= self._max_samples:
+                self._counts = [count // 2 for count in self._counts]
+                self._total = sum(self._counts)
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound (ms) of the bucket holding quantile ``q``; ``None`` if empty."""
+        with self._lock:
+            if not self._total:
+                return None
+            threshold = q * self._total
+            seen = 0
+            for bound, count in zip(_BOUNDS, self._counts):
+                seen += count
+                if seen >= threshold and count:
+                    return bound
+            return _BOUNDS[-2]
+
+
+class LatencyHistograms:
+    def __init__(self) -> None:
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> LatencyHistogram:
+        histogram = self._histograms.get(provider)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(provider, LatencyHistogram())
+        return histogram
+
+    def record(self, provider: str, latency_ms: float) -> None:
+        self.get(provider).record(latency_ms)
+
+    def snapshot(self) -> dict[str, dict[str, float | None]]:
+        return {
+            provider: {
+                "count": histogram.count,
+                "p50_ms": histogram.quantile(0.5),
+                "p95_ms": histogram.quantile(0.95),
+                "p99_ms": histogram.quantile(0.99),
+            }
+            for provider, histogram in list(self._histograms.items())
+        }
+
+
+_DEFAULT_HISTOGRAMS = LatencyHistograms()
+
+
+def get_latency_histograms() -> LatencyHistograms:
+    return _DEFAULT_HISTOGRAMS
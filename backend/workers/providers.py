@@ -0,0 +1,444 @@
+"""Concurrent calls to external data providers.
+
+Task handlers that merge several providers (Playwright and Selenium for
+company search, MailScout and theHarvester for contacts) call them through
+``fan_out`` so the task takes as long as the slowest provider rather than
+the sum of all of them. Each provider has its own timeout; results of the
+providers that answered in time are kept and every provider's outcome and
+latency is reported alongside them.
+
+Every provider is declared in a ``ProviderRegistry`` with the quota of the
+rate-limit bucket it draws from (Playwright and Selenium both scrape
+LinkedIn, so they share one). ``ProviderLimiter`` enforces those quotas with
+the Redis token buckets in ``workers.rate_limit``, so adding workers never
+pushes a provider past its ceiling. A ``CircuitBreaker`` per provider lets
+tasks skip a provider that is down instead of waiting out its timeout.
+
+Providers that form an ordered fallback chain (LinkedIn, MailScout,
+theHarvester for contacts) can instead be called through ``hedge``: the next
+provider is only started once the current one runs past its usual latency,
+and the first satisfying answer wins. Every call's latency is recorded in the
+per-process histograms of ``workers.latency``, which set that threshold.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any
+
+from app.config import settings
+from workers import rate_limit
+from workers.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    get_default_circuit_breaker,
+)
+from workers.latency import LatencyHistograms, get_latency_histograms
+
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+RATE_LIMITED = "rate_limited"
+CIRCUIT_OPEN = "circuit_open"
+CANCELLED = "cancelled"
+
+ProviderCall = Callable[[dict[str, Any]], list[dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class Quota:
+    """Fleet-wide budget: ``rate`` requests per second, bursts up to ``burst``."""
+
+    rate: float
+    burst: int
+
+
+@dataclass(frozen=True)
+class ProviderSpec:
+    name: str
+    bucket: str
+    quota: Quota
+
+
+class ProviderRegistry:
+    def __init__(self, specs: Iterable[ProviderSpec] = ()) -> None:
+        self._specs: dict[str, ProviderSpec] = {}
+        for spec in specs:
+            self.register(spec)
+
+    def register(self, spec: ProviderSpec) -> None:
+        self._specs[spec.name] = spec
+
+    def get(self, name: str) -> ProviderSpec | None:
+        return self._specs.get(name)
+
+    def __iter__(self) -> Iterator[ProviderSpec]:
+        return iter(self._specs.values())
+
+
+DEFAULT_PROVIDERS = (
+    ProviderSpec("playwright", "linkedin", Quota(rate=0.5, burst=5)),
+    ProviderSpec("selenium", "linkedin", Quota(rate=0.5, burst=5)),
+    ProviderSpec("mailscout", "mailscout", Quota(rate=2.0, burst=10)),
+    ProviderSpec("theharvester", "theharvester", Quota(rate=1.0, burst=5)),
+    ProviderSpec("newsapi", "newsapi", Quota(rate=1.0, burst=10)),
+)
+
+_DEFAULT_REGISTRY: ProviderRegistry | None = None
+
+
+def get_default_registry() -> ProviderRegistry:
+    """Return ``DEFAULT_PROVIDERS`` with quotas overridden per bucket from
+    ``settings.worker_provider_quotas`` (e.g. ``{"linkedin": {"rate": 1}}``)."""
+    global _DEFAULT_REGISTRY
+    if _DEFAULT_REGISTRY is None:
+        registry = ProviderRegistry()
+        for spec in DEFAULT_PROVIDERS:
+            override = settings.worker_provider_quotas.get(spec.bucket, {})
+            quota = Quota(
+                rate=float(override.get("rate", spec.quota.rate)),
+                burst=int(override.get("burst", spec.quota.burst)),
+            )
+            registry.register(ProviderSpec(spec.name, spec.bucket, quota))
+        _DEFAULT_REGISTRY = registry
+    return _DEFAULT_REGISTRY
+
+
+def breaker_states(client: Any) -> dict[str, dict[str, Any]]:
+    """Circuit breaker state of every registered provider."""
+    breaker = get_default_circuit_breaker(client)
+    return breaker.states(spec.name for spec in get_default_registry())
+
+
+class ProviderLimiter:
+    """Takes a token from a provider's shared bucket before each call."""
+
+    def __init__(
+        self,
+        client: Any,
+        registry: ProviderRegistry,
+        *,
+        max_wait: float = 30.0,
+    ) -> None:
+        self._client = client
+        self._registry = registry
+        self._max_wait = max_wait
+
+    def acquire(self, provider: str, *, max_wait: float | None = None) -> float:
+        """Wait for a token; return seconds waited. Unregistered providers are unlimited.
+
+        ``max_wait`` can only shorten the limiter's own maximum wait.
+        """
+        spec = self._registry.get(provider)
+        if spec is None:
+            return 0.0
+        return rate_limit.take(
+            self._client,
+            spec.bucket,
+            rate=spec.quota.rate,
+            capacity=spec.quota.burst,
+            max_wait=self._max_wait if max_wait is None else min(max_wait, self._max_wait),
+        )
+
+
+@dataclass(frozen=True)
+class ProviderOutcome:
+    provider: str
+    status: str
+    latency_ms: float
+    count: int = 0
+    error: str | None = None
+    wait_ms: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {
+            "status": self.status,
+            "latency_ms": round(self.latency_ms, 1),
+            "count": self.count,
+        }
+        if self.wait_ms:
+            data["wait_ms"] = round(self.wait_ms, 1)
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class ProvidersFailedError(RuntimeError):
+    """Raised when no provider of a fan-out produced a result."""
+
+    def __init__(self, outcomes: Mapping[str, ProviderOutcome]) -> None:
+        details = ", ".join(
+            f"{name}: {outcome.error or outcome.status}" for name, outcome in outcomes.items()
+        )
+        super().__init__(f"All providers failed ({details})")
+        self.outcomes = dict(outcomes)
+
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_PID: int | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_provider_executor() -> ThreadPoolExecutor:
+    """Return the per-process pool provider calls run on.
+
+    A provider that exceeds its timeout cannot be interrupted and keeps its
+    thread until it returns, so the pool is sized well above the number of
+    providers a single task uses.
+    """
+    global _EXECUTOR, _EXECUTOR_PID
+    pid = os.getpid()
+    if _EXECUTOR is None or _EXECUTOR_PID != pid:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None or _EXECUTOR_PID != pid:
+                # Threads do not survive a fork; children start a fresh pool.
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=settings.worker_provider_pool_size,
+                    thread_name_prefix="provider",
+                )
+                _EXECUTOR_PID = pid
+    return _EXECUTOR
+
+
+def provider_timeout(provider: str) -> float:
+    return settings.worker_provider_timeouts.get(provider, settings.worker_provider_timeout)
+
+
+def _timed(
+    name: str,
+    call: ProviderCall,
+    payload: dict[str, Any],
+    limiter: ProviderLimiter | None,
+    breaker: CircuitBreaker | None,
+    max_wait: float,
+) -> tuple[list[dict[str, Any]], float, float]:
+    if breaker is not None and not breaker.allow(name):
+        raise CircuitOpenError(name)
+    try:
+        waited = limiter.acquire(name, max_wait=max_wait) if limiter is not None else 0.0
+    except rate_limit.RateLimitedError:
+        # Neither a success nor a failure: a half-open probe must not keep
+        # its slot until the probe timeout.
+        if breaker is not None:
+            breaker.release_probe(name)
+        raise
+    started = time.perf_counter()
+    try:
+        result = call(payload)
+    finally:
+        # Recorded even when the caller has stopped waiting, so slow calls
+        # that lost a hedge or timed out still count towards the tail.
+        get_latency_histograms().record(name, (time.perf_counter() - started) * 1000)
+    return result, (time.perf_counter() - started) * 1000, waited * 1000
+
+
+def _collect(
+    future: Future[Any],
+    name: str,
+    started: float,
+    breaker: CircuitBreaker | None,
+) -> tuple[list[dict[str, Any]] | None, ProviderOutcome]:
+    """Turn a finished provider call into ``(items or None, outcome)``."""
+    try:
+        items, latency_ms, wait_ms = future.result()
+    except rate_limit.RateLimitedError as exc:
+        latency = (time.perf_counter() - started) * 1000
+        return None, ProviderOutcome(name, RATE_LIMITED, latency, error=str(exc))
+    except CircuitOpenError as exc:
+        latency = (time.perf_counter() - started) * 1000
+        return None, ProviderOutcome(name, CIRCUIT_OPEN, latency, error=str(exc))
+    except Exception as exc:  # noqa: BLE001
+        latency = (time.perf_counter() - started) * 1000
+        if breaker is not None:
+            breaker.record_failure(name)
+        return None, ProviderOutcome(name, ERROR, latency, error=str(exc))
+    if breaker is not None:
+        breaker.record_success(name)
+    return items, ProviderOutcome(name, OK, latency_ms, count=len(items), wait_ms=wait_ms)
+
+
+def iter_fan_out(
+    calls: Mapping[str, ProviderCall],
+    payload: dict[str, Any],
+    *,
+    timeouts: Mapping[str, float] | None = None,
+    limiter: ProviderLimiter | None = None,
+    breaker: CircuitBreaker | None = None,
+    outcomes: dict[str, ProviderOutcome] | None = None,
+) -> Iterator[tuple[str, list[dict[str, Any]]]]:
+    """Call every provider concurrently and yield ``(provider, items)`` as each answers.
+
+    Providers that time out or raise yield nothing; once all have settled
+    ``ProvidersFailedError`` is raised if none of them succeeded. Every
+    provider's outcome is recorded in ``outcomes`` as it settles. With a
+    ``breaker``, providers whose circuit is open are skipped without being
+    called, and every timeout, error or success is reported back to it.
+    """
+    outcomes = {} if outcomes is None else outcomes
+    executor = get_provider_executor()
+    started = time.perf_counter()
+    futures: dict[Future[Any], str] = {}
+    deadlines: dict[str, float] = {}
+    for name, call in calls.items():
+        timeout = (timeouts or {}).get(name, provider_timeout(name))
+        deadlines[name] = started + timeout
+        futures[executor.submit(_timed, name, call, payload, limiter, breaker, timeout)] = name
+
+    succeeded = False
+    pending = set(futures)
+    while pending:
+        now = time.perf_counter()
+        for future in [future for future in pending if deadlines[futures[future]] <= now]:
+            pending.discard(future)
+            future.cancel()
+            name = futures[future]
+            outcomes[name] = ProviderOutcome(name, TIMEOUT, (now - started) * 1000)
+            if breaker is not None:
+                breaker.record_failure(name)
+        if not pending:
+            break
+        next_deadline = min(deadlines[futures[future]] for future in pending)
+        done, pending = wait(pending, timeout=next_deadline - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = futures[future]
+            items, outcomes[name] = _collect(future, name, started, breaker)
+            if items is not None:
+                succeeded = True
+                yield name, items
+
+    if not succeeded:
+        raise ProvidersFailedError({name: outcomes[name] for name in calls})
+
+
+def fan_out(
+    calls: Mapping[str, ProviderCall],
+    payload: dict[str, Any],
+    *,
+    timeouts: Mapping[str, float] | None = None,
+    limiter: ProviderLimiter | None = None,
+    breaker: CircuitBreaker | None = None,
+) -> tuple[list[dict[str, Any]], dict[str, ProviderOutcome]]:
+    """Call every provider concurrently and merge their results.
+
+    Results are concatenated in the order of ``calls``. Providers that time
+    out or raise contribute nothing; if none of them succeeds
+    ``ProvidersFailedError`` is raised so the task is retried rather than
+    caching an empty result (see ``iter_fan_out``).
+    """
+    outcomes: dict[str, ProviderOutcome] = {}
+    results = dict(
+        iter_fan_out(
+            calls,
+            payload,
+            timeouts=timeouts,
+            limiter=limiter,
+            breaker=breaker,
+            outcomes=outcomes,
+        )
+    )
+    merged = [item for name in calls for item in results.get(name, [])]
+    return merged, {name: outcomes[name] for name in calls}
+
+
+def hedge_delay(provider: str, histograms: LatencyHistograms | None = None) -> float:
+    """Seconds to give ``provider`` before hedging: its observed latency at
+    ``settings.worker_hedge_quantile``, or ``worker_hedge_default_delay``
+    until ``worker_hedge_min_samples`` calls have been seen."""
+    histogram = (histograms or get_latency_histograms()).get(provider)
+    if histogram.count < settings.worker_hedge_min_samples:
+        return settings.worker_hedge_default_delay
+    return (histogram.quantile(settings.worker_hedge_quantile) or 0.0) / 1000
+
+
+def hedge(
+    chain: Mapping[str, ProviderCall],
+    payload: dict[str, Any],
+    *,
+    satisfied: Callable[[list[dict[str, Any]]], bool] = bool,
+    timeouts: Mapping[str, float] | None = None,
+    limiter: ProviderLimiter | None = None,
+    breaker: CircuitBreaker | None = None,
+    histograms: LatencyHistograms | None = None,
+) -> tuple[list[dict[str, Any]], dict[str, ProviderOutcome]]:
+    """Call an ordered fallback chain with hedged requests.
+
+    The first provider starts alone. The next one is started as soon as the
+    running providers have all failed, or once the latest one has been
+    running for its ``hedge_delay``. The first result accepted by
+    ``satisfied`` is returned and the providers still running are cancelled
+    (reported as ``cancelled``; a call already in progress finishes in the
+    background and is only discarded). Providers never started are left out
+    of the outcomes. If nothing satisfies, the first successful result is
+    returned, and ``ProvidersFailedError`` is raised if every provider
+    failed.
+    """
+    executor = get_provider_executor()
+    names = list(chain)
+    started = time.perf_counter()
+    futures: dict[Future[Any], str] = {}
+    deadlines: dict[str, float] = {}
+    outcomes: dict[str, ProviderOutcome] = {}
+    fallback: list[dict[str, Any]] | None = None
+    winner: list[dict[str, Any]] | None = None
+    pending: set[Future[Any]] = set()
+    hedge_at = started
+
+    while winner is None:
+        now = time.perf_counter()
+        if names and (not pending or now >= hedge_at):
+            name = names.pop(0)
+            timeout = (timeouts or {}).get(name, provider_timeout(name))
+            deadlines[name] = now + timeout
+            future = executor.submit(_timed, name, chain[name], payload, limiter, breaker, timeout)
+            futures[future] = name
+            pending.add(future)
+            hedge_at = now + hedge_delay(name, histograms)
+            continue
+        for future in [future for future in pending if deadlines[futures[future]] <= now]:
+            pending.discard(future)
+            future.cancel()
+            name = futures[future]
+            outcomes[name] = ProviderOutcome(name, TIMEOUT, (now - started) * 1000)
+            if breaker is not None:
+                breaker.record_failure(name)
+        if not pending:
+            if names:
+                continue
+            break
+        wake = min(deadlines[futures[future]] for future in pending)
+        if names:
+            wake = min(wake, hedge_at)
+        done, pending = wait(pending, timeout=max(wake - now, 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            name = futures[future]
+            items, outcomes[name] = _collect(future, name, started, breaker)
+            if items is None:
+                continue
+            if winner is None and satisfied(items):
+                winner = items
+            elif fallback is None:
+                fallback = items
+
+    now = time.perf_counter()
+    for future in pending:
+        name = futures[future]
+        if not future.cancel() and breaker is not None:
+            # The call was admitted and its result is discarded, so it never
+            # records an outcome; free a half-open probe slot it may hold.
+            breaker.release_probe(name)
+        outcomes[name] = ProviderOutcome(name, CANCELLED, (now - started) * 1000)
+
+    ordered = {name: outcomes[name] for name in chain if name in outcomes}
+    if winner is not None:
+        return winner, ordered
+    if fallback is not None:
+        return fallback, ordered
+    raise ProvidersFailedError(ordered)
+
+
+def outcomes_to_dict(outcomes: Mapping[str, ProviderOutcome]) -> dict[str, dict[str, Any]]:
+    return {name: outcome.to_dict() for name, outcome in outcomes.items()}
@@ -0,0 +1,86 @@
+"""Distributed token buckets shared by every worker through Redis.
+
+Each bucket is a hash ``ratelimit:<bucket>`` with the current token count and
+the time it was last refilled. A Lua script refills and takes a token
+atomically using the Redis server clock, so all workers on all nodes draw
+from the same budget regardless of their own clocks.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+# KEYS: bucket key. ARGV: refill rate (tokens/s), capacity, tokens requested.
+# Returns {1, 0} when granted, else {0, milliseconds until enough tokens}.
+_TAKE = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now_ms
+tokens = math.min(capacity, tokens + math.max(0, now_ms - ts) * rate / 1000)
+local granted = 0
+local wait_ms = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    granted = 1
+else
+    wait_ms = math.ceil((requested - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return {granted, wait_ms}
+"""
+
+
+class RateLimitedError(RuntimeError):
+    """Raised when a token could not be obtained within the allowed wait."""
+
+    def __init__(self, bucket: str, waited: float) -> None:
+        super().__init__(f"Rate limit for {bucket} not available after {waited:.2f}s")
+        self.bucket = bucket
+
+
+def bucket_key(bucket: str) -> str:
+    return f"ratelimit:{bucket}"
+
+
+def try_take(
+    client: Any,
+    bucket: str,
+    *,
+    rate: float,
+    capacity: float,
+    tokens: float = 1,
+) -> tuple[bool, float]:
+    """Take ``tokens`` if available; return ``(granted, seconds to wait otherwise)``."""
+    script = client.register_script(_TAKE)
+    granted, wait_ms = script(keys=[bucket_key(bucket)], args=[rate, capacity, tokens])
+    return bool(int(granted)), int(wait_ms) / 1000
+
+
+def take(
+    client: Any,
+    bucket: str,
+    *,
+    rate: float,
+    capacity: float,
+    max_wait: float,
+    tokens: float = 1,
+) -> float:
+    """Block until ``tokens`` are taken from ``bucket``; return the time waited.
+
+    Raises ``RateLimitedError`` instead of waiting past ``max_wait`` seconds.
+    """
+    started = time.monotonic()
+    while True:
+        granted, wait = try_take(client, bucket, rate=rate, capacity=capacity, tokens=tokens)
+        waited = time.monotonic() - started
+        if granted:
+            return waited
+        if waited + wait > max_wait:
+            raise RateLimitedError(bucket, waited)
+        time.sleep(wait)
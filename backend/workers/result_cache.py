@@ -0,0 +1,121 @@
+"""In-process tier in front of the Redis result cache.
+
+Worker processes often see the same idempotency key again seconds after
+producing its result (fan-out retries, duplicate dispatches). ``LocalResultCache``
+keeps recently seen results in a bounded LRU with a TTL so those lookups
+skip Redis entirely. Entries are keyed by the idempotency key without its
+version; asking for a different version is a miss that also evicts the stale
+entry.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from app.config import settings
+
+LOCAL = "local"
+REDIS = "redis"
+POSTGRES = "postgres"
+
+
+class CacheStats:
+    """Hit and miss counters per cache tier."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[str, int]] = {}
+
+    def record(self, tier: str, *, hit: bool) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(tier, {"hits": 0, "misses": 0})
+            counters["hits" if hit else "misses"] += 1
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            snapshot: dict[str, dict[str, float]] = {}
+            for tier, counters in self._counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                snapshot[tier] = {
+                    **counters,
+                    "hit_ratio": counters["hits"] / lookups if lookups else 0.0,
+                }
+            return snapshot
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+class LocalResultCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 60.0,
+        *,
+        clock: Callable[[], float] | None = None,
+        stats: CacheStats | None = None,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._clock = clock or time.monotonic
+        self._entries: OrderedDict[str, tuple[str | None, str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = stats or CacheStats()
+        self.evictions = 0
+
+    def get(self, key: str, version: str | None) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, value, expires_at = entry
+                if entry_version == version and expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.stats.record(LOCAL, hit=True)
+                    return value
+                del self._entries[key]
+            self.stats.record(LOCAL, hit=False)
+            return None
+
+    def put(self, key: str, version: str | None, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (version, value, self._clock() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_STATS = CacheStats()
+_DEFAULT_CACHE: LocalResultCache | None = None
+
+
+def get_cache_stats() -> CacheStats:
+    return _STATS
+
+
+def get_local_result_cache() -> LocalResultCache | None:
+    """Return the per-process cache, or ``None`` when the local tier is disabled."""
+    global _DEFAULT_CACHE
+    if not settings.worker_local_cache_enabled:
+        return None
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = LocalResultCache(
+            settings.worker_local_cache_max_entries,
+            settings.worker_local_cache_ttl,
+            stats=_STATS,
+        )
+    return _DEFAULT_CACHE
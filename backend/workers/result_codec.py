@@ -0,0 +1,118 @@
+"""Storage format of ``result:*`` values in Redis.
+
+Results below ``min_bytes`` are stored as plain JSON. Larger ones are
+compressed and stored as ``<codec>:<raw size>:<base64 body>``; JSON always
+starts with ``{`` so the prefix is unambiguous and reads stay transparent.
+zstd is used when installed and zlib otherwise. The raw size in the header
+lets ``result_memory_stats`` report compression ratios without
+decompressing anything.
+"""
+from __future__ import annotations
+
+import base64
+import zlib
+from typing import Any
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+_HEADER_BYTES = 32
+
+
+def default_codec() -> str:
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def encode_result(text: str, *, min_bytes: int, codec: str | None = None) -> str:
+    raw = text.encode("utf-8")
+    if min_bytes <= 0 or len(raw) < min_bytes:
+        return text
+    codec = codec or default_codec()
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed.")
+        body = zstandard.ZstdCompressor(level=3).compress(raw)
+    elif codec == CODEC_ZLIB:
+        body = zlib.compress(raw, 6)
+    else:
+        raise ValueError(f"Unknown result codec: {codec}")
+    encoded = f"{codec}:{len(raw)}:{base64.b64encode(body).decode('ascii')}"
+    return encoded if len(encoded) < len(raw) else text
+
+
+def decode_result(value: str) -> str:
+    codec, sep, rest = value.partition(":")
+    if not sep or codec not in (CODEC_ZLIB, CODEC_ZSTD):
+        return value
+    _, _, body = rest.partition(":")
+    data = base64.b64decode(body)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed results.")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _raw_size(header: str, stored: int) -> tuple[int, bool]:
+    codec, sep, rest = header.partition(":")
+    if sep and codec in (CODEC_ZLIB, CODEC_ZSTD):
+        size, _, _ = rest.partition(":")
+        if size.isdigit():
+            return int(size), True
+    return stored, False
+
+
+def result_memory_stats(
+    client: Any,
+    *,
+    pattern: str = "result:*",
+    batch_size: int = 500,
+) -> dict[str, dict[str, float]]:
+    """Count live result keys and their stored vs. raw bytes per task type.
+
+    Keys are ``result:<intent_id>:<task_type>:<entity_id>[:<version>]``. Each
+    SCAN batch is sized with one pipelined STRLEN/GETRANGE pair per key.
+    """
+    stats: dict[str, dict[str, float]] = {}
+    batch: list[str] = []
+
+    def _flush() -> None:
+        pipeline = client.pipeline(transaction=False)
+        for key in batch:
+            pipeline.strlen(key)
+            pipeline.getrange(key, 0, _HEADER_BYTES - 1)
+        replies = pipeline.execute()
+        for index, key in enumerate(batch):
+            stored, header = replies[2 * index], replies[2 * index + 1]
+            if not stored:
+                continue  # expired between SCAN and STRLEN
+            if isinstance(header, bytes):
+                header = header.decode("utf-8", "replace")
+            parts = key.split(":")
+            task_type = parts[2] if len(parts) > 2 else "unknown"
+            entry = stats.setdefault(
+                task_type,
+                {"keys": 0, "stored_bytes": 0, "raw_bytes": 0, "compressed_keys": 0},
+            )
+            raw, compressed = _raw_size(header, stored)
+            entry["keys"] += 1
+            entry["stored_bytes"] += stored
+            entry["raw_bytes"] += raw
+            entry["compressed_keys"] += int(compressed)
+        batch.clear()
+
+    for key in client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key.decode("utf-8") if isinstance(key, bytes) else key)
+        if len(batch) >= batch_size:
+            _flush()
+    if batch:
+        _flush()
+    for entry in stats.values():
+        entry["compression_ratio"] = (
+            entry["raw_bytes"] / entry["stored_bytes"] if entry["stored_bytes"] else 1.0
+        )
+    return stats
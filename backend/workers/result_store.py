@@ -0,0 +1,300 @@
+"""Durable tier for worker results, behind the Redis idempotency cache.
+
+Successful responses of selected task types are written behind to the
+``task_results`` table, keyed by idempotency key. ``run_idempotent_task``
+reads through to it on a Redis miss and repopulates Redis, so a flushed or
+restarted Redis costs one database read per key instead of a recompute.
+Rows older than their task type's result TTL are ignored on read and
+removed by ``prune``, so the durable tier never outlives the cache it backs.
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from app.config import settings
+from batch_writer import BackgroundBatchWriter
+from database import (
+    ConnectionFactory,
+    borrow_connection,
+    default_connection_factory,
+    ensure_schema,
+    is_sqlite_connection as _is_sqlite_connection,
+)
+
+Clock = Callable[[], datetime]
+# (idempotency_key, task_type, result_json, updated_at)
+TaskResultRow = tuple[str, str, str, str]
+
+
+def default_clock() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+_SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS task_results (
+        idempotency_key TEXT PRIMARY KEY,
+        task_type TEXT NOT NULL,
+        result_json TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_task_results_task_type_updated_at
+    ON task_results (task_type, updated_at)
+    """,
+]
+
+_POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS task_results (
+        idempotency_key TEXT PRIMARY KEY,
+        task_type TEXT NOT NULL,
+        result_json JSONB NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_task_results_task_type_updated_at
+    ON task_results (task_type, updated_at)
+    """,
+]
+
+_SQLITE_UPSERT = """
+    INSERT INTO task_results (idempotency_key, task_type, result_json, updated_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (idempotency_key) DO UPDATE SET
+        task_type = excluded.task_type,
+        result_json = excluded.result_json,
+        updated_at = excluded.updated_at
+"""
+
+_POSTGRES_UPSERT = """
+    INSERT INTO task_results (idempotency_key, task_type, result_json, updated_at)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (idempotency_key) DO UPDATE SET
+        task_type = EXCLUDED.task_type,
+        result_json = EXCLUDED.result_json,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# JSONB normalizes what it stores (key order, whitespace), so rows read back
+# as result_json::text are equivalent to, not byte-identical with, what was
+# written. Callers only decode them.
+_POSTGRES_GET_MANY = """
+    SELECT idempotency_key, result_json::text, updated_at
+    FROM task_results
+    WHERE idempotency_key = ANY(%s) AND updated_at >= %s
+"""
+
+_POSTGRES_PRUNE = "DELETE FROM task_results WHERE task_type = %s AND updated_at < %s"
+
+
+def task_results_schema(*, sqlite: bool) -> list[str]:
+    return list(_SQLITE_SCHEMA if sqlite else _POSTGRES_SCHEMA)
+
+
+def initialize_task_results_table(connection: Any) -> None:
+    for statement in task_results_schema(sqlite=_is_sqlite_connection(connection)):
+        connection.execute(statement)
+
+
+@dataclass(frozen=True)
+class StoredTaskResult:
+    result_json: str
+    updated_at: datetime
+
+
+class TaskResultStore:
+    def __init__(
+        self,
+        connection_factory: ConnectionFactory,
+        *,
+        clock: Clock | None = None,
+        close_connection: bool = True,
+    ) -> None:
+        self._connection_factory = connection_factory
+        self._clock = clock or default_clock
+        self._close_connection = close_connection
+
+    def get(self, idempotency_key: str, *, max_age: float | None = None) -> str | None:
+        """Return the stored response JSON for ``idempotency_key``, if any."""
+        stored = self.get_entries([idempotency_key], max_age=max_age).get(idempotency_key)
+        return stored.result_json if stored else None
+
+    def get_many(
+        self,
+        idempotency_keys: Sequence[str],
+        *,
+        max_age: float | None = None,
+    ) -> dict[str, str]:
+        """Return ``{idempotency_key: response JSON}`` for the keys that are stored."""
+        entries = self.get_entries(idempotency_keys, max_age=max_age)
+        return {key: stored.result_json for key, stored in entries.items()}
+
+    def get_entries(
+        self,
+        idempotency_keys: Sequence[str],
+        *,
+        max_age: float | None = None,
+    ) -> dict[str, StoredTaskResult]:
+        """Return the stored results, skipping rows written more than ``max_age`` seconds ago."""
+        if not idempotency_keys:
+            return {}
+        cutoff = self._cutoff(max_age)
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "task_results",
+                initialize_task_results_table,
+            )
+            if _is_sqlite_connection(connection):
+                placeholders = ", ".join("?" for _ in idempotency_keys)
+                rows = connection.execute(
+                    "SELECT idempotency_key, result_json, updated_at FROM task_results "
+                    f"WHERE idempotency_key IN ({placeholders}) AND updated_at >= ?",
+                    [*idempotency_keys, cutoff.isoformat()],
+                ).fetchall()
+            else:
+                rows = connection.execute(
+                    _POSTGRES_GET_MANY,
+                    (list(idempotency_keys), cutoff),
+                ).fetchall()
+        entries: dict[str, StoredTaskResult] = {}
+        for key, result_json, updated_at in rows:
+            if isinstance(updated_at, str):
+                updated_at = datetime.fromisoformat(updated_at)
+            entries[key] = StoredTaskResult(result_json, updated_at)
+        return entries
+
+    def prune(self, task_type: str, *, max_age: float) -> int:
+        """Delete ``task_type`` rows written more than ``max_age`` seconds ago."""
+        cutoff = self._cutoff(max_age)
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "task_results",
+                initialize_task_results_table,
+            )
+            if _is_sqlite_connection(connection):
+                cursor = connection.execute(
+                    "DELETE FROM task_results WHERE task_type = ? AND updated_at < ?",
+                    (task_type, cutoff.isoformat()),
+                )
+            else:
+                cursor = connection.execute(_POSTGRES_PRUNE, (task_type, cutoff))
+            deleted = cursor.rowcount
+            connection.commit()
+        return deleted
+
+    def _cutoff(self, max_age: float | None) -> datetime:
+        if max_age is None:
+            return datetime.min.replace(tzinfo=timezone.utc)
+        return self._clock() - timedelta(seconds=max_age)
+
+    def put(self, idempotency_key: str, task_type: str, result_json: str) -> None:
+        self.put_many([(idempotency_key, task_type, result_json)])
+
+    def put_many(self, results: Sequence[tuple[str, str, str]]) -> None:
+        """Store ``(idempotency_key, task_type, result_json)`` tuples."""
+        updated_at = self._clock().isoformat()
+        self.write_rows([(*result, updated_at) for result in results])
+
+    def write_rows(self, rows: Sequence[TaskResultRow]) -> None:
+        if not rows:
+            return
+        with borrow_connection(
+            self._connection_factory,
+            close_connection=self._close_connection,
+        ) as connection:
+            ensure_schema(
+                self._connection_factory,
+                connection,
+                "task_results",
+                initialize_task_results_table,
+            )
+            if _is_sqlite_connection(connection):
+                connection.executemany(_SQLITE_UPSERT, rows)
+            else:
+                with connection.cursor() as cursor:
+                    cursor.executemany(_POSTGRES_UPSERT, rows)
+            connection.commit()
+
+    def flush(self, timeout: float | None = None) -> None:
+        """No-op; writes are synchronous."""
+
+    def close(self, timeout: float | None = None) -> None:
+        """No-op; there is no background writer."""
+
+
+class WriteBehindTaskResultStore(TaskResultStore):
+    """Result store whose ``put`` only enqueues; a background thread upserts.
+
+    Rows go through the same ``BackgroundBatchWriter`` as the buffered audit
+    log. Reads go straight to the database, so a result still in the queue
+    is simply recomputed or served from Redis.
+    """
+
+    def __init__(
+        self,
+        connection_factory: ConnectionFactory,
+        *,
+        clock: Clock | None = None,
+        close_connection: bool = True,
+        max_buffer: int = 10_000,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+    ) -> None:
+        super().__init__(connection_factory, clock=clock, close_connection=close_connection)
+        self._writer: BackgroundBatchWriter[TaskResultRow] = BackgroundBatchWriter(
+            lambda rows: self.write_rows(rows),
+            name="task-result-writer",
+            max_buffer=max_buffer,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+        )
+
+    def put_many(self, results: Sequence[tuple[str, str, str]]) -> None:
+        updated_at = self._clock().isoformat()
+        self._writer.put_many((*result, updated_at) for result in results)
+
+    def flush(self, timeout: float | None = None) -> None:
+        self._writer.flush(timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        self._writer.close(timeout)
+
+
+_DEFAULT_STORE: TaskResultStore | None = None
+
+
+def get_default_task_result_store() -> TaskResultStore | None:
+    """Return the process-wide store, or ``None`` when no task type is durable."""
+    global _DEFAULT_STORE
+    if not settings.worker_durable_result_task_types:
+        return None
+    if _DEFAULT_STORE is None:
+        _DEFAULT_STORE = WriteBehindTaskResultStore(
+            default_connection_factory(),
+            batch_size=settings.worker_durable_result_batch_size,
+            flush_interval=settings.worker_durable_result_flush_interval,
+        )
+    return _DEFAULT_STORE
+
+
+def shutdown_default_task_result_store(timeout: float | None = 10.0) -> None:
+    """Flush and stop the default store's writer, if one was started."""
+    if _DEFAULT_STORE is not None:
+        _DEFAULT_STORE.flush(timeout)
+        _DEFAULT_STORE.close(timeout)
@@ -0,0 +1,173 @@
+"""Per-intent Redis Streams that carry entities from one stage to the next.
+
+A producing stage appends each entity to ``stream:<intent_id>:<stage>`` as
+soon as it is found and sets ``stream:<intent_id>:<stage>:end`` once it has
+emitted everything. Each consuming stage reads the stream through its own
+consumer group, so several workers of one stage share the entities while
+every stage still sees all of them. Entries are acknowledged only after they
+have been processed; entries left pending by a consumer that died are
+claimed by the others once they have been idle for ``claim_idle`` seconds.
+Entities a consumer gives up on are moved to
+``stream:<intent_id>:<stage>:deadletter`` as they are acknowledged.
+"""
+from __future__ import annotations
+
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import redis
+
+import serialization
+
+# (entry id, {"entity_id": ..., "payload": {...}})
+StreamEntry = tuple[str, dict[str, Any]]
+
+
+def stream_key(intent_id: str, stage: str) -> str:
+    return f"stream:{intent_id}:{stage}"
+
+
+def end_key(stream: str) -> str:
+    return f"{stream}:end"
+
+
+def deadletter_key(stream: str) -> str:
+    return f"{stream}:deadletter"
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _decode(fields: dict[Any, Any]) -> dict[str, Any]:
+    data = {_text(key): _text(value) for key, value in fields.items()}
+    return serialization.loads(data["entity"])
+
+
+def publish(client: Any, stream: str, entity: dict[str, Any], *, ttl: int) -> str:
+    """Append ``entity`` to ``stream``; the stream expires ``ttl`` seconds after its last write."""
+    pipeline = client.pipeline(transaction=False)
+    pipeline.xadd(stream, {"entity": serialization.dumps(entity)})
+    pipeline.expire(stream, ttl)
+    entry_id, _ = pipeline.execute()
+    return _text(entry_id)
+
+
+def close(client: Any, stream: str, *, ttl: int) -> None:
+    """Mark ``stream`` complete: no entity is appended after this."""
+    client.set(end_key(stream), 1, ex=ttl)
+
+
+def ensure_group(client: Any, stream: str, group: str) -> None:
+    try:
+        client.xgroup_create(stream, group, id="0", mkstream=True)
+    except redis.ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def ack(client: Any, stream: str, group: str, entry_id: str) -> None:
+    client.xack(stream, group, entry_id)
+
+
+def deadletter(
+    client: Any,
+    stream: str,
+    group: str,
+    entry_id: str,
+    entity: dict[str, Any],
+    error: str,
+    *,
+    ttl: int,
+) -> None:
+    """Acknowledge ``entry_id`` and append it to ``stream``'s deadletter stream, atomically."""
+    key = deadletter_key(stream)
+    pipeline = client.pipeline(transaction=True)
+    pipeline.xadd(key, {"entity": serialization.dumps(entity), "group": group, "error": error})
+    pipeline.expire(key, ttl)
+    pipeline.xack(stream, group, entry_id)
+    pipeline.execute()
+
+
+def deadlettered(client: Any, stream: str) -> list[dict[str, Any]]:
+    """Return ``{"entity", "group", "error"}`` for each entry deadlettered from ``stream``."""
+    items: list[dict[str, Any]] = []
+    for _, fields in client.xrange(deadletter_key(stream)):
+        data = {_text(key): _text(value) for key, value in fields.items()}
+        items.append(
+            {
+                "entity": serialization.loads(data["entity"]),
+                "group": data["group"],
+                "error": data["error"],
+            }
+        )
+    return items
+
+
+def consume(
+    client: Any,
+    stream: str,
+    group: str,
+    consumer: str,
+    *,
+    count: int = 10,
+    block_ms: int = 1000,
+    claim_idle: float = 30.0,
+    poll_interval: float = 0.05,
+    timeout: float | None = None,
+) -> Iterator[StreamEntry]:
+    """Yield entries for ``consumer`` until the stream is closed and drained.
+
+    The caller acknowledges each entry with ``ack`` once it has handled it.
+    The generator returns when the producer has closed the stream and the
+    group has nothing left pending. Entries pending with another consumer
+    are waited for: acknowledged by it, or claimed here once they have been
+    idle for ``claim_idle`` seconds because it died. ``block_ms=0`` polls
+    every ``poll_interval`` seconds instead of blocking on the server.
+    Raises ``TimeoutError`` after ``timeout`` seconds without the stream
+    being closed and drained.
+    """
+    ensure_group(client, stream, group)
+    started = time.monotonic()
+    claim_idle_ms = int(claim_idle * 1000)
+    while True:
+        # Read the end marker first: if it was set before an empty read,
+        # every entry has already been delivered to some consumer.
+        closed = bool(client.exists(end_key(stream)))
+        response = client.xreadgroup(
+            group,
+            consumer,
+            {stream: ">"},
+            count=count,
+            block=block_ms or None,
+        )
+        entries = response[0][1] if response else []
+        if not entries:
+            _, claimed, _ = client.xautoclaim(
+                stream,
+                group,
+                consumer,
+                min_idle_time=claim_idle_ms,
+                count=count,
+            )
+            entries = [entry for entry in claimed if entry]
+        for entry_id, fields in entries:
+            yield _text(entry_id), _decode(fields)
+        if entries:
+            continue
+        if closed and drained(client, stream, group):
+            return
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"{stream} was not closed and drained within {timeout}s")
+        if not block_ms:
+            time.sleep(poll_interval)
+
+
+def drained(client: Any, stream: str, group: str) -> bool:
+    """Whether ``group`` has no entry of ``stream`` awaiting acknowledgement."""
+    try:
+        summary = client.xpending(stream, group)
+    except redis.ResponseError:
+        return True
+    return not summary["pending"]
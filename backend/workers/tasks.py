@@ -1,23 +1,68 @@
 from __future__ import annotations
 
-import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Callable
-from uuid import uuid4
+from typing import Any, Callable, Iterator
 
 import redis
 
+import serialization
 from app.config import settings
 from audit_log import AuditLogStore, get_default_audit_log_store
+from orchestrator.engine import companies_as_entities, company_entity_id
+from orchestrator.outbox import get_default_task_outbox
+from redis_pool import default_redis_pool_stats, get_default_redis_client
+from workers import idempotency, providers, result_cache, result_codec, streams
+from workers.circuit_breaker import CircuitBreaker, get_default_circuit_breaker
+from workers.latency import get_latency_histograms
+from workers.result_store import (
+    StoredTaskResult,
+    TaskResultStore,
+    get_default_task_result_store,
+)
 from workers.celery_app import celery_app
 
 
+logger = logging.getLogger(__name__)
+
 RedisClient = redis.Redis
 AUDIT_LOG_STORE: AuditLogStore | None = None
+RESULT_STORE: TaskResultStore | None = None
+
+
+def get_result_store(task_type: str) -> TaskResultStore | None:
+    """Return the durable result tier if ``task_type`` is persisted, else ``None``."""
+    if task_type not in settings.worker_durable_result_task_types:
+        return None
+    return RESULT_STORE or get_default_task_result_store()
+
+
+def get_provider_limiter() -> providers.ProviderLimiter:
+    return providers.ProviderLimiter(
+        get_redis_client(),
+        providers.get_default_registry(),
+        max_wait=settings.worker_rate_limit_max_wait,
+    )
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    return get_default_circuit_breaker(get_redis_client())
+
+
+def result_ttl(task_type: str) -> int:
+    return settings.worker_result_ttls.get(task_type, settings.worker_result_ttl)
+
+
+def _remaining_ttl(task_type: str, entry: StoredTaskResult) -> int:
+    """Redis TTL for a durable row, so it expires when a fresh result would have."""
+    age = (datetime.now(timezone.utc) - entry.updated_at).total_seconds()
+    return max(int(result_ttl(task_type) - age), 1)
 
 
 def get_redis_client() -> RedisClient:
-    return redis.Redis.from_url(settings.redis_url, decode_responses=True)
+    return get_default_redis_client()
 
 
 def get_audit_log_store() -> AuditLogStore:
@@ -36,118 +81,467 @@ def build_idempotency_key(
     return ":".join(parts)
 
 
-def run_idempotent_task(
-    task_type: str,
-    intent_id: str,
-    entity_id: str | None,
-    payload: dict[str, Any],
-    version: str | None,
-    handler: Callable[[dict[str, Any]], dict[str, Any]],
-) -> dict[str, Any]:
-    client = get_redis_client()
-    idempotency_key = build_idempotency_key(intent_id, task_type, entity_id, version)
-    lock_key = f"lock:{idempotency_key}"
-    result_key = f"result:{idempotency_key}"
-    audit_log_store = get_audit_log_store()
-
-    existing = client.get(result_key)
-    if existing:
-        result = json.loads(existing)
-        audit_log_store.append(
-            f"worker.{task_type}",
-            {
-                "intent_id": intent_id,
-                "entity_id": entity_id,
-                "payload": payload,
-                "version": version,
-                "cached": True,
-            },
-            result,
-        )
-        return result
-
-    lock_token = str(uuid4())
-    acquired = client.set(lock_key, lock_token, nx=True, ex=300)
-    if not acquired:
-        existing = client.get(result_key)
-        if existing:
-            result = json.loads(existing)
-            audit_log_store.append(
-                f"worker.{task_type}",
+class _IdempotentRun:
+    """Per-key steps shared by ``run_idempotent_task`` and ``run_idempotent_batch``.
+
+    Holds the clients and lock token of one invocation. Audit rows are
+    collected and written by ``flush_audit``; durable results are written
+    once their Redis results are stored.
+    """
+
+    def __init__(self, task_type: str, intent_id: str, version: str | None) -> None:
+        self.task_type = task_type
+        self.intent_id = intent_id
+        self.version = version
+        self.client = get_redis_client()
+        self.lock_token = idempotency.new_lock_token()
+        self.stats = result_cache.get_cache_stats()
+        self._audit_log_store = get_audit_log_store()
+        self._local_cache = result_cache.get_local_result_cache()
+        self._result_store = get_result_store(task_type)
+        self._audit_entries: list[tuple[str, dict[str, Any], dict[str, Any]]] = []
+        self._durable_rows: list[tuple[str, str, str]] = []
+
+    def key(self, entity_id: str | None) -> str:
+        return build_idempotency_key(self.intent_id, self.task_type, entity_id, self.version)
+
+    def _local_key(self, entity_id: str | None) -> str:
+        return build_idempotency_key(self.intent_id, self.task_type, entity_id)
+
+    def audit(
+        self,
+        entity_id: str | None,
+        payload: dict[str, Any],
+        output: dict[str, Any],
+        **flags: Any,
+    ) -> None:
+        self._audit_entries.append(
+            (
+                f"worker.{self.task_type}",
                 {
-                    "intent_id": intent_id,
+                    "intent_id": self.intent_id,
                     "entity_id": entity_id,
                     "payload": payload,
-                    "version": version,
-                    "cached": True,
+                    "version": self.version,
+                    **flags,
                 },
-                result,
+                output,
             )
-            return result
-        result = {
-            "status": "locked",
-            "task_type": task_type,
-            "idempotency_key": idempotency_key,
-        }
-        audit_log_store.append(
-            f"worker.{task_type}",
-            {
-                "intent_id": intent_id,
-                "entity_id": entity_id,
-                "payload": payload,
-                "version": version,
-                "locked": True,
-            },
-            result,
         )
+
+    def flush_audit(self) -> None:
+        entries, self._audit_entries = self._audit_entries, []
+        if entries:
+            self._audit_log_store.append_many(entries)
+
+    def local_result(self, entity_id: str | None) -> str | None:
+        if self._local_cache is None:
+            return None
+        return self._local_cache.get(self._local_key(entity_id), self.version)
+
+    def _remember(self, entity_id: str | None, encoded: str) -> None:
+        if self._local_cache is not None:
+            self._local_cache.put(self._local_key(entity_id), self.version, encoded)
+
+    def serve(
+        self,
+        entity_id: str | None,
+        payload: dict[str, Any],
+        encoded: str,
+        tier: str,
+        **flags: Any,
+    ) -> dict[str, Any]:
+        """Return a cached response from ``tier``, keeping it in the local cache."""
+        if tier != result_cache.LOCAL:
+            self._remember(entity_id, encoded)
+        result = serialization.loads(encoded)
+        self.audit(entity_id, payload, result, cached=True, cache_tier=tier, **flags)
         return result
 
-    try:
-        result = handler(payload)
+    def locked(self, entity_id: str | None, payload: dict[str, Any]) -> dict[str, Any]:
         response = {
-            "status": "success",
-            "task_type": task_type,
-            "idempotency_key": idempotency_key,
-            "result": result,
+            "status": "locked",
+            "task_type": self.task_type,
+            "idempotency_key": self.key(entity_id),
         }
-        client.set(result_key, json.dumps(response), ex=86400)
-        audit_log_store.append(
-            f"worker.{task_type}",
-            {
-                "intent_id": intent_id,
-                "entity_id": entity_id,
-                "payload": payload,
-                "version": version,
-            },
-            response,
-        )
+        self.audit(entity_id, payload, response, locked=True)
         return response
-    except Exception as exc:  # noqa: BLE001
-        failure_response = {
+
+    def durable_entries(self, keys: list[str]) -> dict[str, StoredTaskResult]:
+        """Read ``keys`` through to the durable tier; failures count as misses."""
+        if not keys or self._result_store is None:
+            return {}
+        try:
+            entries = self._result_store.get_entries(keys, max_age=result_ttl(self.task_type))
+        except Exception:  # noqa: BLE001
+            logger.warning("Durable result lookup failed for %d keys", len(keys), exc_info=True)
+            entries = {}
+        for key in keys:
+            self.stats.record(result_cache.POSTGRES, hit=key in entries)
+        return entries
+
+    def restored(self, key: str, entry: StoredTaskResult) -> idempotency.StoredResult:
+        return self._stored_result(key, entry.result_json, _remaining_ttl(self.task_type, entry), 1)
+
+    def lease(self, key: str) -> idempotency.LockLease:
+        return idempotency.LockLease(
+            self.client,
+            f"lock:{key}",
+            self.lock_token,
+            settings.worker_lock_ttl,
+            settings.worker_lock_renew_interval,
+        )
+
+    def fail(
+        self,
+        entity_id: str | None,
+        payload: dict[str, Any],
+        exc: Exception,
+    ) -> dict[str, Any]:
+        response = {
             "status": "failed",
-            "task_type": task_type,
-            "idempotency_key": idempotency_key,
+            "task_type": self.task_type,
+            "idempotency_key": self.key(entity_id),
             "error": str(exc),
         }
-        audit_log_store.append(
-            f"worker.{task_type}",
-            {
-                "intent_id": intent_id,
-                "entity_id": entity_id,
-                "payload": payload,
-                "version": version,
-                "error": str(exc),
-            },
-            failure_response,
+        self.audit(entity_id, payload, response, error=str(exc))
+        return response
+
+    def succeed(
+        self,
+        entity_id: str | None,
+        payload: dict[str, Any],
+        result: dict[str, Any],
+        delta_ms: int,
+    ) -> tuple[dict[str, Any], idempotency.StoredResult]:
+        """Build the success response and the Redis entry that stores it."""
+        key = self.key(entity_id)
+        response = self._success(key, result)
+        encoded = serialization.dumps(response)
+        self._remember(entity_id, encoded)
+        if self._result_store is not None:
+            self._durable_rows.append((key, self.task_type, encoded))
+        self.audit(entity_id, payload, response)
+        return response, self._stored_result(
+            key, encoded, result_ttl(self.task_type), max(delta_ms, 1)
         )
+
+    def superseded(
+        self,
+        entity_id: str | None,
+        payload: dict[str, Any],
+        result: dict[str, Any],
+    ) -> dict[str, Any]:
+        """Return ``result`` without storing it once the lease was lost.
+
+        Another worker owns the lock by then, and its result must not be
+        overwritten by this one.
+        """
+        key = self.key(entity_id)
+        logger.warning("Lease on %s was lost; not storing its result", key)
+        response = self._success(key, result)
+        self.audit(entity_id, payload, response, lease_lost=True)
+        return response
+
+    def _success(self, key: str, result: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "status": "success",
+            "task_type": self.task_type,
+            "idempotency_key": key,
+            "result": result,
+        }
+
+    def _stored_result(
+        self,
+        key: str,
+        encoded: str,
+        ttl: int,
+        delta_ms: int,
+    ) -> idempotency.StoredResult:
+        return (
+            f"result:{key}",
+            f"lock:{key}",
+            f"delta:{key}",
+            result_codec.encode_result(encoded, min_bytes=settings.worker_result_compress_min_bytes),
+            ttl,
+            delta_ms,
+        )
+
+    def store_and_release(
+        self,
+        results: list[idempotency.StoredResult],
+        held_locks: list[str],
+    ) -> None:
+        """Store ``results`` in Redis, releasing ``held_locks`` if that fails."""
+        try:
+            idempotency.store_results_and_release_many(self.client, results, self.lock_token)
+        except Exception:
+            self.release(held_locks)
+            raise
+        rows, self._durable_rows = self._durable_rows, []
+        if self._result_store is not None and rows:
+            self._result_store.put_many(rows)
+
+    def release(self, lock_keys: list[str]) -> None:
+        idempotency.release_locks(self.client, lock_keys, self.lock_token)
+
+
+def run_idempotent_task(
+    task_type: str,
+    intent_id: str,
+    entity_id: str | None,
+    payload: dict[str, Any],
+    version: str | None,
+    handler: Callable[[dict[str, Any]], dict[str, Any]],
+    *,
+    wait_for_result: bool | None = None,
+) -> dict[str, Any]:
+    """Run ``handler`` at most once per idempotency key.
+
+    A duplicate that finds the key locked returns ``{"status": "locked"}``
+    unless ``wait_for_result`` (default: ``settings.worker_wait_for_result``)
+    is set, in which case it waits up to ``settings.worker_wait_timeout``
+    seconds for the lock holder's result and returns that instead.
+    """
+    if wait_for_result is None:
+        wait_for_result = settings.worker_wait_for_result
+    run = _IdempotentRun(task_type, intent_id, version)
+    try:
+        return _run_idempotent_key(run, entity_id, payload, handler, wait_for_result)
+    finally:
+        run.flush_audit()
+
+
+def _run_idempotent_key(
+    run: _IdempotentRun,
+    entity_id: str | None,
+    payload: dict[str, Any],
+    handler: Callable[[dict[str, Any]], dict[str, Any]],
+    wait_for_result: bool,
+) -> dict[str, Any]:
+    existing = run.local_result(entity_id)
+    if existing is not None:
+        return run.serve(entity_id, payload, existing, result_cache.LOCAL)
+
+    idempotency_key = run.key(entity_id)
+    lock_key = f"lock:{idempotency_key}"
+    result_key = f"result:{idempotency_key}"
+    deadline = time.monotonic() + settings.worker_wait_timeout
+    waited = False
+    while True:
+        outcome, existing = idempotency.acquire_or_fetch(
+            run.client,
+            result_key,
+            lock_key,
+            run.lock_token,
+            settings.worker_lock_ttl,
+            delta_key=f"delta:{idempotency_key}",
+            beta=settings.worker_xfetch_beta,
+        )
+        if not waited:
+            run.stats.record(
+                result_cache.REDIS,
+                hit=outcome in (idempotency.CACHED, idempotency.REFRESH),
+            )
+        remaining = deadline - time.monotonic()
+        if outcome != idempotency.LOCKED or not wait_for_result or remaining <= 0:
+            break
+        waited = True
+        existing = idempotency.wait_for_result(run.client, result_key, lock_key, remaining)
+        if existing is not None:
+            outcome = idempotency.CACHED
+            break
+        # Timed out, or the holder failed and released the lock: try once more.
+    if outcome == idempotency.CACHED:
+        return run.serve(
+            entity_id,
+            payload,
+            result_codec.decode_result(existing),
+            result_cache.REDIS,
+            waited=waited,
+        )
+    if outcome == idempotency.LOCKED:
+        return run.locked(entity_id, payload)
+
+    if outcome == idempotency.ACQUIRED:
+        entry = run.durable_entries([idempotency_key]).get(idempotency_key)
+        if entry is not None:
+            run.store_and_release([run.restored(idempotency_key, entry)], [lock_key])
+            return run.serve(entity_id, payload, entry.result_json, result_cache.POSTGRES)
+
+    # On REFRESH the lock was taken to recompute a result close to expiry;
+    # the current value stays available as a fallback.
+    stale = existing if outcome == idempotency.REFRESH else None
+    started = time.perf_counter()
+    try:
+        with run.lease(idempotency_key) as lease:
+            result = handler(payload)
+    except Exception as exc:  # noqa: BLE001
+        run.release([lock_key])
+        run.fail(entity_id, payload, exc)
+        if stale is not None:
+            logger.warning("Early refresh of %s failed; serving cached result", result_key)
+            return serialization.loads(result_codec.decode_result(stale))
         raise
+    if lease.lost:
+        return run.superseded(entity_id, payload, result)
+    delta_ms = int((time.perf_counter() - started) * 1000)
+    response, stored = run.succeed(entity_id, payload, result, delta_ms)
+    run.store_and_release([stored], [lock_key])
+    return response
+
+
+def run_idempotent_batch(
+    task_type: str,
+    intent_id: str,
+    items: list[dict[str, Any]],
+    version: str | None,
+    handler: Callable[[dict[str, Any]], dict[str, Any]],
+) -> list[dict[str, Any]]:
+    """Run ``handler`` for many entities with per-entity idempotency.
+
+    ``items`` are ``{"entity_id": ..., "payload": {...}}`` dicts; one response
+    is returned per item, in order. Cached results come from one MGET, locks
+    for the rest are taken in one pipelined step, handlers run in a bounded
+    thread pool and results and audit rows are written in bulk. A failing
+    entity yields a ``"failed"`` response instead of failing the batch, and
+    entities locked by another worker yield ``"locked"`` without waiting.
+    """
+    run = _IdempotentRun(task_type, intent_id, version)
+    try:
+        return _run_idempotent_keys(run, items, handler)
     finally:
-        if client.get(lock_key) == lock_token:
-            client.delete(lock_key)
+        run.flush_audit()
+
+
+def _run_idempotent_keys(
+    run: _IdempotentRun,
+    items: list[dict[str, Any]],
+    handler: Callable[[dict[str, Any]], dict[str, Any]],
+) -> list[dict[str, Any]]:
+    # Duplicate entity ids in one batch share a single computation.
+    entities: dict[str, tuple[str | None, dict[str, Any]]] = {}
+    order: list[str] = []
+    for item in items:
+        entity_id = item.get("entity_id")
+        key = run.key(entity_id)
+        entities.setdefault(key, (entity_id, item.get("payload") or {}))
+        order.append(key)
+
+    responses: dict[str, dict[str, Any]] = {}
+    pending: list[str] = []
+    for key, (entity_id, payload) in entities.items():
+        encoded = run.local_result(entity_id)
+        if encoded is None:
+            pending.append(key)
+        else:
+            responses[key] = run.serve(entity_id, payload, encoded, result_cache.LOCAL)
+
+    if pending:
+        cached_values = run.client.mget([f"result:{key}" for key in pending])
+        remaining = []
+        for key, value in zip(pending, cached_values):
+            run.stats.record(result_cache.REDIS, hit=value is not None)
+            if value is None:
+                remaining.append(key)
+            else:
+                responses[key] = run.serve(
+                    *entities[key],
+                    result_codec.decode_result(value),
+                    result_cache.REDIS,
+                )
+        pending = remaining
+
+    acquired: list[str] = []
+    outcomes = idempotency.acquire_or_fetch_many(
+        run.client,
+        [(f"result:{key}", f"lock:{key}") for key in pending],
+        run.lock_token,
+        settings.worker_lock_ttl,
+    )
+    for key, (outcome, existing) in zip(pending, outcomes):
+        if outcome == idempotency.CACHED:
+            responses[key] = run.serve(
+                *entities[key],
+                result_codec.decode_result(existing),
+                result_cache.REDIS,
+            )
+        elif outcome == idempotency.LOCKED:
+            responses[key] = run.locked(*entities[key])
+        else:
+            acquired.append(key)
+    held_locks = [f"lock:{key}" for key in acquired]
+
+    stored_results: list[idempotency.StoredResult] = []
+    durable = run.durable_entries(acquired)
+    for key, entry in durable.items():
+        stored_results.append(run.restored(key, entry))
+        responses[key] = run.serve(*entities[key], entry.result_json, result_cache.POSTGRES)
+    acquired = [key for key in acquired if key not in durable]
+
+    def _run(key: str) -> tuple[dict[str, Any] | None, Exception | None, int, bool]:
+        started = time.perf_counter()
+        try:
+            with run.lease(key) as lease:
+                result = handler(entities[key][1])
+        except Exception as exc:  # noqa: BLE001
+            return None, exc, 0, False
+        return result, None, int((time.perf_counter() - started) * 1000), lease.lost
+
+    failed_locks: list[str] = []
+    if acquired:
+        workers = max(1, min(settings.worker_batch_max_workers, len(acquired)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=run.task_type) as pool:
+            outcomes_by_key = dict(zip(acquired, pool.map(_run, acquired)))
+        for key in acquired:
+            result, error, delta_ms, lost = outcomes_by_key[key]
+            if error is not None:
+                failed_locks.append(f"lock:{key}")
+                responses[key] = run.fail(*entities[key], error)
+                continue
+            if lost:
+                responses[key] = run.superseded(*entities[key], result)
+                continue
+            responses[key], stored = run.succeed(*entities[key], result, delta_ms)
+            stored_results.append(stored)
+
+    run.store_and_release(stored_results, held_locks)
+    run.release(failed_locks)
+    return [responses[key] for key in order]
+
+
+@celery_app.task
+def reap_orphaned_locks() -> int:
+    return idempotency.reap_orphaned_locks(get_redis_client())
+
+
+@celery_app.task
+def prune_task_results() -> dict[str, int]:
+    """Delete durable results older than their task type's result TTL."""
+    deleted: dict[str, int] = {}
+    for task_type in settings.worker_durable_result_task_types:
+        result_store = get_result_store(task_type)
+        if result_store is not None:
+            deleted[task_type] = result_store.prune(task_type, max_age=result_ttl(task_type))
+    return deleted
+
+
+@celery_app.task
+def prune_task_outbox() -> int:
+    """Delete outbox rows published longer ago than the outbox retention."""
+    return get_default_task_outbox().prune_published(max_age=settings.orchestrator_outbox_retention)
+
+
+@celery_app.task
+def result_memory_stats() -> dict[str, dict[str, float]]:
+    return result_codec.result_memory_stats(get_redis_client())
 
 
 @celery_app.task
 def heartbeat() -> str:
+    logger.info("Redis pool stats: %s", default_redis_pool_stats())
+    logger.info("Result cache stats: %s", result_cache.get_cache_stats().snapshot())
+    logger.info("Provider latency: %s", get_latency_histograms().snapshot())
     return f"heartbeat:{datetime.utcnow().isoformat()}"
 
 
@@ -265,28 +659,117 @@ def score_pipeline_bant(payload: dict[str, Any]) -> dict[str, Any]:
     return {"bant": bant, "score": score, "qualified": score >= 10}
 
 
-def _company_search(payload: dict[str, Any]) -> dict[str, Any]:
-    companies = search_companies_with_playwright(payload)
-    companies.extend(search_companies_with_selenium(payload))
-    return {"companies": companies}
+def _company_providers() -> dict[str, providers.ProviderCall]:
+    return {
+        "playwright": search_companies_with_playwright,
+        "selenium": search_companies_with_selenium,
+    }
+
+
+def _iter_companies(
+    payload: dict[str, Any],
+    outcomes: dict[str, providers.ProviderOutcome],
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Yield ``(provider, company)`` as soon as each provider answers."""
+    for name, companies in providers.iter_fan_out(
+        _company_providers(),
+        payload,
+        limiter=get_provider_limiter(),
+        breaker=get_circuit_breaker(),
+        outcomes=outcomes,
+    ):
+        for company in companies:
+            yield name, company
+
+
+def _company_search(
+    payload: dict[str, Any],
+    emit: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, Any]:
+    """Search every provider; ``emit`` is called with each company as it is found."""
+    outcomes: dict[str, providers.ProviderOutcome] = {}
+    found: dict[str, list[dict[str, Any]]] = {}
+    for name, company in _iter_companies(payload, outcomes):
+        found.setdefault(name, []).append(company)
+        if emit is not None:
+            emit(company)
+    order = [name for name in _company_providers() if name in outcomes]
+    return {
+        "companies": [company for name in order for company in found.get(name, [])],
+        "providers": providers.outcomes_to_dict({name: outcomes[name] for name in order}),
+    }
+
+
+def _has_email(contacts: list[dict[str, Any]]) -> bool:
+    return any(contact.get("email") for contact in contacts)
 
 
 def _contact_finder(payload: dict[str, Any]) -> dict[str, Any]:
-    contacts = find_contacts_with_mailscout(payload)
-    contacts.extend(find_contacts_with_theharvester(payload))
-    return {"contacts": contacts}
+    # Fallback order from the PRD; with hedging, later providers only run
+    # when the earlier ones fail or are slower than usual.
+    chain = {
+        "mailscout": find_contacts_with_mailscout,
+        "theharvester": find_contacts_with_theharvester,
+    }
+    if settings.worker_contact_hedging:
+        contacts, outcomes = providers.hedge(
+            chain,
+            payload,
+            satisfied=_has_email,
+            limiter=get_provider_limiter(),
+            breaker=get_circuit_breaker(),
+        )
+    else:
+        contacts, outcomes = providers.fan_out(
+            chain,
+            payload,
+            limiter=get_provider_limiter(),
+            breaker=get_circuit_breaker(),
+        )
+    return {"contacts": contacts, "providers": providers.outcomes_to_dict(outcomes)}
 
 
 def _news_collector(payload: dict[str, Any]) -> dict[str, Any]:
-    articles = collect_news_with_newsapi(payload)
+    articles, outcomes = providers.fan_out(
+        {"newsapi": collect_news_with_newsapi},
+        payload,
+        limiter=get_provider_limiter(),
+        breaker=get_circuit_breaker(),
+    )
     summaries = parse_articles_with_newspaper(articles)
-    return {"articles": articles, "summaries": summaries}
+    return {
+        "articles": articles,
+        "summaries": summaries,
+        "providers": providers.outcomes_to_dict(outcomes),
+    }
 
 
 def _email_generator(payload: dict[str, Any]) -> dict[str, Any]:
     return {"email": generate_email_with_template(payload)}
 
 
+def _company_entity(company: dict[str, Any], entity_id: str) -> dict[str, Any]:
+    fields: dict[str, Any] = {"company": company["name"]}
+    if company.get("domain"):
+        fields["domain"] = company["domain"]
+    return {"entity_id": entity_id, "payload": fields}
+
+
+def _contact_entities(entity: dict[str, Any], result: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        {
+            "entity_id": f"{entity['entity_id']}:{contact['email']}",
+            "payload": {
+                **entity["payload"],
+                "recipient": contact.get("name", "Prospect"),
+                "email": contact["email"],
+            },
+        }
+        for contact in result.get("contacts", [])
+        if contact.get("email")
+    ]
+
+
 def _scheduler(payload: dict[str, Any]) -> dict[str, Any]:
     return {"schedule": build_schedule_plan(payload)}
 
@@ -295,6 +778,182 @@ def _pipeline_bant(payload: dict[str, Any]) -> dict[str, Any]:
     return {"assessment": score_pipeline_bant(payload)}
 
 
+# Stream-fed stages and the stage whose stream each of them consumes.
+STREAM_INPUTS = {
+    "contact_finder": "company_search",
+    "news_collector": "company_search",
+    "email_generator": "contact_finder",
+}
+
+_STREAM_HANDLERS: dict[str, Callable[[dict[str, Any]], dict[str, Any]]] = {
+    "contact_finder": _contact_finder,
+    "news_collector": _news_collector,
+    "email_generator": _email_generator,
+}
+
+# Entities a consuming stage passes on to its own stream, from each result.
+_STREAM_OUTPUTS: dict[str, Callable[[dict[str, Any], dict[str, Any]], list[dict[str, Any]]]] = {
+    "contact_finder": _contact_entities,
+}
+
+
+@celery_app.task
+def company_search_stream(
+    intent_id: str,
+    payload: dict[str, Any] | None = None,
+    version: str | None = None,
+) -> dict[str, Any]:
+    """``company_search`` that streams each company to the intent's consumers.
+
+    Companies are appended to the intent's ``company_search`` stream as the
+    providers return them; a cached result is replayed in full. Entity ids
+    follow ``companies_as_entities``, so a repeated company gets its
+    occurrence appended just as on the DAG path. The stream is closed when
+    the search ends, successfully or not.
+    """
+    client = get_redis_client()
+    stream = streams.stream_key(intent_id, "company_search")
+    occurrences: dict[str, int] = {}
+    published: set[str] = set()
+
+    def _publish(company: dict[str, Any], entity_id: str) -> None:
+        published.add(entity_id)
+        entity = _company_entity(company, entity_id)
+        streams.publish(client, stream, entity, ttl=settings.worker_stream_ttl)
+
+    def _emit(company: dict[str, Any]) -> None:
+        entity_id = company_entity_id(company)
+        occurrences[entity_id] = occurrences.get(entity_id, 0) + 1
+        if occurrences[entity_id] > 1:
+            entity_id = f"{entity_id}#{occurrences[entity_id]}"
+        _publish(company, entity_id)
+
+    try:
+        response = run_idempotent_task(
+            "company_search",
+            intent_id,
+            None,
+            payload or {},
+            version,
+            lambda search_payload: _company_search(search_payload, _emit),
+            wait_for_result=True,
+        )
+        if response.get("status") == "success":
+            for entity_id, fields in companies_as_entities(response["result"]):
+                if entity_id not in published:
+                    _publish(fields["company"], entity_id)
+        return response
+    finally:
+        streams.close(client, stream, ttl=settings.worker_stream_ttl)
+
+
+def stream_claim_idle() -> float:
+    """Seconds a stream entry stays pending before another consumer claims it.
+
+    Entries are read ``worker_stream_batch_size`` at a time and handled one
+    by one, each with its retries against the slowest provider timeout, so
+    a live consumer can hold the last entry of a batch that long.
+    """
+    slowest = max([settings.worker_provider_timeout, *settings.worker_provider_timeouts.values()])
+    per_entity = (settings.worker_stream_max_retries + 1) * (
+        slowest + settings.worker_stream_retry_delay
+    )
+    return settings.worker_stream_batch_size * per_entity + settings.worker_lock_ttl
+
+
+@celery_app.task
+def stream_stage(
+    task_type: str,
+    intent_id: str,
+    consumer: str,
+    payload: dict[str, Any] | None = None,
+    version: str | None = None,
+) -> dict[str, int]:
+    """Run ``task_type`` for every entity on its input stream as it arrives.
+
+    Several ``stream_stage`` tasks with different ``consumer`` names share
+    one stage's entities. Each entity runs through ``run_idempotent_task``
+    and is acknowledged once it succeeded; one found locked by another
+    worker stays pending and is claimed again after ``stream_claim_idle``.
+    Only a result computed here is passed on downstream, so a redelivered
+    entity served from the cache is not published twice. A failing entity
+    is retried up to ``settings.worker_stream_max_retries`` times, then
+    moved to the input stream's deadletter stream as it is acknowledged.
+    Returns the number of acknowledged entities per response status.
+    """
+    handler = _STREAM_HANDLERS[task_type]
+    to_entities = _STREAM_OUTPUTS.get(task_type)
+    client = get_redis_client()
+    source = streams.stream_key(intent_id, STREAM_INPUTS[task_type])
+    output = streams.stream_key(intent_id, task_type)
+    counts: dict[str, int] = {}
+    for entry_id, entity in streams.consume(
+        client,
+        source,
+        task_type,
+        consumer,
+        count=settings.worker_stream_batch_size,
+        block_ms=settings.worker_stream_block_ms,
+        claim_idle=stream_claim_idle(),
+        timeout=settings.worker_stream_timeout,
+    ):
+        entity_payload = {**(payload or {}), **entity["payload"]}
+        computed: list[bool] = []
+
+        def _compute(task_payload: dict[str, Any]) -> dict[str, Any]:
+            result = handler(task_payload)
+            computed.append(True)
+            return result
+
+        for attempt in range(settings.worker_stream_max_retries + 1):
+            if attempt:
+                time.sleep(settings.worker_stream_retry_delay)
+            try:
+                response = run_idempotent_task(
+                    task_type,
+                    intent_id,
+                    entity["entity_id"],
+                    entity_payload,
+                    version,
+                    _compute,
+                )
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(
+                    "%s failed for %s (attempt %d)",
+                    task_type,
+                    entity["entity_id"],
+                    attempt + 1,
+                    exc_info=True,
+                )
+                error = str(exc)
+            else:
+                break
+        else:
+            streams.deadletter(
+                client,
+                source,
+                task_type,
+                entry_id,
+                entity,
+                error,
+                ttl=settings.worker_stream_ttl,
+            )
+            counts["failed"] = counts.get("failed", 0) + 1
+            continue
+        status = response["status"]
+        if status == "locked":
+            continue
+        if to_entities is not None and computed:
+            for downstream in to_entities(entity, response["result"]):
+                streams.publish(client, output, downstream, ttl=settings.worker_stream_ttl)
+        streams.ack(client, source, task_type, entry_id)
+        counts[status] = counts.get(status, 0) + 1
+    # The last consumer out closes the stage's own stream for the next stage.
+    if to_entities is not None and streams.drained(client, source, task_type):
+        streams.close(client, output, ttl=settings.worker_stream_ttl)
+    return counts
+
+
 @celery_app.task
 def company_search(
     intent_id: str,
@@ -312,6 +971,15 @@ def company_search(
     )
 
 
+@celery_app.task
+def company_search_batch(
+    intent_id: str,
+    items: list[dict[str, Any]],
+    version: str | None = None,
+) -> list[dict[str, Any]]:
+    return run_idempotent_batch("company_search", intent_id, items, version, _company_search)
+
+
 @celery_app.task
 def contact_finder(
     intent_id: str,
@@ -329,6 +997,15 @@ def contact_finder(
     )
 
 
+@celery_app.task
+def contact_finder_batch(
+    intent_id: str,
+    items: list[dict[str, Any]],
+    version: str | None = None,
+) -> list[dict[str, Any]]:
+    return run_idempotent_batch("contact_finder", intent_id, items, version, _contact_finder)
+
+
 @celery_app.task
 def news_collector(
     intent_id: str,
@@ -346,6 +1023,15 @@ def news_collector(
     )
 
 
+@celery_app.task
+def news_collector_batch(
+    intent_id: str,
+    items: list[dict[str, Any]],
+    version: str | None = None,
+) -> list[dict[str, Any]]:
+    return run_idempotent_batch("news_collector", intent_id, items, version, _news_collector)
+
+
 @celery_app.task
 def email_generator(
     intent_id: str,
@@ -363,6 +1049,15 @@ def email_generator(
     )
 
 
+@celery_app.task
+def email_generator_batch(
+    intent_id: str,
+    items: list[dict[str, Any]],
+    version: str | None = None,
+) -> list[dict[str, Any]]:
+    return run_idempotent_batch("email_generator", intent_id, items, version, _email_generator)
+
+
 @celery_app.task
 def scheduler(
     intent_id: str,
@@ -380,6 +1075,15 @@ def scheduler(
     )
 
 
+@celery_app.task
+def scheduler_batch(
+    intent_id: str,
+    items: list[dict[str, Any]],
+    version: str | None = None,
+) -> list[dict[str, Any]]:
+    return run_idempotent_batch("scheduler", intent_id, items, version, _scheduler)
+
+
 @celery_app.task
 def pipeline_bant(
     intent_id: str,
@@ -395,3 +1099,12 @@ def pipeline_bant(
         version,
         _pipeline_bant,
     )
+
+
+@celery_app.task
+def pipeline_bant_batch(
+    intent_id: str,
+    items: list[dict[str, Any]],
+    version: str | None = None,
+) -> list[dict[str, Any]]:
+    return run_idempotent_batch("pipeline_bant", intent_id, items, version, _pipeline_bant)